@@ -1,15 +1,21 @@
 import base64
 import json
+import multiprocessing
 import os
+import queue
 import threading
+import time
 import uuid
 from datetime import datetime
-from io import BytesIO
 from pathlib import Path
-from typing import Any
+from typing import Any, Literal
 
 import uvicorn
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse
+from PIL import Image
 from pydantic import BaseModel
 
 try:
@@ -21,9 +27,34 @@ except ImportError:
     pass
 
 from surfer_h_cli import surferh
+from surfer_h_cli.agent_worker import run_agent_worker, summarize_state
+from surfer_h_cli.browser_profiles import BrowserProfileStore, ProfileLockedError
+from surfer_h_cli.caching_proxy import CachingProxy
+from surfer_h_cli.checkpoint import CheckpointStore
+from surfer_h_cli.event_pool import EventPool
+from surfer_h_cli.frame_archive import FrameArchiveReader, FrameArchiveWriter, archive_path, hydrate_events
+from surfer_h_cli.hedging import HedgingPolicy, hedge_client, hedging_stats
+from surfer_h_cli.image_codec import ImageCodec
+from surfer_h_cli.macros import MacroStore
+from surfer_h_cli.network_blocking import DEFAULT_BLOCKLISTS, NetworkBlocking
+from surfer_h_cli.simple_browser import create_browser
+from surfer_h_cli.trajectory_bundles import TERMINAL_STATUSES, TrajectoryBundleStore
+from surfer_h_cli.trajectory_registry import TrajectoryRegistry
 
 app = FastAPI()
 
+try:
+    from brotli_asgi import BrotliMiddleware
+
+    # Also falls back to gzip for clients that do not accept brotli
+    app.add_middleware(BrotliMiddleware, minimum_size=1000)
+except ImportError:
+    # brotli-asgi not available, compress with gzip only
+    app.add_middleware(GZipMiddleware, minimum_size=1000)
+
+# Stored screenshots stay lossless whatever the codecs sent to the models
+PNG_CODEC = ImageCodec(format="png")
+
 
 def get_model_config(model_name: str) -> tuple[str, str | None]:
     """
@@ -69,6 +100,27 @@ def get_model_config(model_name: str) -> tuple[str, str | None]:
         return api_key, None
 
 
+def get_model_configs(
+    model_name_navigation: str, model_name_localization: str, model_name_validation: str | None
+) -> dict[str, tuple[str, str | None]]:
+    """
+    Resolve (api_key, base_url) for every model role of a trajectory.
+
+    The validation role is omitted when no validation model is given.
+    """
+    roles = {"navigation": model_name_navigation, "localization": model_name_localization}
+    if model_name_validation is not None:
+        roles["validation"] = model_name_validation
+
+    model_configs = {}
+    for role, model_name in roles.items():
+        try:
+            model_configs[role] = get_model_config(model_name)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"{role.capitalize()} model configuration error: {e}")
+    return model_configs
+
+
 class StartAgentRequest(BaseModel):
     task: str = "On Google flights. Find a one-way business class flight from Buenos Aires to Amsterdam on the 10th of next month, and provide the details of the flight with the shortest duration."
     url: str = "https://www.google.com/travel/flights"
@@ -89,6 +141,36 @@ class StartAgentRequest(BaseModel):
     headless_browser: bool = False
     action_timeout: int = 10
 
+    # "process" runs the trajectory in its own worker process so that image encoding does not contend for the GIL
+    execution_mode: Literal["thread", "process"] = os.getenv("AGENT_EXECUTION_MODE", "thread")  # type: ignore
+
+    # "cdp" drives Chrome over the DevTools protocol directly instead of through chromedriver
+    browser_backend: Literal["selenium", "cdp"] = os.getenv("BROWSER_BACKEND", "selenium")  # type: ignore
+
+    # Requests blocked to speed up page loads: named blocklists (ads, trackers, media, fonts) and resource types
+    network_blocklists: list[str] = [
+        name for name in os.getenv("NETWORK_BLOCKLISTS", ",".join(DEFAULT_BLOCKLISTS)).split(",") if name
+    ]
+    blocked_resource_types: list[str] = []
+
+    # Persistent browser profile keeping cookies and HTTP cache between runs, e.g. one per site or tenant
+    browser_profile: str | None = None
+
+    # Replay recorded action sequences of earlier successful runs of the same task template on the same site
+    use_macros: bool = False
+
+    # "dom" observes pages through their distilled elements instead of screenshots, "hybrid" only on form-like pages
+    agent_mode: Literal["screenshot", "dom", "hybrid"] = "screenshot"
+
+    # Image encoding per model role, e.g. png, jpeg:85, jpeg:85:4:4:4, webp:80 or webp:lossless
+    image_codec_navigation: str = "jpeg:90"
+    image_codec_localization: str = "jpeg:90"
+    image_codec_validation: str = "jpeg:90"
+
+    # Leave out screenshots identical to the next one, optionally replacing them by older distinct ones
+    dedup_frames: bool = True
+    backfill_frames: bool = False
+
 
 class TrajectoryInfo(BaseModel):
     trajectory_id: str
@@ -102,9 +184,15 @@ class TrajectoryInfo(BaseModel):
 
 class AgentRunner:
     def __init__(self):
-        self.trajectories = {}
         self.running_agents = {}
         self.file_locks = {}
+        self.frame_writers: dict[str, FrameArchiveWriter] = {}
+        # Finished trajectories past these limits are only kept on disk
+        self.trajectories = TrajectoryRegistry(
+            max_finished=int(os.getenv("TRAJECTORY_CACHE_SIZE", "50")),
+            max_bytes=int(os.getenv("TRAJECTORY_CACHE_MB", "512")) * 2**20,
+            on_evict=self._release_trajectory,
+        )
         self.trajectory_callbacks = {}
         self._global_callback_set = False
 
@@ -112,6 +200,106 @@ class AgentRunner:
         trajectories_dir.mkdir(exist_ok=True)
         print(f"📁 Trajectories will be saved to: {trajectories_dir.absolute()}")
 
+        self.checkpoints_dir = trajectories_dir / "checkpoints"
+        self.macros_dir = trajectories_dir / "macros"
+        self.bundles = TrajectoryBundleStore(trajectories_dir / "bundles")
+
+        # A profile is leased by one browser at a time, trajectories on a busy profile wait for it
+        self.browser_profiles = BrowserProfileStore(
+            os.getenv("BROWSER_PROFILES_DIR", "browser_profiles"),
+            max_profile_bytes=int(os.getenv("BROWSER_PROFILE_MAX_MB", "1024")) * 2**20,
+            template=os.getenv("BROWSER_PROFILE_TEMPLATE"),
+        )
+        self.browser_profile_wait_seconds = float(os.getenv("BROWSER_PROFILE_WAIT_SECONDS", "60"))
+
+        # Hedged model calls, latencies and budgets are per process
+        self.hedging = None
+        if os.getenv("HEDGE_PERCENTILE"):
+            self.hedging = HedgingPolicy(
+                percentile=float(os.getenv("HEDGE_PERCENTILE", "95")),
+                max_hedge_ratio=float(os.getenv("HEDGE_MAX_RATIO", "0.1")),
+                min_samples=int(os.getenv("HEDGE_MIN_SAMPLES", "20")),
+            )
+
+        # One cache shared by the browsers of all trajectories, worker processes included
+        self.caching_proxy = None
+        if os.getenv("CACHING_PROXY", "").lower() in ("1", "true", "yes"):
+            static_ttl_hours = os.getenv("PROXY_STATIC_TTL_HOURS")
+            self.caching_proxy = CachingProxy(
+                os.getenv("PROXY_CACHE_DIR", "proxy_cache"),
+                max_bytes=int(os.getenv("PROXY_CACHE_MB", "2048")) * 2**20,
+                static_ttl=float(static_ttl_hours) * 3600 if static_ttl_hours else None,
+            ).start()
+            print(f"🗄️  Browsers go through the caching proxy on {self.caching_proxy.address}")
+
+        # Screenshot encoding and file I/O happen here, the agent's thread only enqueues
+        self.event_pool = EventPool(
+            n_workers=int(os.getenv("EVENT_POOL_WORKERS", "2")),
+            max_queue_size=int(os.getenv("EVENT_QUEUE_SIZE", "32")),
+            drop_policy=os.getenv("EVENT_DROP_POLICY", "block"),  # type: ignore[arg-type]
+        )
+
+    def _release_trajectory(self, trajectory_id: str):
+        self.file_locks.pop(trajectory_id, None)
+        self.frame_writers.pop(trajectory_id, None)
+
+    def start_compaction(self, interval_seconds: float, compact_after_seconds: float, ttl_seconds: float | None):
+        """Periodically pack old finished trajectories into bundles and delete the expired ones."""
+
+        def compaction_loop():
+            while True:
+                time.sleep(interval_seconds)
+                try:
+                    n_compacted = self.compact_trajectories(compact_after_seconds)
+                    n_expired = self.bundles.expire(ttl_seconds) if ttl_seconds else 0
+                    if n_compacted or n_expired:
+                        print(f"🗜️  Compacted {n_compacted} trajectories, deleted {n_expired} expired ones")
+                except Exception as e:
+                    print(f"⚠️  Trajectory compaction failed: {e}")
+
+        threading.Thread(target=compaction_loop, name="trajectory-compaction", daemon=True).start()
+
+    def compact_trajectories(self, older_than_seconds: float) -> int:
+        """Move the finished trajectories that ended more than `older_than_seconds` ago into a new bundle."""
+        cutoff_timestamp = time.time() - older_than_seconds
+        cutoff = datetime.fromtimestamp(cutoff_timestamp).isoformat()
+
+        candidates = []
+        for json_file in Path("trajectories").glob("trajectory_*.json"):
+            trajectory_id = json_file.stem.replace("trajectory_", "")
+            if trajectory_id in self.running_agents:
+                continue
+            try:
+                # A file written after the cutoff cannot hold a run that ended before it
+                if json_file.stat().st_mtime > cutoff_timestamp:
+                    continue
+                with open(json_file, "r") as f:
+                    file_data = json.load(f)
+            except (json.JSONDecodeError, IOError) as e:
+                print(f"Error reading trajectory file {json_file}: {e}")
+                continue
+            # Files written before end_time was recorded for every terminal status have none, their last write
+            # is when the run ended
+            end_time = file_data.get("end_time") or datetime.fromtimestamp(json_file.stat().st_mtime).isoformat()
+            if file_data.get("status") in TERMINAL_STATUSES and end_time < cutoff:
+                candidates.append((trajectory_id, json_file))
+
+        if not candidates:
+            return 0
+        for trajectory_id, _ in candidates:
+            self.event_pool.flush(trajectory_id)
+        self.bundles.compact([json_file for _, json_file in candidates])
+
+        checkpoints = CheckpointStore(self.checkpoints_dir)
+        for trajectory_id, json_file in candidates:
+            with self.file_locks.get(trajectory_id, threading.Lock()):
+                json_file.unlink(missing_ok=True)
+                archive_path(json_file).unlink(missing_ok=True)
+            checkpoints.delete(trajectory_id)
+            self.trajectories.pop(trajectory_id, None)
+            self.file_locks.pop(trajectory_id, None)
+        return len(candidates)
+
     def _global_event_callback(self, event_type, message, agent_state):
         """Global callback that routes events to the appropriate trajectory handler."""
         if agent_state and hasattr(agent_state, "trajectory_id") and agent_state.trajectory_id:
@@ -149,6 +337,24 @@ class AgentRunner:
 
         headless_browser = kwargs.get("headless_browser", defaults.headless_browser)
         action_timeout = kwargs.get("action_timeout", defaults.action_timeout)
+        execution_mode = kwargs.get("execution_mode", defaults.execution_mode)
+        browser_backend = kwargs.get("browser_backend", defaults.browser_backend)
+        network_blocklists = kwargs.get("network_blocklists", defaults.network_blocklists)
+        blocked_resource_types = kwargs.get("blocked_resource_types", defaults.blocked_resource_types)
+        NetworkBlocking.from_blocklists(network_blocklists, resource_types=blocked_resource_types)
+        browser_profile = kwargs.get("browser_profile", defaults.browser_profile)
+        if browser_profile is not None:
+            self.browser_profiles.profile_path(browser_profile)
+        use_macros = kwargs.get("use_macros", defaults.use_macros)
+        agent_mode = kwargs.get("agent_mode", defaults.agent_mode)
+        dedup_frames = kwargs.get("dedup_frames", defaults.dedup_frames)
+        backfill_frames = kwargs.get("backfill_frames", defaults.backfill_frames)
+        image_codecs = {
+            name: kwargs.get(name, getattr(defaults, name))
+            for name in ("image_codec_navigation", "image_codec_localization", "image_codec_validation")
+        }
+        for spec in image_codecs.values():
+            ImageCodec.from_spec(spec)
 
         trajectory_data: dict[str, Any] = {
             "id": trajectory_id,
@@ -159,7 +365,6 @@ class AgentRunner:
             "end_time": None,
             "current_state": None,
             "step_count": 0,
-            "events": [],
             "settings": {
                 "max_n_steps": max_n_steps,
                 "max_time_seconds": max_time_seconds,
@@ -173,6 +378,16 @@ class AgentRunner:
                 "temperature_validation": temperature_validation,
                 "headless_browser": headless_browser,
                 "action_timeout": action_timeout,
+                "execution_mode": execution_mode,
+                "browser_backend": browser_backend,
+                "network_blocklists": network_blocklists,
+                "blocked_resource_types": blocked_resource_types,
+                "browser_profile": browser_profile,
+                "use_macros": use_macros,
+                "agent_mode": agent_mode,
+                "dedup_frames": dedup_frames,
+                "backfill_frames": backfill_frames,
+                **image_codecs,
             },
         }
 
@@ -181,6 +396,29 @@ class AgentRunner:
 
         self._initialize_trajectory_file(trajectory_id, trajectory_data)
 
+        self._launch_agent(trajectory_id, task, url, **kwargs)
+
+        return {
+            "status": "started",
+            "trajectory_id": trajectory_id,
+            "task": task,
+            "url": url,
+            "settings": {
+                "max_n_steps": max_n_steps,
+                "max_time_seconds": max_time_seconds,
+                "model_name_localization": model_name_localization,
+                "use_validator": use_validator,
+                "model_name_validation": model_name_validation,
+                "headless_browser": headless_browser,
+                "action_timeout": action_timeout,
+                "execution_mode": execution_mode,
+                "browser_backend": browser_backend,
+                "use_macros": use_macros,
+                "agent_mode": agent_mode,
+            },
+        }
+
+    def _launch_agent(self, trajectory_id: str, task: str, url: str, **kwargs):
         def trajectory_callback(event_type, message, agent_state):
             self._handle_agent_event(trajectory_id, event_type, message, agent_state)
 
@@ -192,29 +430,58 @@ class AgentRunner:
             surferh.set_event_callback(self._global_event_callback)
             self._global_callback_set = True
 
+        # In process mode this thread only pumps events coming back from the worker process
+        execution_mode = kwargs.get("execution_mode", StartAgentRequest().execution_mode)
+        run_target = self._run_agent_process if execution_mode == "process" else self._run_agent
         agent_thread = threading.Thread(
-            target=self._run_agent, args=(trajectory_id, task, url, trajectory_callback), kwargs=kwargs
+            target=run_target, args=(trajectory_id, task, url, trajectory_callback), kwargs=kwargs
         )
         agent_thread.daemon = True
         agent_thread.start()
 
         self.running_agents[trajectory_id] = agent_thread
 
-        return {
-            "status": "started",
-            "trajectory_id": trajectory_id,
-            "task": task,
-            "url": url,
-            "settings": {
-                "max_n_steps": max_n_steps,
-                "max_time_seconds": max_time_seconds,
-                "model_name_localization": model_name_localization,
-                "use_validator": use_validator,
-                "model_name_validation": model_name_validation,
-                "headless_browser": headless_browser,
-                "action_timeout": action_timeout,
-            },
+    def resume_agent(self, trajectory_id: str):
+        """Restart an interrupted trajectory from its last checkpoint instead of from scratch."""
+        if trajectory_id in self.running_agents:
+            raise HTTPException(status_code=409, detail="Trajectory is still running")
+        if not CheckpointStore(self.checkpoints_dir).exists(trajectory_id):
+            raise HTTPException(status_code=404, detail="No checkpoint found for trajectory")
+
+        # The file must hold every event of the interrupted run before it is reloaded
+        self.event_pool.flush(trajectory_id)
+        file_data = self.get_trajectory_events(trajectory_id)
+        if not file_data:
+            raise HTTPException(status_code=404, detail="Trajectory not found")
+
+        self.trajectories[trajectory_id] = {
+            "id": trajectory_id,
+            "task": file_data["task"],
+            "url": file_data["url"],
+            "status": "running",
+            "start_time": file_data["start_time"],
+            "end_time": None,
+            "current_state": None,
+            "step_count": file_data.get("step_count", 0),
+            "settings": file_data["settings"],
         }
+        self.file_locks.setdefault(trajectory_id, threading.Lock())
+
+        self._launch_agent(trajectory_id, file_data["task"], file_data["url"], **file_data["settings"], resume=True)
+
+        return {"status": "resumed", "trajectory_id": trajectory_id, "task": file_data["task"], "url": file_data["url"]}
+
+    def resume_interrupted_trajectories(self, auto_resume: bool):
+        """Find trajectories that were still running when the server stopped, and optionally resume them."""
+        for trajectory_id in CheckpointStore(self.checkpoints_dir).list_ids():
+            status = self.get_trajectory_status(trajectory_id)
+            if not status or status["status"] != "running" or trajectory_id in self.running_agents:
+                continue
+            if auto_resume:
+                print(f"🔁 Resuming interrupted trajectory {trajectory_id}")
+                self.resume_agent(trajectory_id)
+            else:
+                print(f"⏸️  Trajectory {trajectory_id} was interrupted, POST /resume/{trajectory_id} to continue it")
 
     def _initialize_trajectory_file(self, trajectory_id: str, trajectory_data: dict[str, Any]):
         trajectories_dir = Path("trajectories")
@@ -237,7 +504,23 @@ class AgentRunner:
         with open(file_path, "w") as f:
             json.dump(file_data, f, indent=2)
 
+    @staticmethod
+    def _network_blocking(kwargs: dict) -> NetworkBlocking:
+        defaults = StartAgentRequest()
+        return NetworkBlocking.from_blocklists(
+            kwargs.get("network_blocklists", defaults.network_blocklists),
+            resource_types=kwargs.get("blocked_resource_types", defaults.blocked_resource_types),
+        )
+
+    def _lease_browser_profile(self, kwargs: dict):
+        browser_profile = kwargs.get("browser_profile")
+        if browser_profile is None:
+            return None
+        return self.browser_profiles.acquire(browser_profile, timeout=self.browser_profile_wait_seconds)
+
     def _run_agent(self, trajectory_id: str, task: str, url: str, callback, **kwargs):
+        browser = None
+        profile_lease = None
         try:
             # Note: Global callback is now set in start_agent method
 
@@ -261,34 +544,31 @@ class AgentRunner:
             headless_browser = kwargs.get("headless_browser", defaults.headless_browser)
             action_timeout = kwargs.get("action_timeout", defaults.action_timeout)
 
-            browser = surferh.SimpleWebBrowserTools()
-            browser.open_browser(headless=headless_browser, width=1920, height=1080, action_timeout=action_timeout)
+            profile_lease = self._lease_browser_profile(kwargs)
+            browser = create_browser(kwargs.get("browser_backend", defaults.browser_backend))
+            browser.open_browser(
+                headless=headless_browser,
+                width=1920,
+                height=1080,
+                action_timeout=action_timeout,
+                network_blocking=self._network_blocking(kwargs),
+                user_data_dir=str(profile_lease.path) if profile_lease is not None else None,
+                proxy=self.caching_proxy.settings() if self.caching_proxy is not None else None,
+            )
 
             from openai import OpenAI
 
-            # Get API configuration for navigation model
-            try:
-                nav_api_key, nav_base_url = get_model_config(model_name_navigation)
-                openai_client_navigation = OpenAI(api_key=nav_api_key, base_url=nav_base_url)
-            except ValueError as e:
-                raise HTTPException(status_code=400, detail=f"Navigation model configuration error: {e}")
-
-            # Get API configuration for localization model
-            try:
-                loc_api_key, loc_base_url = get_model_config(model_name_localization)
-                openai_client_localization = OpenAI(api_key=loc_api_key, base_url=loc_base_url)
-            except ValueError as e:
-                raise HTTPException(status_code=400, detail=f"Localization model configuration error: {e}")
-
-            # Get API configuration for validation model
-            if use_validator:
-                try:
-                    val_api_key, val_base_url = get_model_config(model_name_validation)
-                    openai_client_validation = OpenAI(api_key=val_api_key, base_url=val_base_url)
-                except ValueError as e:
-                    raise HTTPException(status_code=400, detail=f"Validation model configuration error: {e}")
-            else:
-                openai_client_validation = openai_client_navigation
+            model_configs = get_model_configs(
+                model_name_navigation, model_name_localization, model_name_validation if use_validator else None
+            )
+            clients = {
+                role: OpenAI(api_key=api_key, base_url=base_url) for role, (api_key, base_url) in model_configs.items()
+            }
+            if self.hedging is not None:
+                clients = {role: hedge_client(client, self.hedging) for role, client in clients.items()}
+            openai_client_navigation = clients["navigation"]
+            openai_client_localization = clients["localization"]
+            openai_client_validation = clients.get("validation", openai_client_navigation)
 
             # Model names are now specific (e.g., "holo1-5-7b-20250915")
             # No replacement needed since frontend sends exact model names
@@ -311,6 +591,16 @@ class AgentRunner:
                 temperature_validation=temperature_validation,
                 use_validator=use_validator,
                 trajectory_id=trajectory_id,
+                checkpoint_store=CheckpointStore(self.checkpoints_dir, n_frames=n_navigation_screenshots),
+                resume=kwargs.get("resume", False),
+                macro_store=MacroStore(self.macros_dir) if kwargs.get("use_macros", defaults.use_macros) else None,
+                agent_mode=kwargs.get("agent_mode", defaults.agent_mode),
+                dedup_frames=kwargs.get("dedup_frames", defaults.dedup_frames),
+                backfill_frames=kwargs.get("backfill_frames", defaults.backfill_frames),
+                **{
+                    name: ImageCodec.from_spec(kwargs.get(name, getattr(defaults, name)))
+                    for name in ("image_codec_navigation", "image_codec_localization", "image_codec_validation")
+                },
             )
 
             # Extract message and images from the result
@@ -326,18 +616,158 @@ class AgentRunner:
         except Exception as e:
             self._complete_trajectory(trajectory_id, "error", f"Agent failed: {e}", None)
         finally:
+            # Chrome, and the event loop thread of the CDP backend, must be gone before the profile is trimmed and
+            # handed to another run
+            if browser is not None:
+                try:
+                    browser.quit()
+                except Exception:
+                    pass
+            if profile_lease is not None:
+                profile_lease.release()
             if trajectory_id in self.running_agents:
                 del self.running_agents[trajectory_id]
             # Clean up trajectory callback
             if trajectory_id in self.trajectory_callbacks:
                 del self.trajectory_callbacks[trajectory_id]
 
-    def _complete_trajectory(self, trajectory_id: str, status: str, message: str, images: list | None = None):
+    def _run_agent_process(self, trajectory_id: str, task: str, url: str, callback, **kwargs):
+        """Run the trajectory in a worker process and relay its events until it finishes or dies."""
+        process = None
+        profile_lease = None
+        try:
+            defaults = StartAgentRequest()
+            use_validator = kwargs.get("use_validator", defaults.use_validator)
+            model_name_validation = kwargs.get("model_name_validation", defaults.model_name_validation)
+
+            model_configs = get_model_configs(
+                kwargs.get("model_name_navigation", defaults.model_name_navigation),
+                kwargs.get("model_name_localization", defaults.model_name_localization),
+                model_name_validation if use_validator else None,
+            )
+            browser_settings = {
+                "headless": kwargs.get("headless_browser", defaults.headless_browser),
+                "width": 1920,
+                "height": 1080,
+                "action_timeout": kwargs.get("action_timeout", defaults.action_timeout),
+                "backend": kwargs.get("browser_backend", defaults.browser_backend),
+                "network_blocking": self._network_blocking(kwargs),
+                "proxy": self.caching_proxy.settings() if self.caching_proxy is not None else None,
+            }
+            # Leased here and not in the worker, so that a worker killed mid-run cannot keep it
+            profile_lease = self._lease_browser_profile(kwargs)
+            if profile_lease is not None:
+                browser_settings["user_data_dir"] = str(profile_lease.path)
+            agent_settings = {
+                name: kwargs.get(name, getattr(defaults, name))
+                for name in (
+                    "max_n_steps",
+                    "max_time_seconds",
+                    "n_navigation_screenshots",
+                    "model_name_navigation",
+                    "model_name_localization",
+                    "temperature_navigation",
+                    "temperature_localization",
+                    "temperature_validation",
+                    "use_validator",
+                    "agent_mode",
+                    "dedup_frames",
+                    "backfill_frames",
+                )
+            }
+            agent_settings["model_name_validation"] = model_name_validation
+            agent_settings["resume"] = kwargs.get("resume", False)
+            for name in ("image_codec_navigation", "image_codec_localization", "image_codec_validation"):
+                agent_settings[name] = ImageCodec.from_spec(kwargs.get(name, getattr(defaults, name)))
+
+            # spawn keeps the worker free of the server's threads and locks
+            context = multiprocessing.get_context("spawn")
+            event_queue = context.Queue()
+            process = context.Process(
+                target=run_agent_worker,
+                args=(event_queue, trajectory_id, task, url, browser_settings, model_configs, agent_settings),
+                kwargs={
+                    "checkpoint_dir": str(self.checkpoints_dir),
+                    "macro_dir": str(self.macros_dir) if kwargs.get("use_macros", defaults.use_macros) else None,
+                    "hedging": self.hedging,
+                },
+                daemon=True,
+            )
+            process.start()
+
+            finished = False
+            while not finished:
+                try:
+                    kind, *payload = event_queue.get(timeout=1.0)
+                except queue.Empty:
+                    # Only give up once the worker is gone and nothing is left in flight
+                    if process.is_alive():
+                        continue
+                    try:
+                        kind, *payload = event_queue.get(timeout=1.0)
+                    except queue.Empty:
+                        break
+
+                if kind == "event":
+                    event_type, message, state_summary, screenshot_b64 = payload
+                    self._submit_event(trajectory_id, event_type, message, state_summary, screenshot_b64=screenshot_b64)
+                elif kind == "result":
+                    answer, screenshot_b64 = payload
+                    self._complete_trajectory(trajectory_id, "completed", f"{answer}", screenshot_b64=screenshot_b64)
+                    finished = True
+                elif kind == "error":
+                    message, _ = payload
+                    self._complete_trajectory(trajectory_id, "error", message, None)
+                    finished = True
+
+            if not finished:
+                self._complete_trajectory(
+                    trajectory_id, "error", f"Agent worker exited unexpectedly (exit code {process.exitcode})", None
+                )
+
+        except Exception as e:
+            self._complete_trajectory(trajectory_id, "error", f"Agent failed: {e}", None)
+        finally:
+            if process is not None:
+                process.join(timeout=10)
+                if process.is_alive():
+                    process.terminate()
+                    process.join(timeout=10)
+            if profile_lease is not None:
+                profile_lease.release()
+            if trajectory_id in self.running_agents:
+                del self.running_agents[trajectory_id]
+            if trajectory_id in self.trajectory_callbacks:
+                del self.trajectory_callbacks[trajectory_id]
+
+    def _complete_trajectory(
+        self,
+        trajectory_id: str,
+        status: str,
+        message: str,
+        images: list | None = None,
+        screenshot_b64: str | None = None,
+    ):
+        if status == "completed":
+            # Failed runs keep their checkpoint so they can be resumed
+            CheckpointStore(self.checkpoints_dir).delete(trajectory_id)
+
         if trajectory_id in self.trajectories:
             trajectory = self.trajectories[trajectory_id]
             trajectory["status"] = status
             trajectory["end_time"] = datetime.now().isoformat()
 
+            if screenshot_b64 is not None:
+                # Final frame already encoded by a worker process
+                state_summary = {
+                    "timestep": trajectory["step_count"],
+                    "url": "",
+                    "notes": "",
+                    "task": trajectory["task"],
+                }
+                self._submit_event(trajectory_id, status, message, state_summary, screenshot_b64=screenshot_b64)
+                return
+
             # Create a mock agent state with completion images if provided
             mock_agent_state = None
             if images:
@@ -356,24 +786,61 @@ class AgentRunner:
             self._handle_agent_event(trajectory_id, status, message, mock_agent_state)
 
     def _handle_agent_event(self, trajectory_id: str, event_type: str, message: str, agent_state):
+        """Runs on the agent's thread: only take a reference to the frame and hand the event to the pool."""
         if trajectory_id not in self.trajectories:
             return
 
-        trajectory = self.trajectories[trajectory_id]
+        frame = None
+        if agent_state and agent_state.screenshots and event_type.lower() in ("screenshot", "completed"):
+            frame = agent_state.screenshots[-1]
+
+        self._submit_event(
+            trajectory_id, event_type, message, summarize_state(agent_state), frame=frame, agent_state=agent_state
+        )
 
-        screenshot_b64 = None
-        if (
-            agent_state
-            and agent_state.screenshots
-            and (event_type.lower() == "screenshot" or event_type.lower() == "completed")
-        ):
+    def _submit_event(
+        self,
+        trajectory_id: str,
+        event_type: str,
+        message: str,
+        state_summary: dict | None,
+        frame: Image.Image | None = None,
+        screenshot_b64: str | None = None,
+        agent_state=None,
+    ):
+        """Queue an event for encoding and persistence. Screenshot events may be dropped under backpressure,
+        the others (actions, answers, terminal statuses) never are."""
+
+        def persist():
+            encoded, archived = screenshot_b64, frame
             try:
-                img = agent_state.screenshots[-1]
-                buffer = BytesIO()
-                img.save(buffer, format="PNG")
-                screenshot_b64 = base64.b64encode(buffer.getvalue()).decode()
+                if frame is not None:
+                    encoded = PNG_CODEC.to_b64(frame)
+                elif screenshot_b64:
+                    # Encoded by a worker process, archived as it is rather than decoded and re-encoded here
+                    archived = base64.b64decode(screenshot_b64)
             except Exception:
                 pass
+            self._record_event(trajectory_id, event_type, message, state_summary, encoded, agent_state, archived)
+
+        if not self.event_pool.submit(trajectory_id, persist, droppable=event_type.lower() == "screenshot"):
+            print(f"⚠️  Event queue full, dropped a screenshot of trajectory {trajectory_id}")
+
+    def _record_event(
+        self,
+        trajectory_id: str,
+        event_type: str,
+        message: str,
+        state_summary: dict | None,
+        screenshot_b64: str | None,
+        agent_state=None,
+        frame: Image.Image | bytes | None = None,
+    ):
+        """Store an event whose screenshot has already been encoded. Runs on an event pool worker."""
+        if trajectory_id not in self.trajectories:
+            return
+
+        trajectory = self.trajectories[trajectory_id]
 
         event_data = {
             "trajectory_id": trajectory_id,
@@ -381,24 +848,21 @@ class AgentRunner:
             "message": message,
             "timestamp": datetime.now().isoformat(),
             "screenshot": screenshot_b64,
-            "agent_state": {
-                "timestep": agent_state.timestep if agent_state else trajectory["step_count"],
-                "url": agent_state.url if agent_state else "",
-                "notes": agent_state.notes if agent_state else "",
-                "task": agent_state.task if agent_state else trajectory["task"],
-            }
-            if agent_state
-            else {"task": trajectory["task"]},
+            "agent_state": state_summary if state_summary else {"task": trajectory["task"]},
         }
 
-        trajectory["current_state"] = agent_state
-        if agent_state:
-            trajectory["step_count"] = agent_state.timestep
-        trajectory["events"].append(event_data.copy())
+        # Worker processes only send back the summary, in-process runs keep the full state until they finish.
+        # Events are not kept in memory, they are read back from the file.
+        if agent_state is not None and event_type not in TERMINAL_STATUSES:
+            trajectory["current_state"] = agent_state
+        else:
+            trajectory["current_state"] = state_summary
+        if state_summary:
+            trajectory["step_count"] = state_summary["timestep"]
 
-        self._save_event(trajectory_id, event_data)
+        self._save_event(trajectory_id, event_data, frame)
 
-    def _save_event(self, trajectory_id: str, event_data):
+    def _save_event(self, trajectory_id: str, event_data, frame: Image.Image | bytes | None = None):
         with self.file_locks[trajectory_id]:
             trajectories_dir = Path("trajectories")
             log_file = trajectories_dir / f"trajectory_{trajectory_id}.json"
@@ -420,18 +884,49 @@ class AgentRunner:
                 }
 
             saved_event = event_data.copy()
+            if frame is not None:
+                # The file only references the frame, the pixels go to the trajectory's frame archive
+                try:
+                    if trajectory_id not in self.frame_writers:
+                        self.frame_writers[trajectory_id] = FrameArchiveWriter(archive_path(log_file))
+                    writer = self.frame_writers[trajectory_id]
+                    if isinstance(frame, bytes):
+                        saved_event["frame"] = writer.append_encoded(frame)
+                    else:
+                        saved_event["frame"] = writer.append(frame)
+                    saved_event["screenshot"] = None
+                except (OSError, ValueError) as e:
+                    print(f"Error archiving frame of trajectory {trajectory_id}: {e}")
+            if event_data["type"] in TERMINAL_STATUSES and trajectory_id in self.frame_writers:
+                try:
+                    self.frame_writers.pop(trajectory_id).close()
+                except OSError as e:
+                    print(f"Error closing frame archive of trajectory {trajectory_id}: {e}")
 
             file_data["events"].append(saved_event)
             file_data["step_count"] = len(file_data["events"])
             file_data["status"] = self.trajectories[trajectory_id]["status"]
 
-            if self.trajectories[trajectory_id]["status"] in ["completed", "failed"]:
+            if self.trajectories[trajectory_id]["status"] in TERMINAL_STATUSES:
                 file_data["end_time"] = datetime.now().isoformat()
                 self.trajectories[trajectory_id]["end_time"] = file_data["end_time"]
 
             with open(log_file, "w") as f:
                 json.dump(file_data, f, indent=2)
 
+        if event_data["type"] in TERMINAL_STATUSES:
+            # Last event stored, the trajectory may now leave memory
+            self.trajectories[trajectory_id]["closed"] = True
+            self.trajectories.evict()
+
+    @staticmethod
+    def _serialize_state(current_state) -> dict | None:
+        if not current_state:
+            return None
+        if isinstance(current_state, dict):
+            return current_state
+        return current_state.dict()
+
     def get_trajectory_status(self, trajectory_id: str):
         # First check if trajectory is in memory (active/recent)
         if trajectory_id in self.trajectories:
@@ -445,7 +940,7 @@ class AgentRunner:
                 "end_time": trajectory["end_time"],
                 "step_count": trajectory["step_count"],
                 "running": trajectory_id in self.running_agents,
-                "current_state": trajectory["current_state"].dict() if trajectory["current_state"] else None,
+                "current_state": self._serialize_state(trajectory["current_state"]),
             }
 
         # If not in memory, check persisted files
@@ -472,6 +967,10 @@ class AgentRunner:
                 print(f"Error reading trajectory file {json_file}: {e}")
                 return None
 
+        found = self.bundles.find(trajectory_id)
+        if found is not None:
+            return {**found[1].summary, "running": False, "current_state": None}
+
         return None
 
     def list_trajectories(self):
@@ -516,25 +1015,82 @@ class AgentRunner:
                     print(f"Error reading trajectory file {json_file}: {e}")
                     continue
 
+        # Bundled runs are listed from the bundle indexes, without opening the bundles
+        listed = {trajectory.trajectory_id for trajectory in all_trajectories}
+        for summary in self.bundles.summaries():
+            if summary["trajectory_id"] not in listed:
+                all_trajectories.append(TrajectoryInfo(**summary))
+
         return all_trajectories
 
-    def get_trajectory_events(self, trajectory_id: str):
+    def get_trajectory_etag(self, trajectory_id: str) -> str | None:
+        """Changes whenever an event is stored, computed without reading the trajectory."""
+        json_file = Path("trajectories") / f"trajectory_{trajectory_id}.json"
+        try:
+            stat = json_file.stat()
+            return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        except FileNotFoundError:
+            pass
+        found = self.bundles.find(trajectory_id)
+        if found is not None:
+            # Bundled runs never change
+            return f'"{found[0].stem}"'
+        return None
+
+    def get_trajectory_events(self, trajectory_id: str, since: int = 0):
+        """Trajectory data with only its events from index `since` on."""
         trajectories_dir = Path("trajectories")
         json_file = trajectories_dir / f"trajectory_{trajectory_id}.json"
 
-        if not json_file.exists():
-            return None
-
         try:
-            with open(json_file, "r") as f:
-                file_data = json.load(f)
+            with self.file_locks.get(trajectory_id, threading.Lock()):
+                with open(json_file, "r") as f:
+                    file_data = json.load(f)
+                file_data["events"] = file_data.get("events", [])[since:]
+                frames_file = archive_path(json_file)
+                if frames_file.exists():
+                    with FrameArchiveReader(frames_file) as reader:
+                        hydrate_events(file_data, reader)
             return file_data
-        except (json.JSONDecodeError, IOError) as e:
+        except FileNotFoundError:
+            # Not there, or just compacted
+            pass
+        except (json.JSONDecodeError, IOError, ValueError) as e:
             print(f"Error reading trajectory file {json_file}: {e}")
             return None
 
+        try:
+            return self.bundles.read_events(trajectory_id, since=since)
+        except (json.JSONDecodeError, IOError, ValueError) as e:
+            print(f"Error reading bundled trajectory {trajectory_id}: {e}")
+            return None
+
+    def get_trajectory_frame(self, trajectory_id: str, frame: int) -> bytes | None:
+        """PNG of a single stored frame, read without decoding the rest of the archive."""
+        frames_file = archive_path(Path("trajectories") / f"trajectory_{trajectory_id}.json")
+        try:
+            if frames_file.exists():
+                with self.file_locks.get(trajectory_id, threading.Lock()):
+                    with FrameArchiveReader(frames_file) as reader:
+                        if not 0 <= frame < len(reader):
+                            return None
+                        return reader.frame_png(frame)
+            return self.bundles.read_frame(trajectory_id, frame)
+        except (IOError, ValueError) as e:
+            print(f"Error reading frames of trajectory {trajectory_id}: {e}")
+            return None
+
 
-agent_runner = AgentRunner()
+# Built on startup rather than on import: spawned worker processes re-import this module as __mp_main__, and must
+# not start another event pool, trajectory registry and caching proxy
+agent_runner: AgentRunner = None  # type: ignore[assignment]
+
+
+@app.on_event("startup")
+async def create_agent_runner():
+    """Registered first, the other startup hooks use the runner"""
+    global agent_runner
+    agent_runner = AgentRunner()
 
 
 @app.post("/start")
@@ -555,12 +1111,47 @@ async def start_agent(request: StartAgentRequest):
             temperature_validation=request.temperature_validation,
             headless_browser=request.headless_browser,
             action_timeout=request.action_timeout,
+            execution_mode=request.execution_mode,
+            browser_backend=request.browser_backend,
+            network_blocklists=request.network_blocklists,
+            blocked_resource_types=request.blocked_resource_types,
+            browser_profile=request.browser_profile,
+            use_macros=request.use_macros,
+            agent_mode=request.agent_mode,
+            image_codec_navigation=request.image_codec_navigation,
+            image_codec_localization=request.image_codec_localization,
+            image_codec_validation=request.image_codec_validation,
+            dedup_frames=request.dedup_frames,
+            backfill_frames=request.backfill_frames,
         )
         return result
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@app.post("/resume/{trajectory_id}")
+async def resume_agent(trajectory_id: str):
+    """Continue an interrupted trajectory from its last checkpoint"""
+    # Flushing the trajectory's pending events blocks
+    return await run_in_threadpool(agent_runner.resume_agent, trajectory_id)
+
+
+@app.on_event("startup")
+async def resume_interrupted_trajectories():
+    auto_resume = os.getenv("AUTO_RESUME_TRAJECTORIES", "").lower() in ("1", "true", "yes")
+    await run_in_threadpool(agent_runner.resume_interrupted_trajectories, auto_resume=auto_resume)
+
+
+@app.on_event("startup")
+async def start_trajectory_compaction():
+    ttl_days = os.getenv("TRAJECTORY_TTL_DAYS")
+    agent_runner.start_compaction(
+        interval_seconds=float(os.getenv("TRAJECTORY_COMPACTION_INTERVAL_SECONDS", "3600")),
+        compact_after_seconds=float(os.getenv("TRAJECTORY_COMPACT_AFTER_HOURS", "24")) * 3600,
+        ttl_seconds=float(ttl_days) * 86400 if ttl_days else None,
+    )
+
+
 @app.get("/status/{trajectory_id}")
 async def get_status(trajectory_id: str):
     status = agent_runner.get_trajectory_status(trajectory_id)
@@ -585,18 +1176,70 @@ async def get_trajectory(trajectory_id: str):
 
 
 @app.get("/trajectory/{trajectory_id}/events")
-async def get_trajectory_events(trajectory_id: str):
-    """Get full trajectory data including all historical events"""
-    trajectory_data = agent_runner.get_trajectory_events(trajectory_id)
+async def get_trajectory_events(trajectory_id: str, request: Request, since: int = 0):
+    """Get trajectory data with its events from index `since` on (all of them by default).
+
+    The ETag identifies the stored state of the trajectory: polling with If-None-Match set to the last ETag and
+    `since` set to the number of events received so far returns 304 until a new event is stored.
+    """
+    if since < 0:
+        raise HTTPException(status_code=400, detail="since must not be negative")
+    etag = agent_runner.get_trajectory_etag(trajectory_id)
+    if etag is not None and request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    trajectory_data = agent_runner.get_trajectory_events(trajectory_id, since=since)
     if not trajectory_data:
         raise HTTPException(status_code=404, detail="Trajectory not found")
-    return trajectory_data
+    trajectory_data["since"] = since
+    return JSONResponse(trajectory_data, headers={"ETag": etag} if etag else None)
+
+
+@app.on_event("shutdown")
+async def flush_events():
+    await run_in_threadpool(agent_runner.event_pool.flush)
+
+
+@app.get("/trajectory/{trajectory_id}/frames/{frame}")
+async def get_trajectory_frame(trajectory_id: str, frame: int):
+    """Get a single stored screenshot as PNG"""
+    png = agent_runner.get_trajectory_frame(trajectory_id, frame)
+    if png is None:
+        raise HTTPException(status_code=404, detail="Frame not found")
+    return Response(content=png, media_type="image/png")
+
+
+@app.get("/browser_profiles")
+async def list_browser_profiles():
+    """Persistent browser profiles with their size and whether a browser is using them"""
+    return [info.model_dump() for info in agent_runner.browser_profiles.profiles()]
+
+
+@app.post("/browser_profiles/{name}/reset")
+async def reset_browser_profile(name: str, template: str | None = None):
+    """Reset a profile to the template profile, or to an empty one"""
+    try:
+        agent_runner.browser_profiles.reset(name, template=template)
+    except ProfileLockedError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "reset", "name": name}
 
 
 @app.get("/health")
 async def health_check():
     """Simple health check endpoint"""
-    return {"status": "ok", "message": "Agent server is running", "port": 7999}
+    return {
+        "status": "ok",
+        "message": "Agent server is running",
+        "port": 7999,
+        "event_pool": agent_runner.event_pool.stats(),
+        "trajectory_registry": agent_runner.trajectories.stats(),
+        "caching_proxy": agent_runner.caching_proxy.stats() if agent_runner.caching_proxy is not None else None,
+        # Calls made by worker processes are hedged and counted there
+        "hedging": hedging_stats() if agent_runner.hedging is not None else None,
+    }
 
 
 if __name__ == "__main__":
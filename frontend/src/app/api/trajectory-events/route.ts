@@ -5,14 +5,27 @@ const FASTAPI_BASE_URL = 'http://localhost:7999';
 export async function GET(request: NextRequest) {
   const { searchParams } = new URL(request.url);
   const trajectoryId = searchParams.get('trajectoryId');
+  const since = searchParams.get('since');
 
   if (!trajectoryId) {
     return new Response('trajectoryId parameter is required', { status: 400 });
   }
 
   try {
-    // Fetch trajectory data from the JSON file
-    const response = await fetch(`${FASTAPI_BASE_URL}/trajectory/${trajectoryId}/events`);
+    // Only the events after `since` are fetched, and nothing at all if the trajectory did not change
+    const query = since ? `?since=${encodeURIComponent(since)}` : '';
+    const ifNoneMatch = request.headers.get('if-none-match');
+    const response = await fetch(`${FASTAPI_BASE_URL}/trajectory/${trajectoryId}/events${query}`, {
+      headers: ifNoneMatch ? { 'If-None-Match': ifNoneMatch } : {},
+      cache: 'no-store',
+    });
+
+    const etag = response.headers.get('etag');
+    const headers: HeadersInit = etag ? { ETag: etag } : {};
+
+    if (response.status === 304) {
+      return new Response(null, { status: 304, headers });
+    }
 
     if (!response.ok) {
       return new Response(`Failed to fetch trajectory: ${response.status}`, {
@@ -21,7 +34,7 @@ export async function GET(request: NextRequest) {
     }
 
     const trajectoryData = await response.json();
-    return Response.json(trajectoryData);
+    return Response.json(trajectoryData, { headers });
   } catch (error) {
     console.error('Error fetching trajectory data:', error);
     return new Response('Failed to fetch trajectory data', { status: 500 });
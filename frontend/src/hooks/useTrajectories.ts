@@ -1,5 +1,5 @@
 import { useMutation, useQuery, useQueryClient } from '@tanstack/react-query';
-import { useEffect } from 'react';
+import { useEffect, useRef } from 'react';
 
 // Updated interfaces to match our FastAPI server
 export interface StartTrajectoryRequest {
@@ -173,21 +173,44 @@ export function useTrajectoryPolling(
 ) {
   const { pollInterval = 1000 } = options || {};
 
+  // Events received so far and the ETag of the last response, so that each poll only fetches what is new
+  const eventsRef = useRef<TrajectoryEvent[]>([]);
+  const etagRef = useRef<string | null>(null);
+  const lastDataRef = useRef<{ events: TrajectoryEvent[]; status: string; step_count: number; id?: string } | null>(
+    null
+  );
+
+  useEffect(() => {
+    eventsRef.current = [];
+    etagRef.current = null;
+    lastDataRef.current = null;
+  }, [trajectoryId]);
+
   const query = useQuery({
     queryKey: ['trajectory-polling', trajectoryId],
     queryFn: async () => {
-      const response = await fetch(`/api/trajectory-events?trajectoryId=${trajectoryId}`);
+      const since = eventsRef.current.length;
+      const response = await fetch(`/api/trajectory-events?trajectoryId=${trajectoryId}&since=${since}`, {
+        headers: etagRef.current ? { 'If-None-Match': etagRef.current } : {},
+        cache: 'no-store',
+      });
+      if (response.status === 304 && lastDataRef.current) {
+        return lastDataRef.current;
+      }
       if (!response.ok) {
         const errorData = await response.json().catch(() => ({ detail: 'Failed to fetch trajectory data' }));
         throw new Error(errorData.detail || 'Failed to fetch trajectory data');
       }
       const data = await response.json();
-      return {
-        events: data.events || [],
+      etagRef.current = response.headers.get('ETag');
+      eventsRef.current = [...eventsRef.current, ...(data.events || [])];
+      lastDataRef.current = {
+        events: eventsRef.current,
         status: data.status || 'unknown',
         step_count: data.step_count || 0,
         id: data.id,
       };
+      return lastDataRef.current;
     },
     enabled: options?.enabled !== false && !!trajectoryId,
     refetchInterval: pollInterval,
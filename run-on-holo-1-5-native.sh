@@ -13,7 +13,7 @@ echo ""
 
 # Task configuration
 echo "📄 Loading task from instructions-native.txt"
-URL="file:///home/justine/Documents/surfer-h-cli/automation_forms_filling/login.html"
+URL="${URL:-file://$(pwd)/automation_forms_filling/login.html}"
 
 echo "🌐 Target URL: $URL"
 echo "🤖 Model: $HAI_MODEL_NAME_NAVIGATION"
@@ -30,4 +30,4 @@ export API_KEY_NAVIGATION="$HAI_API_KEY"
 echo ""
 echo "🎯 Starting native DOM agent..."
 echo ""
-uv run python surferh_native.py
+uv run python surferh_native.py --url "$URL"
@@ -0,0 +1,92 @@
+from multiprocessing.queues import Queue
+from typing import Any
+
+from openai import OpenAI
+
+from surfer_h_cli import surferh
+from surfer_h_cli.checkpoint import CheckpointStore
+from surfer_h_cli.hedging import HedgingPolicy, hedge_client
+from surfer_h_cli.macros import MacroStore
+from surfer_h_cli.simple_browser import create_browser
+from surfer_h_cli.utils import image_to_b64
+
+
+def summarize_state(agent_state: surferh.AgentState | None) -> dict | None:
+    """Picklable subset of the agent state that the server stores with each event."""
+    if agent_state is None:
+        return None
+    return {
+        "timestep": agent_state.timestep,
+        "url": agent_state.url,
+        "notes": agent_state.notes,
+        "task": agent_state.task,
+    }
+
+
+def run_agent_worker(
+    event_queue: Queue,
+    trajectory_id: str,
+    task: str,
+    url: str,
+    browser_settings: dict[str, Any],
+    model_configs: dict[str, tuple[str, str | None]],
+    agent_settings: dict[str, Any],
+    checkpoint_dir: str | None = None,
+    macro_dir: str | None = None,
+    hedging: HedgingPolicy | None = None,
+):
+    """Run one trajectory in a worker process and stream its events back to the server.
+
+    Screenshots are PNG-encoded here, so the CPU-heavy work happens on the worker's own interpreter
+    instead of competing for the server's GIL. Messages put on the queue are tuples:
+
+    - ("event", event_type, message, state_summary, screenshot_b64)
+    - ("result", answer, screenshot_b64)
+    - ("error", message, None)
+    """
+
+    def forward_event(event_type, message, agent_state):
+        screenshot_b64 = None
+        if agent_state and agent_state.screenshots and event_type.lower() == "screenshot":
+            screenshot_b64 = image_to_b64(agent_state.screenshots[-1], "png")
+        event_queue.put(("event", event_type, message, summarize_state(agent_state), screenshot_b64))
+
+    surferh.set_event_callback(forward_event)
+
+    browser_settings = dict(browser_settings)
+    browser = create_browser(browser_settings.pop("backend", "selenium"))
+    try:
+        browser.open_browser(**browser_settings)
+
+        clients = {
+            role: OpenAI(api_key=api_key, base_url=base_url) for role, (api_key, base_url) in model_configs.items()
+        }
+        if hedging is not None:
+            clients = {role: hedge_client(client, hedging) for role, client in clients.items()}
+
+        checkpoint_store = None
+        if checkpoint_dir is not None:
+            checkpoint_store = CheckpointStore(checkpoint_dir, n_frames=agent_settings["n_navigation_screenshots"])
+
+        answer, screenshots = surferh.agent_loop(
+            task=task,
+            url=url,
+            browser=browser,
+            openai_client_navigation=clients["navigation"],
+            openai_client_localization=clients["localization"],
+            openai_client_validation=clients.get("validation", clients["navigation"]),
+            trajectory_id=trajectory_id,
+            checkpoint_store=checkpoint_store,
+            macro_store=MacroStore(macro_dir) if macro_dir is not None else None,
+            **agent_settings,
+        )
+
+        final_screenshot_b64 = image_to_b64(screenshots[-1], "png") if screenshots else None
+        event_queue.put(("result", answer, final_screenshot_b64))
+    except Exception as e:
+        event_queue.put(("error", f"Agent failed: {e}", None))
+    finally:
+        try:
+            browser.quit()
+        except Exception:
+            pass
@@ -0,0 +1,199 @@
+"""Persistent Chrome user-data directories, so that HTTP caches and cookies survive between runs.
+
+Profiles are named directories under a root, e.g. one per site, per tenant or per browser pool slot. A browser leases
+a profile for its whole life: the lease is an flock on the profile's lock file, so two browsers never share a profile
+and a crashed process releases it. On release, a profile over its size cap has its caches trimmed, cookies and local
+storage are kept. A profile can be reset to a template profile, e.g. one where cookie banners were already accepted.
+"""
+
+import fcntl
+import os
+import re
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+
+from pydantic import BaseModel
+
+PROFILE_NAME_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]*$")
+
+# Directories Chrome rebuilds on demand, removed in this order when a profile is over its size cap
+CACHE_DIRS = (
+    "Default/Cache",
+    "Default/Code Cache",
+    "Default/Service Worker/CacheStorage",
+    "Default/Service Worker/ScriptCache",
+    "Default/GPUCache",
+    "GrShaderCache",
+    "GraphiteDawnCache",
+    "ShaderCache",
+    "component_crx_cache",
+)
+
+# Chrome's own lock of a profile in use, stale once we hold the lease since the browser that held it is gone
+SINGLETON_FILES = ("SingletonLock", "SingletonSocket", "SingletonCookie")
+
+
+class ProfileLockedError(RuntimeError):
+    """The profile is leased by another browser"""
+
+    pass
+
+
+class ProfileInfo(BaseModel):
+    name: str
+    size_bytes: int
+    locked: bool
+    last_used: str | None = None
+
+
+def directory_size(path: Path) -> int:
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, filename)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class ProfileLease:
+    """Exclusive use of a profile, until `release` or the end of the `with` block. Quit the browser first."""
+
+    def __init__(self, store: "BrowserProfileStore", name: str, lock_fd: int):
+        self.store = store
+        self.name = name
+        self.path = store.profile_path(name)
+        self._lock_fd: int | None = lock_fd
+
+    def release(self):
+        if self._lock_fd is None:
+            return
+        try:
+            self.store.trim(self.name)
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    def __enter__(self) -> "ProfileLease":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class BrowserProfileStore:
+    """Named profiles under `root`, each capped to `max_profile_bytes`, created from `template` when set."""
+
+    def __init__(self, root: str | Path, max_profile_bytes: int = 2**30, template: str | None = None):
+        self.root = Path(root)
+        self.locks_dir = self.root / ".locks"
+        self.locks_dir.mkdir(parents=True, exist_ok=True)
+        self.max_profile_bytes = max_profile_bytes
+        self.template = template
+
+    def profile_path(self, name: str) -> Path:
+        if not PROFILE_NAME_PATTERN.match(name):
+            raise ValueError(f"Invalid browser profile name {name!r}")
+        return self.root / name
+
+    def _lock_path(self, name: str) -> Path:
+        return self.locks_dir / f"{name}.lock"
+
+    def _lock(self, name: str, timeout: float, poll_interval: float = 0.5) -> int:
+        self.profile_path(name)
+        lock_fd = os.open(self._lock_path(name), os.O_RDWR | os.O_CREAT, 0o644)
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return lock_fd
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    os.close(lock_fd)
+                    raise ProfileLockedError(f"Browser profile {name} is in use")
+                time.sleep(poll_interval)
+
+    def acquire(self, name: str, timeout: float = 0.0) -> ProfileLease:
+        """Lease a profile, created if it does not exist, waiting up to `timeout` seconds for another lease to end."""
+        lock_fd = self._lock(name, timeout)
+        try:
+            path = self.profile_path(name)
+            if not path.exists():
+                self._populate(path)
+            for singleton in SINGLETON_FILES:
+                (path / singleton).unlink(missing_ok=True)
+            os.utime(self._lock_path(name))
+        except BaseException:
+            fcntl.flock(lock_fd, fcntl.LOCK_UN)
+            os.close(lock_fd)
+            raise
+        return ProfileLease(self, name, lock_fd)
+
+    def _populate(self, path: Path, template: str | None = None):
+        template = template or self.template
+        if template is not None and self.profile_path(template).exists() and self.profile_path(template) != path:
+            shutil.copytree(
+                self.profile_path(template), path, symlinks=True, ignore=shutil.ignore_patterns(*SINGLETON_FILES)
+            )
+        else:
+            path.mkdir(parents=True)
+
+    def reset(self, name: str, template: str | None = None, timeout: float = 0.0):
+        """Replace a profile by a copy of `template`, the store's template by default, or by an empty profile."""
+        lock_fd = self._lock(name, timeout)
+        try:
+            path = self.profile_path(name)
+            shutil.rmtree(path, ignore_errors=True)
+            self._populate(path, template)
+        finally:
+            fcntl.flock(lock_fd, fcntl.LOCK_UN)
+            os.close(lock_fd)
+
+    def size(self, name: str) -> int:
+        return directory_size(self.profile_path(name))
+
+    def trim(self, name: str) -> int:
+        """Remove caches until the profile is under the size cap, returns the bytes freed. Only call it on a profile
+        no browser is using."""
+        path = self.profile_path(name)
+        size = directory_size(path)
+        freed = 0
+        for cache_dir in CACHE_DIRS:
+            if size - freed <= self.max_profile_bytes:
+                break
+            cache_path = path / cache_dir
+            if cache_path.is_dir():
+                freed += directory_size(cache_path)
+                shutil.rmtree(cache_path, ignore_errors=True)
+        if size - freed > self.max_profile_bytes:
+            print(f"⚠️  Browser profile {name} is {size - freed} bytes without caches, over its cap")
+        return freed
+
+    def is_locked(self, name: str) -> bool:
+        try:
+            os.close(self._lock(name, timeout=0.0))
+        except ProfileLockedError:
+            return True
+        return False
+
+    def profiles(self) -> list[ProfileInfo]:
+        infos = []
+        for path in sorted(self.root.iterdir()):
+            if not path.is_dir() or not PROFILE_NAME_PATTERN.match(path.name):
+                continue
+            # Leases touch the lock file
+            lock_path = self._lock_path(path.name)
+            last_used = datetime.fromtimestamp(lock_path.stat().st_mtime).isoformat() if lock_path.exists() else None
+            infos.append(
+                ProfileInfo(
+                    name=path.name,
+                    size_bytes=directory_size(path),
+                    locked=self.is_locked(path.name),
+                    last_used=last_used,
+                )
+            )
+        return infos
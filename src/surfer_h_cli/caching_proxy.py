@@ -0,0 +1,816 @@
+"""Shared HTTP caching forward proxy for the browsers of all trajectories.
+
+Each Chrome keeps its own cache, so parallel trajectories fetch the same CDN assets once per browser. Routed through
+this proxy, browsers share one on-disk cache, bounded in size with least recently used eviction. Cache headers are
+honored, stale responses are revalidated with their validators, and static assets (scripts, styles, images, fonts)
+can optionally be cached for a fixed time whatever their headers say.
+
+Almost all traffic is HTTPS, which a forward proxy only sees as CONNECT tunnels. When the optional `cryptography`
+package is installed, the proxy terminates these tunnels with certificates of its own CA, and browsers are told to
+accept exactly that key with --ignore-certificate-errors-spki-list. Without it, HTTPS is tunneled and not cached.
+
+With a `NetworkArchive`, the proxy records every response instead of caching, or replays recorded responses without
+ever reaching the internet, see `surfer_h_cli.record_replay`.
+
+Runs embedded in the CLI or the agent server, or standalone to be shared by several processes:
+
+    python -m surfer_h_cli.caching_proxy --cache_dir proxy_cache --port 8899
+"""
+
+import argparse
+import base64
+import hashlib
+import http.client
+import ipaddress
+import json
+import os
+import select
+import socket
+import ssl
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from pydantic import BaseModel
+
+from surfer_h_cli.record_replay import NetworkArchive
+
+try:
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+except ImportError:
+    # cryptography not available, HTTPS is tunneled without caching
+    x509 = None
+
+HOP_BY_HOP_HEADERS = {
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "proxy-connection",
+    "te",
+    "trailer",
+    "transfer-encoding",
+    "upgrade",
+}
+CACHEABLE_STATUSES = (200, 203, 301, 308)
+STATIC_EXTENSIONS = (".js", ".mjs", ".css", ".png", ".jpg", ".jpeg", ".gif", ".webp", ".avif", ".svg", ".ico")
+STATIC_EXTENSIONS += (".woff", ".woff2", ".ttf", ".otf")
+STATIC_CONTENT_TYPES = ("text/css", "text/javascript", "application/javascript", "image/", "font/")
+HEURISTIC_MAX_LIFETIME = 24 * 3600.0
+"""Cap of the lifetime guessed from Last-Modified, for responses without explicit freshness"""
+
+
+class ProxySettings(BaseModel):
+    server: str
+    """Address of the proxy, e.g. http://127.0.0.1:8899"""
+    spki_hashes: list[str] = []
+    """Public keys of the proxy's certificates the browser accepts, when the proxy intercepts HTTPS"""
+
+    def chrome_arguments(self) -> list[str]:
+        arguments = [f"--proxy-server={self.server}"]
+        if self.spki_hashes:
+            arguments.append(f"--ignore-certificate-errors-spki-list={','.join(self.spki_hashes)}")
+        return arguments
+
+
+class CachedResponse(BaseModel):
+    url: str
+    status: int
+    reason: str
+    headers: list[tuple[str, str]]
+    stored_at: float
+    fresh_until: float
+
+
+def parse_cache_control(value: str) -> dict[str, str | None]:
+    directives: dict[str, str | None] = {}
+    for directive in value.split(","):
+        name, _, argument = directive.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip('"') or None
+    return directives
+
+
+def parse_http_date(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def is_static_asset(url: str, content_type: str) -> bool:
+    return urlsplit(url).path.lower().endswith(STATIC_EXTENSIONS) or content_type.lower().startswith(
+        STATIC_CONTENT_TYPES
+    )
+
+
+def freshness_lifetime(url: str, headers: dict[str, str], static_ttl: float | None = None) -> float | None:
+    """Seconds a response stays fresh in a shared cache, 0 when it has to be revalidated on every use, None when it
+    must not be stored. `headers` are the response headers with lowercase names."""
+    cache_control = parse_cache_control(headers.get("cache-control", ""))
+    if "no-store" in cache_control or "private" in cache_control or "set-cookie" in headers:
+        return None
+    vary = {name.strip().lower() for name in headers.get("vary", "").split(",")} - {""}
+    if vary - {"accept-encoding"}:
+        return None
+    if static_ttl is not None and is_static_asset(url, headers.get("content-type", "")):
+        return static_ttl
+    if "no-cache" in cache_control:
+        return 0.0
+    for directive in ("s-maxage", "max-age"):
+        if directive in cache_control:
+            try:
+                return max(0.0, float(cache_control[directive] or 0))
+            except ValueError:
+                return 0.0
+
+    date = parse_http_date(headers.get("date")) or time.time()
+    expires = parse_http_date(headers.get("expires"))
+    if "expires" in headers:
+        return max(0.0, expires - date) if expires is not None else 0.0
+    last_modified = parse_http_date(headers.get("last-modified"))
+    if last_modified is not None:
+        return min(HEURISTIC_MAX_LIFETIME, max(0.0, date - last_modified) / 10)
+    return 0.0 if "etag" in headers else None
+
+
+def cache_key(url: str, accept_encoding: str) -> str:
+    return hashlib.sha256(f"{url}\n{accept_encoding}".encode()).hexdigest()
+
+
+class ResponseCache:
+    """Responses stored as a body file and a metadata file each, evicted least recently used first beyond
+    `max_bytes`. The order survives restarts through the modification time of the metadata files."""
+
+    def __init__(self, directory: str | Path, max_bytes: int):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.n_evicted = 0
+        self._sizes: OrderedDict[str, int] = OrderedDict()
+        self._lock = threading.Lock()
+
+        entries = []
+        for meta_path in self.directory.glob("*.json"):
+            try:
+                stat = meta_path.stat()
+                size = stat.st_size + self._body_path(meta_path.stem).stat().st_size
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, meta_path.stem, size))
+        for _, key, size in sorted(entries):
+            self._sizes[key] = size
+            self.total_bytes += size
+        with self._lock:
+            self._evict()
+
+    def _meta_path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def _body_path(self, key: str) -> Path:
+        return self.directory / f"{key}.body"
+
+    def __len__(self) -> int:
+        return len(self._sizes)
+
+    def get(self, key: str) -> tuple[CachedResponse, bytes] | None:
+        with self._lock:
+            if key not in self._sizes:
+                return None
+            self._sizes.move_to_end(key)
+        try:
+            with open(self._meta_path(key), "r") as f:
+                response = CachedResponse.model_validate(json.load(f))
+            body = self._body_path(key).read_bytes()
+            os.utime(self._meta_path(key))
+        except (OSError, ValueError):
+            self.delete(key)
+            return None
+        return response, body
+
+    def _write(self, path: Path, data: bytes):
+        tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+    def put(self, key: str, response: CachedResponse, body: bytes):
+        meta = response.model_dump_json().encode()
+        try:
+            self._write(self._body_path(key), body)
+            self._write(self._meta_path(key), meta)
+        except OSError as e:
+            print(f"Error caching {response.url}: {e}")
+            return
+        with self._lock:
+            self.total_bytes += len(meta) + len(body) - self._sizes.get(key, 0)
+            self._sizes[key] = len(meta) + len(body)
+            self._sizes.move_to_end(key)
+            self._evict()
+
+    def update(self, key: str, response: CachedResponse):
+        """Replace the metadata of a response that was revalidated"""
+        try:
+            self._write(self._meta_path(key), response.model_dump_json().encode())
+        except OSError as e:
+            print(f"Error caching {response.url}: {e}")
+
+    def delete(self, key: str):
+        with self._lock:
+            self.total_bytes -= self._sizes.pop(key, 0)
+        self._meta_path(key).unlink(missing_ok=True)
+        self._body_path(key).unlink(missing_ok=True)
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self._sizes:
+            key, size = self._sizes.popitem(last=False)
+            self.total_bytes -= size
+            self.n_evicted += 1
+            self._meta_path(key).unlink(missing_ok=True)
+            self._body_path(key).unlink(missing_ok=True)
+
+
+def spki_hash(public_key) -> str:
+    """Hash of a public key in the format of --ignore-certificate-errors-spki-list"""
+    der = public_key.public_bytes(serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo)
+    return base64.b64encode(hashlib.sha256(der).digest()).decode()
+
+
+class CertificateAuthority:
+    """CA of the proxy, kept in `directory`, issuing one certificate per intercepted host. All host certificates
+    share one key, so a browser only needs to accept two public keys."""
+
+    def __init__(self, directory: str | Path):
+        self.directory = Path(directory)
+        (self.directory / "hosts").mkdir(parents=True, exist_ok=True)
+        self.key = self._load_key("ca_key.pem")
+        self.host_key = self._load_key("host_key.pem")
+        ca_path = self.directory / "ca.pem"
+        if ca_path.exists():
+            self.certificate = x509.load_pem_x509_certificate(ca_path.read_bytes())
+        else:
+            name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "Surfer H caching proxy CA")])
+            self.certificate = (
+                self._builder(name, self.key.public_key(), days=3650)
+                .issuer_name(name)
+                .add_extension(x509.BasicConstraints(ca=True, path_length=0), critical=True)
+                .sign(self.key, hashes.SHA256())
+            )
+            ca_path.write_bytes(self.certificate.public_bytes(serialization.Encoding.PEM))
+        self._contexts: dict[str, ssl.SSLContext] = {}
+        self._lock = threading.Lock()
+
+    def _load_key(self, filename: str):
+        path = self.directory / filename
+        if path.exists():
+            return serialization.load_pem_private_key(path.read_bytes(), password=None)
+        key = ec.generate_private_key(ec.SECP256R1())
+        path.write_bytes(
+            key.private_bytes(
+                serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+            )
+        )
+        path.chmod(0o600)
+        return key
+
+    @staticmethod
+    def _builder(subject, public_key, days: int):
+        now = datetime.now(timezone.utc)
+        return (
+            x509.CertificateBuilder()
+            .subject_name(subject)
+            .public_key(public_key)
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - timedelta(days=1))
+            .not_valid_after(now + timedelta(days=days))
+        )
+
+    @property
+    def spki_hashes(self) -> list[str]:
+        return [spki_hash(self.key.public_key()), spki_hash(self.host_key.public_key())]
+
+    def context_for(self, host: str) -> ssl.SSLContext:
+        """TLS server context presenting a certificate for `host`"""
+        with self._lock:
+            if host in self._contexts:
+                return self._contexts[host]
+            cert_path = self.directory / "hosts" / f"{hashlib.sha256(host.encode()).hexdigest()[:32]}.pem"
+            if not cert_path.exists():
+                try:
+                    alt_name = x509.IPAddress(ipaddress.ip_address(host))
+                except ValueError:
+                    alt_name = x509.DNSName(host)
+                subject = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, host[:64])])
+                certificate = (
+                    self._builder(subject, self.host_key.public_key(), days=365)
+                    .issuer_name(self.certificate.subject)
+                    .add_extension(x509.SubjectAlternativeName([alt_name]), critical=False)
+                    .sign(self.key, hashes.SHA256())
+                )
+                cert_path.write_bytes(
+                    certificate.public_bytes(serialization.Encoding.PEM)
+                    + self.certificate.public_bytes(serialization.Encoding.PEM)
+                )
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(cert_path, self.directory / "host_key.pem")
+            # The proxy speaks HTTP/1.1 only
+            context.set_alpn_protocols(["http/1.1"])
+            self._contexts[host] = context
+            return context
+
+
+def relay(client: socket.socket, upstream: socket.socket, timeout: float):
+    """Copy bytes both ways until either side closes or stays idle for `timeout` seconds"""
+    sockets = [client, upstream]
+    while True:
+        # TLS sockets can hold decrypted bytes that select does not see
+        readable = [sock for sock in sockets if isinstance(sock, ssl.SSLSocket) and sock.pending()]
+        if not readable:
+            readable, _, errored = select.select(sockets, [], sockets, timeout)
+            if errored or not readable:
+                return
+        for sock in readable:
+            try:
+                data = sock.recv(65536)
+            except (OSError, ssl.SSLError):
+                return
+            if not data:
+                return
+            (upstream if sock is client else client).sendall(data)
+
+
+class ProxyRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "ProxyServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def proxy(self) -> "CachingProxy":
+        return self.server.proxy
+
+    def do_CONNECT(self):
+        host, _, port = self.path.rpartition(":")
+        host = host.strip("[]")
+        if self.proxy.authority is None:
+            if self.proxy.replay:
+                self.send_error(504, "HTTPS is not replayed without interception")
+                return
+            self._tunnel(host, int(port or 443))
+            return
+
+        self.send_response(200, "Connection Established")
+        self.end_headers()
+        self.close_connection = True
+        try:
+            tls = self.proxy.authority.context_for(host).wrap_socket(self.connection, server_side=True)
+        except (ssl.SSLError, OSError):
+            return
+        try:
+            # Serves the requests of the tunnel, which are relative to the host
+            type(self)(tls, self.client_address, self.server)
+        except (ssl.SSLError, OSError):
+            pass
+        finally:
+            tls.close()
+
+    def _tunnel(self, host: str, port: int):
+        self.close_connection = True
+        try:
+            upstream = socket.create_connection((host, port), timeout=self.proxy.timeout)
+        except OSError as e:
+            self.send_error(502, f"Cannot reach {host}:{port}: {e}")
+            return
+        self.proxy.record("tunnels")
+        with upstream:
+            self.send_response(200, "Connection Established")
+            self.end_headers()
+            relay(self.connection, upstream, self.proxy.timeout)
+
+    def _target(self) -> tuple[str, str, int, str, str]:
+        """Scheme, host, port, path and URL of the request: absolute for plain HTTP, relative to the Host header
+        inside an intercepted tunnel"""
+        if self.path.startswith(("http://", "https://")):
+            parts = urlsplit(self.path)
+        else:
+            scheme = "https" if isinstance(self.connection, ssl.SSLSocket) else "http"
+            parts = urlsplit(f"{scheme}://{self.headers.get('Host', '')}{self.path}")
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        return parts.scheme, parts.hostname or "", port, path, f"{parts.scheme}://{parts.netloc}{path}"
+
+    def _proxy_request(self):
+        scheme, host, port, path, url = self._target()
+        if not host:
+            self.send_error(400, "Missing host")
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else None
+        headers = {name: value for name, value in self.headers.items() if name.lower() not in HOP_BY_HOP_HEADERS}
+
+        if self.proxy.replay:
+            self._replay(url, body)
+            return
+        if self.headers.get("Upgrade"):
+            self._relay_upgrade(scheme, host, port, body)
+            return
+        if self.proxy.archive is not None:
+            self._record(scheme, host, port, path, headers, body, url)
+            return
+        if self.command not in ("GET", "HEAD") or "Authorization" in self.headers or body:
+            self.proxy.record("uncacheable")
+            self._forward(scheme, host, port, path, headers, body)
+            return
+
+        key = cache_key(url, self.headers.get("Accept-Encoding", ""))
+        request_cache_control = parse_cache_control(self.headers.get("Cache-Control", ""))
+        revalidate = "no-cache" in request_cache_control or "no-cache" in self.headers.get("Pragma", "")
+        cached = self.proxy.cache.get(key)
+        if cached is not None:
+            response, cached_body = cached
+            if not revalidate and response.fresh_until > time.time():
+                self.proxy.record("hits", len(cached_body))
+                self._send_cached(response, cached_body, "HIT")
+                return
+            # Revalidate with our validators, the browser gets the full response either way
+            headers = {
+                name: value
+                for name, value in headers.items()
+                if name.lower() not in ("if-none-match", "if-modified-since")
+            }
+            cached_headers = {name.lower(): value for name, value in response.headers}
+            if "etag" in cached_headers:
+                headers["If-None-Match"] = cached_headers["etag"]
+            if "last-modified" in cached_headers:
+                headers["If-Modified-Since"] = cached_headers["last-modified"]
+
+        self._forward(scheme, host, port, path, headers, None, key=key, url=url, cached=cached)
+
+    do_GET = do_HEAD = do_POST = do_PUT = do_DELETE = do_PATCH = do_OPTIONS = _proxy_request
+
+    def _request_upstream(self, scheme: str, host: str, port: int, path: str, headers: dict, body: bytes | None):
+        for attempt in range(2):
+            connection = self.proxy.connection(scheme, host, port, fresh=attempt > 0)
+            try:
+                connection.request(self.command, path, body=body, headers=headers)
+                return connection, connection.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # A kept-alive connection closed by the server, retried once on a new one
+                connection.close()
+                if attempt == 1:
+                    raise
+        raise AssertionError("unreachable")
+
+    def _record(self, scheme: str, host: str, port: int, path: str, headers: dict, body: bytes | None, url: str):
+        """Fetch a full response and archive it, bypassing the cache so that every response is recorded"""
+        # A 304 answering the browser's own cache would be useless to a browser replaying with an empty cache
+        headers = {
+            name: value for name, value in headers.items() if name.lower() not in ("if-none-match", "if-modified-since")
+        }
+        try:
+            connection, response = self._request_upstream(scheme, host, port, path, headers, body)
+        except (OSError, http.client.HTTPException) as e:
+            self.send_error(502, f"Upstream request failed: {e}")
+            return
+        try:
+            response_body = response.read()
+            response_headers = [
+                (name, value)
+                for name, value in response.getheaders()
+                if name.lower() not in HOP_BY_HOP_HEADERS and name.lower() != "content-length"
+            ]
+            self.proxy.archive.put(
+                self.command, url, body, response.status, response.reason, response_headers, response_body
+            )
+            self.proxy.record("recorded", 0, len(response_body))
+            self._send_full(response.status, response.reason, response_headers, response_body, "RECORDED")
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            self.close_connection = True
+        finally:
+            if response.will_close:
+                connection.close()
+
+    def _replay(self, url: str, body: bytes | None):
+        archived = self.proxy.archive.get(self.command, url, body)
+        if archived is None:
+            self.proxy.record("replay_misses")
+            self.send_error(504, "Not in the network recording")
+            return
+        response, response_body = archived
+        self.proxy.record("replayed", len(response_body))
+        self._send_full(response.status, response.reason, response.headers, response_body, "REPLAYED")
+
+    def _forward(
+        self,
+        scheme: str,
+        host: str,
+        port: int,
+        path: str,
+        headers: dict,
+        body: bytes | None,
+        key: str | None = None,
+        url: str | None = None,
+        cached: tuple[CachedResponse, bytes] | None = None,
+    ):
+        try:
+            connection, response = self._request_upstream(scheme, host, port, path, headers, body)
+        except (OSError, http.client.HTTPException) as e:
+            if cached is not None:
+                # Stale is better than nothing
+                self._send_cached(cached[0], cached[1], "STALE")
+                return
+            self.send_error(502, f"Upstream request failed: {e}")
+            return
+
+        try:
+            response_headers = {name.lower(): value for name, value in response.getheaders()}
+            now = time.time()
+            if cached is not None and response.status == 304:
+                response.read()
+                cached_response, cached_body = cached
+                merged = {name.lower(): value for name, value in cached_response.headers}
+                merged.update(
+                    {name: value for name, value in response_headers.items() if name not in HOP_BY_HOP_HEADERS}
+                )
+                lifetime = freshness_lifetime(url, merged, self.proxy.static_ttl)
+                cached_response.fresh_until = now + (lifetime or 0.0)
+                self.proxy.cache.update(key, cached_response)
+                self.proxy.record("revalidated", len(cached_body))
+                self._send_cached(cached_response, cached_body, "REVALIDATED")
+                return
+
+            lifetime = None
+            if key is not None and self.command == "GET" and response.status in CACHEABLE_STATUSES:
+                lifetime = freshness_lifetime(url, response_headers, self.proxy.static_ttl)
+            if lifetime is None:
+                if key is not None:
+                    self.proxy.record("uncacheable")
+                self._stream(response, b"", "BYPASS")
+                return
+
+            prefix = response.read(self.proxy.max_object_bytes + 1)
+            if len(prefix) > self.proxy.max_object_bytes:
+                self.proxy.record("uncacheable")
+                self._stream(response, prefix, "BYPASS")
+                return
+            stored = CachedResponse(
+                url=url,
+                status=response.status,
+                reason=response.reason,
+                headers=[
+                    (name, value)
+                    for name, value in response.getheaders()
+                    if name.lower() not in HOP_BY_HOP_HEADERS and name.lower() != "content-length"
+                ],
+                stored_at=now,
+                fresh_until=now + lifetime,
+            )
+            self.proxy.cache.put(key, stored, prefix)
+            self.proxy.record("misses", 0, len(prefix))
+            self._send_cached(stored, prefix, "MISS")
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            self.close_connection = True
+        finally:
+            if response.will_close:
+                connection.close()
+
+    def _send_headers(self, status: int, reason: str, headers: list[tuple[str, str]], cache_status: str):
+        self.send_response(status, reason)
+        for name, value in headers:
+            if name.lower() not in HOP_BY_HOP_HEADERS and name.lower() != "content-length":
+                self.send_header(name, value)
+        self.send_header("X-Cache", cache_status)
+
+    def _send_cached(self, response: CachedResponse, body: bytes, cache_status: str):
+        self._send_full(response.status, response.reason, response.headers, body, cache_status)
+
+    def _send_full(self, status: int, reason: str, headers: list[tuple[str, str]], body: bytes, cache_status: str):
+        self._send_headers(status, reason, headers, cache_status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _stream(self, response: http.client.HTTPResponse, prefix: bytes, cache_status: str):
+        """Pass a response through as it arrives, after `prefix` already read from it"""
+        self._send_headers(response.status, response.reason, response.getheaders(), cache_status)
+        no_body = self.command == "HEAD" or response.status in (204, 304) or 100 <= response.status < 200
+        length = response.getheader("Content-Length")
+        if no_body:
+            self.send_header("Content-Length", "0" if self.command != "HEAD" else length or "0")
+            self.end_headers()
+            return
+        chunked = length is None
+        if chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+        else:
+            self.send_header("Content-Length", length)
+        self.end_headers()
+
+        n_bytes = 0
+        data = prefix
+        while True:
+            if data:
+                n_bytes += len(data)
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data) if chunked else data)
+            data = response.read1(65536)
+            if not data:
+                break
+        if chunked:
+            self.wfile.write(b"0\r\n\r\n")
+        self.proxy.record("streamed", 0, n_bytes)
+
+    def _relay_upgrade(self, scheme: str, host: str, port: int, body: bytes | None):
+        """Pass an upgraded connection, e.g. a websocket, through as raw bytes"""
+        self.close_connection = True
+        try:
+            upstream = socket.create_connection((host, port), timeout=self.proxy.timeout)
+            if scheme == "https":
+                upstream = self.proxy.upstream_context.wrap_socket(upstream, server_hostname=host)
+        except OSError as e:
+            self.send_error(502, f"Cannot reach {host}:{port}: {e}")
+            return
+        with upstream:
+            request_line = f"{self.command} {self._target()[3]} {self.request_version}\r\n"
+            raw_headers = "".join(f"{name}: {value}\r\n" for name, value in self.headers.items())
+            upstream.sendall((request_line + raw_headers + "\r\n").encode("latin-1") + (body or b""))
+            relay(self.connection, upstream, self.proxy.timeout)
+
+
+class ProxyServer(ThreadingHTTPServer):
+    daemon_threads = True
+    proxy: "CachingProxy"
+
+
+class CachingProxy:
+    """Forward proxy on `host:port` (any free port by default) caching responses under `cache_dir`.
+
+    `static_ttl` caches static assets for that many seconds whatever their cache headers say, except no-store,
+    private and cookie-setting responses. Responses larger than `max_object_bytes` are passed through uncached.
+
+    With an `archive`, all responses are recorded to it and the cache is bypassed, or with `replay` all requests are
+    answered from it, with a 504 for those not recorded.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str | Path,
+        max_bytes: int = 2 * 2**30,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        static_ttl: float | None = None,
+        intercept_https: bool = True,
+        max_object_bytes: int = 32 * 2**20,
+        timeout: float = 30.0,
+        archive: NetworkArchive | None = None,
+        replay: bool = False,
+    ):
+        if replay and archive is None:
+            raise ValueError("Replay needs a network archive")
+        self.archive = archive
+        self.replay = replay
+        self.cache = ResponseCache(Path(cache_dir) / "responses", max_bytes)
+        self.static_ttl = static_ttl
+        self.max_object_bytes = max_object_bytes
+        self.timeout = timeout
+        self.upstream_context = ssl.create_default_context()
+
+        self.authority = None
+        if intercept_https:
+            if x509 is None:
+                print("⚠️  cryptography not available, the caching proxy tunnels HTTPS without caching it")
+            else:
+                self.authority = CertificateAuthority(Path(cache_dir) / "ca")
+        if archive is not None and self.authority is None:
+            print("⚠️  HTTPS interception is off, HTTPS traffic is neither recorded nor replayed")
+
+        self.counters: Counter = Counter()
+        self._counters_lock = threading.Lock()
+        self._connections = threading.local()
+        self.server = ProxyServer((host, port), ProxyRequestHandler)
+        self.server.proxy = self
+        self._thread: threading.Thread | None = None
+
+    @property
+    def address(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def settings(self) -> ProxySettings:
+        """What a browser needs to use the proxy"""
+        return ProxySettings(
+            server=self.address, spki_hashes=self.authority.spki_hashes if self.authority is not None else []
+        )
+
+    def start(self) -> "CachingProxy":
+        self._thread = threading.Thread(target=self.server.serve_forever, name="caching-proxy", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def connection(self, scheme: str, host: str, port: int, fresh: bool = False) -> http.client.HTTPConnection:
+        """Upstream connection kept alive per handler thread"""
+        pool = getattr(self._connections, "pool", None)
+        if pool is None:
+            pool = self._connections.pool = {}
+        key = (scheme, host, port)
+        connection = pool.get(key)
+        if connection is None or fresh:
+            if connection is not None:
+                connection.close()
+            if scheme == "https":
+                connection = http.client.HTTPSConnection(
+                    host, port, timeout=self.timeout, context=self.upstream_context
+                )
+            else:
+                connection = http.client.HTTPConnection(host, port, timeout=self.timeout)
+            pool[key] = connection
+        return connection
+
+    def record(self, outcome: str, bytes_from_cache: int = 0, bytes_from_upstream: int = 0):
+        with self._counters_lock:
+            self.counters[outcome] += 1
+            self.counters["bytes_from_cache"] += bytes_from_cache
+            self.counters["bytes_from_upstream"] += bytes_from_upstream
+
+    def stats(self) -> dict:
+        with self._counters_lock:
+            counters = dict(self.counters)
+        hits, revalidated, misses = (counters.get(name, 0) for name in ("hits", "revalidated", "misses"))
+        lookups = hits + revalidated + misses
+        return {
+            "address": self.address,
+            "intercepts_https": self.authority is not None,
+            "hits": hits,
+            "revalidated": revalidated,
+            "misses": misses,
+            "uncacheable": counters.get("uncacheable", 0),
+            "streamed": counters.get("streamed", 0),
+            "tunnels": counters.get("tunnels", 0),
+            "hit_ratio": (hits + revalidated) / lookups if lookups else None,
+            "bytes_from_cache": counters.get("bytes_from_cache", 0),
+            "bytes_from_upstream": counters.get("bytes_from_upstream", 0),
+            "cache_entries": len(self.cache),
+            "cache_bytes": self.cache.total_bytes,
+            "cache_max_bytes": self.cache.max_bytes,
+            "evicted": self.cache.n_evicted,
+            "mode": ("replay" if self.replay else "record") if self.archive is not None else "cache",
+            "recorded": counters.get("recorded", 0),
+            "replayed": counters.get("replayed", 0),
+            "replay_misses": counters.get("replay_misses", 0),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared HTTP caching proxy for Surfer H browsers")
+    parser.add_argument("--cache_dir", default="proxy_cache")
+    parser.add_argument("--cache_mb", type=int, default=2048)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8899)
+    parser.add_argument("--static_ttl_hours", type=float, help="Cache static assets this long whatever their headers")
+    parser.add_argument("--no_intercept_https", action="store_true", help="Tunnel HTTPS without caching it")
+    parser.add_argument("--record_dir", help="Record all responses to this network archive instead of caching")
+    parser.add_argument("--replay_dir", help="Answer all requests from this network archive, offline")
+    args = parser.parse_args()
+    if args.record_dir and args.replay_dir:
+        parser.error("--record_dir and --replay_dir are exclusive")
+    archive_dir = args.record_dir or args.replay_dir
+
+    proxy = CachingProxy(
+        args.cache_dir,
+        max_bytes=args.cache_mb * 2**20,
+        host=args.host,
+        port=args.port,
+        static_ttl=args.static_ttl_hours * 3600 if args.static_ttl_hours is not None else None,
+        intercept_https=not args.no_intercept_https,
+        archive=NetworkArchive(archive_dir) if archive_dir else None,
+        replay=bool(args.replay_dir),
+    )
+    print(f"Caching proxy on {proxy.address}, Chrome arguments: {' '.join(proxy.settings().chrome_arguments())}")
+    try:
+        proxy.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        proxy.server.server_close()
+        print(json.dumps(proxy.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
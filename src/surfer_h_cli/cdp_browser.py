@@ -0,0 +1,762 @@
+"""Browser backend speaking the Chrome DevTools Protocol directly over a websocket.
+
+SimpleWebBrowserTools sends every command through chromedriver, one blocking HTTP request each. This backend launches
+Chrome itself and talks to it over CDP instead: commands can be pipelined, and new tabs, JavaScript dialogs and
+network activity arrive as events rather than being polled for. AsyncCDPBrowser is the asyncio core, CDPBrowserTools
+wraps it in the blocking interface of SimpleWebBrowserTools so that the agent loop can use either.
+
+Requires the optional `websockets` package.
+"""
+
+import asyncio
+import base64
+import itertools
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from collections import Counter
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Callable
+
+from PIL import Image
+
+from surfer_h_cli.caching_proxy import ProxySettings
+from surfer_h_cli.network_blocking import NetworkBlocking, is_blocked_failure
+from surfer_h_cli.simple_browser import (
+    CLICK_JS,
+    NEW_TAB_TIMEOUT,
+    PAGE_TEXT_JS,
+    SCROLL_JS,
+    WRITE_JS,
+    PageCapture,
+    SimpleWebBrowserTools,
+    Tab,
+    WebException,
+    WebTabs,
+    stitch_vertically,
+)
+
+try:
+    import websockets
+    from websockets.exceptions import ConnectionClosed
+except ImportError:
+    # websockets not available, the CDP backend cannot be opened
+    websockets = None
+    ConnectionClosed = OSError
+
+CHROME_BINARIES = ("google-chrome", "google-chrome-stable", "chromium", "chromium-browser", "chrome")
+
+# Requests that stay open for the life of the page and never make it idle
+LONG_LIVED_REQUEST_TYPES = ("EventSource", "WebSocket")
+
+
+def find_chrome() -> str:
+    """Chrome binary from CHROME_BINARY, or the first one found on the PATH."""
+    binary = os.getenv("CHROME_BINARY") or next(filter(None, map(shutil.which, CHROME_BINARIES)), None)
+    if binary is None:
+        raise WebException("Chrome not found, set CHROME_BINARY to its path")
+    return binary
+
+
+class CDPError(WebException):
+    """Error returned by Chrome for a command"""
+
+    pass
+
+
+class CDPConnection:
+    """Websocket to the browser, multiplexing the sessions of its tabs.
+
+    Every command gets an id and a future that the reader task resolves with its response, so any number of commands
+    can be in flight at once. Events go to the callbacks subscribed to their method with `on`, and to the one-shot
+    futures created with `expect`.
+    """
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self._ids = itertools.count(1)
+        self._pending: dict[int, asyncio.Future] = {}
+        self._subscribers: dict[str, list[Callable[[dict, str | None], None]]] = {}
+        self._waiters: list[tuple[str, str | None, Callable[[dict], bool] | None, asyncio.Future]] = []
+        self._reader = asyncio.create_task(self._read())
+
+    @classmethod
+    async def connect(cls, url: str) -> "CDPConnection":
+        return cls(await websockets.connect(url, max_size=None, ping_interval=None))
+
+    async def post(self, method: str, params: dict | None = None, session_id: str | None = None) -> asyncio.Future:
+        """Send a command without waiting for its response, returns the future of the response."""
+        if self._reader.done():
+            # Nothing would ever resolve the response
+            raise WebException("Browser connection closed")
+        command_id = next(self._ids)
+        message: dict[str, Any] = {"id": command_id, "method": method, "params": params or {}}
+        if session_id is not None:
+            message["sessionId"] = session_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[command_id] = future
+        try:
+            await self.websocket.send(json.dumps(message))
+        except (ConnectionClosed, OSError) as e:
+            self._pending.pop(command_id, None)
+            raise WebException("Browser connection closed") from e
+        return future
+
+    async def send(self, method: str, params: dict | None = None, session_id: str | None = None) -> dict:
+        return await (await self.post(method, params, session_id))
+
+    async def send_many(self, commands: list[tuple[str, dict]], session_id: str | None = None) -> list[dict]:
+        """Send commands back to back, in order, then wait for all the responses."""
+        futures = [await self.post(method, params, session_id) for method, params in commands]
+        return list(await asyncio.gather(*futures))
+
+    def on(self, method: str, callback: Callable[[dict, str | None], None]):
+        """Call `callback(params, session_id)` on every `method` event."""
+        self._subscribers.setdefault(method, []).append(callback)
+
+    def expect(
+        self, method: str, predicate: Callable[[dict], bool] | None = None, session_id: str | None = None
+    ) -> asyncio.Future:
+        """Future of the params of the next `method` event matching `predicate` and `session_id`. Create it before
+        sending the command that triggers the event, and cancel it if it is not awaited."""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((method, session_id, predicate, future))
+        return future
+
+    def _dispatch(self, method: str, params: dict, session_id: str | None):
+        for callback in self._subscribers.get(method, []):
+            callback(params, session_id)
+        waiters = []
+        for waiter in self._waiters:
+            waiter_method, waiter_session_id, predicate, future = waiter
+            if future.done():
+                continue
+            if (
+                waiter_method == method
+                and (waiter_session_id is None or waiter_session_id == session_id)
+                and (predicate is None or predicate(params))
+            ):
+                future.set_result(params)
+                continue
+            waiters.append(waiter)
+        self._waiters = waiters
+
+    async def _read(self):
+        try:
+            async for raw in self.websocket:
+                message = json.loads(raw)
+                if "id" not in message:
+                    self._dispatch(message["method"], message.get("params", {}), message.get("sessionId"))
+                    continue
+                future = self._pending.pop(message["id"], None)
+                if future is None or future.done():
+                    continue
+                if "error" in message:
+                    error = message["error"]
+                    future.set_exception(CDPError(f"{error.get('message')} {error.get('data', '')}".strip()))
+                else:
+                    future.set_result(message.get("result", {}))
+        except ConnectionClosed:
+            pass
+        finally:
+            for future in [*self._pending.values(), *(waiter[-1] for waiter in self._waiters)]:
+                if not future.done():
+                    future.set_exception(WebException("Browser connection closed"))
+            self._pending.clear()
+            self._waiters.clear()
+
+    async def close(self):
+        await self.websocket.close()
+        self._reader.cancel()
+
+
+def key_events(key: str) -> list[tuple[str, dict]]:
+    """Input.dispatchKeyEvent commands typing one character, Enter or Backspace."""
+    if key == "\n":
+        down = {"type": "keyDown", "key": "Enter", "code": "Enter", "windowsVirtualKeyCode": 13, "text": "\r"}
+    elif key == "Backspace":
+        down = {"type": "rawKeyDown", "key": "Backspace", "code": "Backspace", "windowsVirtualKeyCode": 8}
+    else:
+        down = {"type": "keyDown", "key": key, "text": key}
+    up = {"type": "keyUp", **{name: value for name, value in down.items() if name not in ("type", "text")}}
+    return [("Input.dispatchKeyEvent", down), ("Input.dispatchKeyEvent", up)]
+
+
+def mouse_click_events(x: int, y: int) -> list[tuple[str, dict]]:
+    """Input.dispatchMouseEvent commands clicking at (x, y) with the left button, a trusted click for the page."""
+    return [
+        ("Input.dispatchMouseEvent", {"type": "mouseMoved", "x": x, "y": y}),
+        ("Input.dispatchMouseEvent", {"type": "mousePressed", "x": x, "y": y, "button": "left", "clickCount": 1}),
+        ("Input.dispatchMouseEvent", {"type": "mouseReleased", "x": x, "y": y, "button": "left", "clickCount": 1}),
+    ]
+
+
+class AsyncCDPBrowser:
+    """Chrome driven over CDP, with the methods of SimpleWebBrowserTools as coroutines.
+
+    Each tab is attached in its own flattened session on a single connection. The browser keeps track of the tabs
+    opened since the last `focus_new_tab`, accepts JavaScript dialogs as they open, and counts the in-flight requests
+    of each tab so `wait_for_network_idle` needs no polling. Blocked URLs are set on every tab, and blocked resource
+    types are failed as the Fetch domain pauses them.
+    """
+
+    def __init__(self):
+        self.connection: CDPConnection | None = None
+        self.process: subprocess.Popen | None = None
+        self.user_data_dir: str | None = None
+        self.persistent_profile = False
+        self.proxy: ProxySettings | None = None
+        self.target_id: str | None = None
+        self.session_id: str | None = None
+        """Session of the focused tab"""
+        self.sessions: dict[str, str] = {}
+        self.new_targets: list[str] = []
+        self.inflight: dict[str, set[str]] = {}
+        """Request ids still loading, per session"""
+        self.n_dialogs = 0
+        self.network_blocking = NetworkBlocking()
+        self.blocked: Counter = Counter()
+        """Blocked requests per resource type, kept across browser restarts"""
+        self._network_activity: asyncio.Event | None = None
+
+    async def open_browser(
+        self,
+        headless: bool,
+        width: int,
+        height: int,
+        action_timeout: int,
+        network_blocking: NetworkBlocking | None = None,
+        user_data_dir: str | None = None,
+        proxy: ProxySettings | None = None,
+        **kwargs,
+    ):
+        """Launch Chrome with remote debugging and attach to its first tab, on a persistent profile when
+        `user_data_dir` is set and on a throwaway one otherwise, and through a caching proxy when `proxy` is set"""
+        if websockets is None:
+            raise WebException("The CDP browser backend requires the websockets package")
+        self.network_blocking = network_blocking or NetworkBlocking()
+        self.proxy = proxy
+        self.headless = headless
+        self.width = width
+        self.height = height
+        self.action_timeout = action_timeout
+
+        self.persistent_profile = user_data_dir is not None
+        self.user_data_dir = user_data_dir or tempfile.mkdtemp(prefix="surfer_cdp_")
+        # A previous Chrome on a persistent profile may have left its port file behind
+        (Path(self.user_data_dir) / "DevToolsActivePort").unlink(missing_ok=True)
+        args = [
+            find_chrome(),
+            "--remote-debugging-port=0",
+            f"--user-data-dir={self.user_data_dir}",
+            "--no-first-run",
+            "--no-default-browser-check",
+            "--no-sandbox",
+            "--disable-dev-shm-usage",
+            "--disable-gpu",
+            "--disable-extensions",
+            # Going back then always fires a load event
+            "--disable-features=BackForwardCache",
+            f"--window-size={width},{height}",
+            "--force-device-scale-factor=1",
+            *(proxy.chrome_arguments() if proxy is not None else []),
+            "about:blank",
+        ]
+        if headless:
+            args.insert(1, "--headless")
+
+        try:
+            self.process = subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            url = await asyncio.wait_for(self._devtools_url(), timeout=action_timeout)
+            self.connection = await CDPConnection.connect(url)
+        except (asyncio.TimeoutError, OSError) as e:
+            await self.quit()
+            raise WebException(f"Failed to start Chrome: {e}")
+
+        self._network_activity = asyncio.Event()
+        self.connection.on("Target.targetCreated", self._on_target_created)
+        self.connection.on("Target.targetDestroyed", self._on_target_destroyed)
+        self.connection.on("Page.javascriptDialogOpening", self._on_dialog)
+        self.connection.on("Network.requestWillBeSent", self._on_request)
+        self.connection.on("Network.loadingFinished", self._on_request_done)
+        self.connection.on("Network.loadingFailed", self._on_request_done)
+        self.connection.on("Fetch.requestPaused", self._on_request_paused)
+
+        await self.connection.send("Target.setDiscoverTargets", {"discover": True})
+        targets = (await self.connection.send("Target.getTargets"))["targetInfos"]
+        await self._focus(next(target["targetId"] for target in targets if target["type"] == "page"))
+        self.new_targets.clear()
+
+    async def _devtools_url(self) -> str:
+        # Chrome writes the port it picked and the browser endpoint path to this file once it listens
+        port_file = Path(self.user_data_dir) / "DevToolsActivePort"
+        while True:
+            if self.process.poll() is not None:
+                raise OSError(f"Chrome exited with code {self.process.returncode}")
+            if port_file.exists():
+                lines = port_file.read_text().split()
+                if len(lines) == 2:
+                    return f"ws://127.0.0.1:{lines[0]}{lines[1]}"
+            await asyncio.sleep(0.05)
+
+    async def _attach(self, target_id: str) -> str:
+        """Session of a tab, attached and set up on first use"""
+        if target_id not in self.sessions:
+            attached = await self.connection.send("Target.attachToTarget", {"targetId": target_id, "flatten": True})
+            session_id = attached["sessionId"]
+            self.sessions[target_id] = session_id
+            self.inflight[session_id] = set()
+            commands = [
+                ("Page.enable", {}),
+                ("Network.enable", {}),
+                (
+                    "Emulation.setDeviceMetricsOverride",
+                    {"width": self.width, "height": self.height, "deviceScaleFactor": 1, "mobile": False},
+                ),
+            ]
+            if self.network_blocking.url_patterns:
+                commands.append(("Network.setBlockedURLs", {"urls": self.network_blocking.url_patterns}))
+            if self.network_blocking.resource_types:
+                patterns = [
+                    {"urlPattern": "*", "resourceType": resource_type, "requestStage": "Request"}
+                    for resource_type in self.network_blocking.resource_types
+                ]
+                commands.append(("Fetch.enable", {"patterns": patterns}))
+            await self.connection.send_many(commands, session_id)
+        return self.sessions[target_id]
+
+    async def _focus(self, target_id: str):
+        """Attach to a tab if needed and make it the one commands go to"""
+        session_id = await self._attach(target_id)
+        await self.connection.send("Target.activateTarget", {"targetId": target_id})
+        self.target_id = target_id
+        self.session_id = session_id
+
+    def _on_target_created(self, params: dict, session_id: str | None):
+        if params["targetInfo"]["type"] == "page":
+            self.new_targets.append(params["targetInfo"]["targetId"])
+
+    def _on_target_destroyed(self, params: dict, session_id: str | None):
+        target_id = params["targetId"]
+        if target_id in self.new_targets:
+            self.new_targets.remove(target_id)
+        self.inflight.pop(self.sessions.pop(target_id, None), None)
+
+    def _on_dialog(self, params: dict, session_id: str | None):
+        # The page is blocked until the dialog is closed, scripts included
+        self.n_dialogs += 1
+        print(f"⚠️  Accepting {params.get('type')} dialog: {params.get('message')}")
+        asyncio.create_task(self.connection.send("Page.handleJavaScriptDialog", {"accept": True}, session_id))
+
+    def _on_request(self, params: dict, session_id: str | None):
+        if session_id in self.inflight and params.get("type") not in LONG_LIVED_REQUEST_TYPES:
+            self.inflight[session_id].add(params["requestId"])
+            self._network_activity.set()
+
+    def _on_request_paused(self, params: dict, session_id: str | None):
+        # Only requests of blocked resource types are intercepted
+        asyncio.create_task(
+            self.connection.send(
+                "Fetch.failRequest", {"requestId": params["requestId"], "errorReason": "BlockedByClient"}, session_id
+            )
+        )
+
+    def _on_request_done(self, params: dict, session_id: str | None):
+        if is_blocked_failure(params):
+            self.blocked[params.get("type", "Other")] += 1
+        if session_id in self.inflight:
+            self.inflight[session_id].discard(params["requestId"])
+            self._network_activity.set()
+
+    async def wait_for_network_idle(self, idle_time: float = 0.5, timeout: float | None = None) -> bool:
+        """Wait until the focused tab has had no request in flight for `idle_time` seconds. Returns False if that
+        did not happen within `timeout`, the action timeout by default."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (self.action_timeout if timeout is None else timeout)
+        while True:
+            self._network_activity.clear()
+            busy = bool(self.inflight.get(self.session_id))
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(self._network_activity.wait(), remaining if busy else min(idle_time, remaining))
+            except asyncio.TimeoutError:
+                if busy:
+                    return False
+                return True
+
+    async def _evaluate(self, expression: str, session_id: str | None = None):
+        result = await self.connection.send(
+            "Runtime.evaluate",
+            {"expression": expression, "returnByValue": True, "awaitPromise": True, "userGesture": True},
+            session_id or self.session_id,
+        )
+        if "exceptionDetails" in result:
+            details = result["exceptionDetails"]
+            raise WebException(f"Script failed: {details.get('exception', {}).get('description') or details['text']}")
+        return result["result"].get("value")
+
+    async def execute_script(self, script: str, *args, session_id: str | None = None):
+        """Run a script taking `arguments` like Selenium's, and return its JSON-serializable result"""
+        return await self._evaluate(f"(function() {{\n{script}\n}}).apply(null, {json.dumps(list(args))})", session_id)
+
+    async def execute_async_script(self, script: str, *args):
+        """Run a script that reports its result through the callback passed as its last argument"""
+        arguments = json.dumps(list(args))
+        return await self._evaluate(
+            f"new Promise((resolve) => (function() {{\n{script}\n}}).apply(null, {arguments}.concat([resolve])))"
+        )
+
+    def blocked_requests(self) -> Counter:
+        """Number of requests blocked so far, per resource type"""
+        return self.blocked
+
+    def get_screenshot_size(self) -> tuple[int, int]:
+        return self.width, self.height
+
+    async def get_tab_url(self) -> str:
+        info = await self.connection.send("Target.getTargetInfo", {"targetId": self.target_id})
+        return info["targetInfo"]["url"]
+
+    async def _pages(self) -> list[dict]:
+        targets = (await self.connection.send("Target.getTargets"))["targetInfos"]
+        return [target for target in targets if target["type"] == "page"]
+
+    async def get_tabs(self) -> list[Tab]:
+        return [Tab(index=target["targetId"]) for target in await self._pages()]
+
+    async def get_tabs_titles(self) -> WebTabs:
+        return WebTabs(titles=[target["title"] for target in await self._pages()])
+
+    async def click_at(self, x: int, y: int) -> dict:
+        """Click at specific coordinates, then focus the tab the click opened, if any"""
+        opened = self.connection.expect("Target.targetCreated", lambda params: params["targetInfo"]["type"] == "page")
+        try:
+            result = await self.execute_script(CLICK_JS, x, y)
+            if not result.get("ok"):
+                print(f"⚠️  WARNING: {result.get('error')}")
+                return result
+            print(
+                f"🔍 DEBUG: Clicking at ({x}, {y}) -> <{result.get('tag')}> id='{result.get('id')}' "
+                f"class='{result.get('class')}' placeholder='{result.get('placeholder')}' ({result.get('method')})"
+            )
+            if result.get("method") == "click":
+                await self.connection.send_many(mouse_click_events(x, y), self.session_id)
+
+            result["new_tab"] = False
+            # Tabs opened by window.open are already known by then
+            if result.get("may_open_tab") or self.new_targets:
+                if not self.new_targets:
+                    try:
+                        await asyncio.wait_for(asyncio.shield(opened), NEW_TAB_TIMEOUT)
+                    except asyncio.TimeoutError:
+                        pass
+                result["new_tab"] = await self.focus_new_tab()
+            return result
+        finally:
+            opened.cancel()
+
+    async def focus_new_tab(self) -> bool:
+        """Switch to the most recent tab opened since the last check, returns whether there was one."""
+        if not self.new_targets:
+            return False
+        target_id = self.new_targets[-1]
+        self.new_targets.clear()
+        await self._focus(target_id)
+        return True
+
+    async def type_text(self, text: str, n_backspaces: int = 0):
+        """Type real keystrokes into the focused element, sent in one batch"""
+        commands = [command for _ in range(n_backspaces) for command in key_events("Backspace")]
+        commands += [command for key in text for command in key_events(key)]
+        await self.connection.send_many(commands, self.session_id)
+
+    async def write(self, text: str, n_backspaces: int | None = None) -> dict:
+        """Write text into the focused field, see SimpleWebBrowserTools.write"""
+        result = await self.execute_async_script(WRITE_JS, text, n_backspaces)
+        if not result.get("ok"):
+            print(f"⚠️  WARNING: {result.get('error')}. Cannot write text.")
+            return result
+
+        if result.get("needs_keys"):
+            contenteditable = result.get("reason") == "contenteditable"
+            await self.type_text(text, n_backspaces=(n_backspaces or 0) if contenteditable else 0)
+            value = await self.execute_script(
+                "const el = document.activeElement; return el.isContentEditable ? el.innerText : el.value;"
+            )
+            result["value"] = value
+            result["verified"] = text in (value or "")
+        else:
+            result["verified"] = True
+        return result
+
+    async def scroll(self, direction: str, fraction: float = 0.85, position: float | None = None) -> dict:
+        """Scroll the main scroll container of the page, see SimpleWebBrowserTools.scroll"""
+        if direction not in ("up", "down", "left", "right"):
+            raise WebException(f"Invalid scroll direction: {direction}")
+        return await self.execute_async_script(SCROLL_JS, direction, fraction, position)
+
+    async def capture_page_below(self, n_screens: int) -> Image.Image | None:
+        """Screenshots of the next `n_screens` screens below the current one, stitched vertically"""
+        start = (await self.scroll("down", fraction=0.0))["position"]
+        tiles = []
+        for _ in range(n_screens):
+            if not (await self.scroll("down", fraction=1.0))["moved"]:
+                break
+            tiles.append((await self.screenshot()).convert("RGB"))
+        if not tiles:
+            return None
+        await self.scroll("up", position=start)
+        return stitch_vertically(tiles)
+
+    async def _capture_page(self, url: str, max_text_length: int) -> PageCapture:
+        # In its own window: a background tab of a visible browser is not rendered, and cannot be screenshot
+        created = await self.connection.send(
+            "Target.createTarget", {"url": "about:blank", "newWindow": True, "background": True}
+        )
+        target_id = created["targetId"]
+        try:
+            session_id = await self._attach(target_id)
+            loaded = self.connection.expect("Page.loadEventFired", session_id=session_id)
+            try:
+                result = await self.connection.send("Page.navigate", {"url": url}, session_id)
+                if result.get("errorText"):
+                    return PageCapture(url=url, error=result["errorText"])
+                await asyncio.wait_for(asyncio.shield(loaded), self.action_timeout)
+            except asyncio.TimeoutError:
+                print(f"⚠️  WARNING: {url} did not finish loading within {self.action_timeout}s")
+            finally:
+                loaded.cancel()
+            page, screenshot = await asyncio.gather(
+                self.execute_script(PAGE_TEXT_JS, max_text_length, session_id=session_id),
+                self.connection.send("Page.captureScreenshot", {"format": "png"}, session_id),
+            )
+            return PageCapture(**page, screenshot=Image.open(BytesIO(base64.b64decode(screenshot["data"]))))
+        except WebException as e:
+            return PageCapture(url=url, error=str(e))
+        finally:
+            await self.connection.send("Target.closeTarget", {"targetId": target_id})
+
+    async def capture_pages(self, urls: list[str], max_text_length: int = 4000) -> list[PageCapture]:
+        """Load pages in new tabs, screenshot and read each one and close its tab, all concurrently. The current tab
+        stays focused."""
+        return list(await asyncio.gather(*(self._capture_page(url, max_text_length) for url in urls)))
+
+    async def _navigate(self, method: str, params: dict | None = None) -> dict:
+        """Send a navigation command and wait for the page to load, or for the action timeout"""
+        loaded = self.connection.expect("Page.loadEventFired", session_id=self.session_id)
+        try:
+            result = await self.connection.send(method, params, self.session_id)
+            if result.get("errorText"):
+                raise WebException(f"Navigation failed: {result['errorText']}")
+            # Same-document navigations have no loader and no load event
+            if method != "Page.navigate" or result.get("loaderId"):
+                await asyncio.wait_for(asyncio.shield(loaded), self.action_timeout)
+        except asyncio.TimeoutError:
+            print(f"⚠️  WARNING: Page did not finish loading within {self.action_timeout}s")
+        finally:
+            loaded.cancel()
+        return result
+
+    async def goback(self):
+        """Navigate back to previous page"""
+        history = await self.connection.send("Page.getNavigationHistory", session_id=self.session_id)
+        if history["currentIndex"] > 0:
+            entry = history["entries"][history["currentIndex"] - 1]
+            await self._navigate("Page.navigateToHistoryEntry", {"entryId": entry["id"]})
+
+    async def goto(self, url: str):
+        """Navigate to a specific URL"""
+        await self._navigate("Page.navigate", {"url": url})
+
+    async def refresh(self):
+        """Refresh the current page"""
+        await self._navigate("Page.reload")
+
+    async def change_tab(self, title: str):
+        """Switch to tab with specific title"""
+        for target in await self._pages():
+            if target["title"] == title:
+                await self._focus(target["targetId"])
+                return
+
+    async def focus_tab(self, element: str):
+        """Focus on a tab (using element as identifier)"""
+        await self.change_tab(element)
+
+    async def screenshot(self) -> Image.Image:
+        result = await self.connection.send("Page.captureScreenshot", {"format": "png"}, self.session_id)
+        image = Image.open(BytesIO(base64.b64decode(result["data"])))
+        # Decoded now: screenshots are read from other threads, e.g. the event pool's
+        image.load()
+        return image
+
+    async def get_webpage(self) -> tuple[str, Image.Image]:
+        url, screenshot = await asyncio.gather(self.get_tab_url(), self.screenshot())
+        return url, screenshot
+
+    async def quit(self):
+        """Quit the browser"""
+        if self.connection is not None:
+            try:
+                await asyncio.wait_for(self.connection.send("Browser.close"), 5)
+            except (asyncio.TimeoutError, WebException):
+                pass
+            await self.connection.close()
+            self.connection = None
+        if self.process is not None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+            self.process = None
+        if self.user_data_dir is not None and not self.persistent_profile:
+            shutil.rmtree(self.user_data_dir, ignore_errors=True)
+            self.user_data_dir = None
+        self.sessions.clear()
+        self.inflight.clear()
+        self.new_targets.clear()
+
+    async def restart(self):
+        """Restart the browser"""
+        try:
+            await self.quit()
+        except Exception:
+            # The previous browser may already be gone, e.g. after a Chrome crash
+            self.connection = None
+        if not hasattr(self, "headless"):
+            raise ValueError("Browser not initialized")
+        await self.open_browser(
+            headless=self.headless,
+            width=self.width,
+            height=self.height,
+            action_timeout=self.action_timeout,
+            network_blocking=self.network_blocking,
+            user_data_dir=self.user_data_dir if self.persistent_profile else None,
+            proxy=self.proxy,
+        )
+
+
+class CDPBrowserTools:
+    """AsyncCDPBrowser behind the blocking interface of SimpleWebBrowserTools.
+
+    The browser's event loop runs in a daemon thread, each method submits a coroutine to it and waits for the result.
+    Code that wants to pipeline several browser operations can use `browser.run` with a coroutine of `browser.cdp`.
+    """
+
+    find_newer_tab = staticmethod(SimpleWebBrowserTools.find_newer_tab)
+
+    def __init__(self):
+        self.cdp = AsyncCDPBrowser()
+        self.loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(target=self.loop.run_forever, name="cdp-browser", daemon=True)
+        self._loop_thread.start()
+
+    def run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def open_browser(
+        self,
+        headless: bool,
+        width: int,
+        height: int,
+        action_timeout: int,
+        network_blocking: NetworkBlocking | None = None,
+        user_data_dir: str | None = None,
+        proxy: ProxySettings | None = None,
+        **kwargs,
+    ):
+        self.run(
+            self.cdp.open_browser(
+                headless=headless,
+                width=width,
+                height=height,
+                action_timeout=action_timeout,
+                network_blocking=network_blocking,
+                user_data_dir=user_data_dir,
+                proxy=proxy,
+            )
+        )
+
+    def blocked_requests(self) -> Counter:
+        return self.cdp.blocked_requests()
+
+    def get_screenshot_size(self) -> tuple[int, int]:
+        return self.cdp.get_screenshot_size()
+
+    def get_tab_url(self) -> str:
+        return self.run(self.cdp.get_tab_url())
+
+    def get_tabs(self) -> list[Tab]:
+        return self.run(self.cdp.get_tabs())
+
+    def get_tabs_titles(self) -> WebTabs:
+        return self.run(self.cdp.get_tabs_titles())
+
+    def click_at(self, x: int, y: int) -> dict:
+        return self.run(self.cdp.click_at(x, y))
+
+    def focus_new_tab(self) -> bool:
+        return self.run(self.cdp.focus_new_tab())
+
+    def write(self, text: str, n_backspaces: int | None = None) -> dict:
+        return self.run(self.cdp.write(text, n_backspaces))
+
+    def scroll(self, direction: str, fraction: float = 0.85, position: float | None = None) -> dict:
+        return self.run(self.cdp.scroll(direction, fraction, position))
+
+    def capture_page_below(self, n_screens: int) -> Image.Image | None:
+        return self.run(self.cdp.capture_page_below(n_screens))
+
+    def wait_for_network_idle(self, idle_time: float = 0.5, timeout: float | None = None) -> bool:
+        return self.run(self.cdp.wait_for_network_idle(idle_time, timeout))
+
+    def capture_pages(self, urls: list[str], max_text_length: int = 4000) -> list[PageCapture]:
+        return self.run(self.cdp.capture_pages(urls, max_text_length))
+
+    def execute_script(self, script: str, *args):
+        return self.run(self.cdp.execute_script(script, *args))
+
+    def execute_async_script(self, script: str, *args):
+        return self.run(self.cdp.execute_async_script(script, *args))
+
+    def goback(self):
+        self.run(self.cdp.goback())
+
+    def goto(self, url: str):
+        self.run(self.cdp.goto(url))
+
+    def change_tab(self, title: str):
+        self.run(self.cdp.change_tab(title))
+
+    def focus_tab(self, element: str):
+        self.run(self.cdp.focus_tab(element))
+
+    def quit(self):
+        """Quit the browser and stop its event loop, the browser cannot be used afterwards"""
+        if self.loop.is_closed():
+            return
+        try:
+            self.run(self.cdp.quit())
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._loop_thread.join()
+            self.loop.close()
+
+    def refresh(self):
+        self.run(self.cdp.refresh())
+
+    def restart(self):
+        self.run(self.cdp.restart())
+
+    def screenshot(self) -> Image.Image:
+        return self.run(self.cdp.screenshot())
+
+    def get_webpage(self) -> tuple[str, Image.Image]:
+        return self.run(self.cdp.get_webpage())
@@ -0,0 +1,116 @@
+import json
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from PIL import Image
+from pydantic import BaseModel, Field
+
+if TYPE_CHECKING:
+    from surfer_h_cli.surferh import AgentState
+
+
+class AgentCheckpoint(BaseModel):
+    """Compact, JSON-serializable snapshot of an agent run taken after every step."""
+
+    task: str
+    trajectory_id: str | None = None
+    start_url: str
+    url: str
+    timestep: int
+    notes: str = ""
+    current_step: str = ""
+    navigation_actions: list[dict] = Field(default_factory=list)
+    frames: list[str] = Field(default_factory=list)
+    """File names of the last screenshots, oldest first, relative to the checkpoint's frame directory"""
+    elapsed_seconds: float = 0.0
+    updated_at: str = ""
+
+
+class CheckpointStore:
+    """Stores one checkpoint per trajectory as `<id>.json` plus a `<id>/` directory of PNG frames."""
+
+    def __init__(self, root: str | Path, n_frames: int = 3):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.n_frames = n_frames
+
+    def _checkpoint_path(self, trajectory_id: str) -> Path:
+        return self.root / f"{trajectory_id}.json"
+
+    def _frames_dir(self, trajectory_id: str) -> Path:
+        return self.root / trajectory_id
+
+    def exists(self, trajectory_id: str) -> bool:
+        return self._checkpoint_path(trajectory_id).exists()
+
+    def list_ids(self) -> list[str]:
+        return [path.stem for path in self.root.glob("*.json")]
+
+    def save(self, state: "AgentState", start_url: str, elapsed_seconds: float) -> AgentCheckpoint:
+        """Write the state's checkpoint. Only frames not yet on disk, and the current one, are encoded."""
+        assert state.trajectory_id is not None
+        frames_dir = self._frames_dir(state.trajectory_id)
+        frames_dir.mkdir(exist_ok=True)
+
+        # The last screenshot always belongs to the current timestep
+        window = state.screenshots[-self.n_frames :]
+        first_step = state.timestep - len(window) + 1
+        frames = []
+        for step, screenshot in enumerate(window, start=first_step):
+            name = f"frame_{step}.png"
+            # The current frame may be left from a run that crashed before its checkpoint, for a step that was
+            # executed again since: it is always rewritten, atomically so that no frame is ever half written
+            if step == state.timestep or not (frames_dir / name).exists():
+                screenshot.save(frames_dir / f"{name}.tmp", format="PNG")
+                os.replace(frames_dir / f"{name}.tmp", frames_dir / name)
+            frames.append(name)
+
+        for stale in frames_dir.glob("frame_*.png"):
+            if stale.name not in frames:
+                stale.unlink(missing_ok=True)
+
+        checkpoint = AgentCheckpoint(
+            task=state.task,
+            trajectory_id=state.trajectory_id,
+            start_url=start_url,
+            url=state.url,
+            timestep=state.timestep,
+            notes=state.notes,
+            current_step=state.current_step,
+            navigation_actions=state.navigation_actions,
+            frames=frames,
+            elapsed_seconds=elapsed_seconds,
+            updated_at=datetime.now().isoformat(),
+        )
+
+        # Write then rename so a crash mid-write never leaves a truncated checkpoint behind
+        path = self._checkpoint_path(state.trajectory_id)
+        tmp_path = path.with_suffix(".json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(checkpoint.model_dump(), f)
+        os.replace(tmp_path, path)
+        return checkpoint
+
+    def load(self, trajectory_id: str) -> tuple[AgentCheckpoint, list[Image.Image]] | None:
+        """Return the checkpoint and whichever of its frames are still readable."""
+        path = self._checkpoint_path(trajectory_id)
+        if not path.exists():
+            return None
+        with open(path, "r") as f:
+            checkpoint = AgentCheckpoint.model_validate(json.load(f))
+
+        frames = []
+        for name in checkpoint.frames:
+            try:
+                with Image.open(self._frames_dir(trajectory_id) / name) as frame:
+                    frames.append(frame.copy())
+            except (OSError, ValueError):
+                continue
+        return checkpoint, frames
+
+    def delete(self, trajectory_id: str):
+        self._checkpoint_path(trajectory_id).unlink(missing_ok=True)
+        shutil.rmtree(self._frames_dir(trajectory_id), ignore_errors=True)
@@ -0,0 +1,427 @@
+from pydantic import BaseModel
+
+ELEMENT_ID_ATTRIBUTE = "data-surfer-id"
+
+FORM_FIELD_ROLES = {"textbox", "searchbox", "combobox", "checkbox", "radio", "spinbutton", "listbox", "slider"}
+
+# Single in-page pass over the document, its shadow roots and same-origin iframes. Every interactive element and
+# every element carrying its own visible text gets a short id stored as an attribute, so the id stays stable for
+# as long as the element lives. `onRoot`, when given, is called with every shadow root and iframe document walked.
+DISTILL_FUNCTION_JS = """
+function surferDistill(maxTextLength, maxElements, onRoot) {
+const ATTR = "%(attribute)s";
+const state = window.__surferDistiller || (window.__surferDistiller = {next: 0});
+const SKIP = new Set(["SCRIPT", "STYLE", "NOSCRIPT", "TEMPLATE", "HEAD", "META", "LINK", "svg", "SVG"]);
+const INTERACTIVE_ROLES = new Set([
+    "button", "link", "checkbox", "radio", "tab", "menuitem", "option", "switch", "textbox",
+    "combobox", "searchbox", "slider", "listbox", "spinbutton",
+]);
+const INPUT_ROLES = {
+    checkbox: "checkbox", radio: "radio", submit: "button", button: "button", reset: "button",
+    image: "button", range: "slider", search: "searchbox", number: "spinbutton",
+};
+const out = [];
+
+function clip(text) {
+    text = (text || "").replace(/\\s+/g, " ").trim();
+    return text.length > maxTextLength ? text.slice(0, maxTextLength - 1) + "…" : text;
+}
+
+function roleOf(el) {
+    const explicit = el.getAttribute("role");
+    if (explicit) return explicit;
+    const tag = el.tagName;
+    if (tag === "A" && el.hasAttribute("href")) return "link";
+    if (tag === "BUTTON" || tag === "SUMMARY") return "button";
+    if (tag === "SELECT") return "combobox";
+    if (tag === "TEXTAREA") return "textbox";
+    if (tag === "INPUT") {
+        const type = (el.getAttribute("type") || "text").toLowerCase();
+        if (type === "hidden") return null;
+        return INPUT_ROLES[type] || "textbox";
+    }
+    if (el.isContentEditable && !(el.parentElement && el.parentElement.isContentEditable)) return "textbox";
+    if (/^H[1-6]$/.test(tag)) return "heading";
+    return null;
+}
+
+function isInteractive(el, role) {
+    if (role && INTERACTIVE_ROLES.has(role)) return true;
+    if (el.hasAttribute("onclick")) return true;
+    const tabindex = el.getAttribute("tabindex");
+    return tabindex !== null && parseInt(tabindex, 10) >= 0 && el.tagName !== "DIV";
+}
+
+function labelOf(el, doc) {
+    const aria = el.getAttribute("aria-label");
+    if (aria) return aria;
+    const labelledBy = el.getAttribute("aria-labelledby");
+    if (labelledBy) {
+        const text = labelledBy.split(/\\s+/).map(id => {
+            const ref = doc.getElementById(id);
+            return ref ? ref.innerText : "";
+        }).join(" ");
+        if (text.trim()) return text;
+    }
+    if (el.labels && el.labels.length) return el.labels[0].innerText;
+    for (const name of ["placeholder", "title", "alt"]) {
+        const value = el.getAttribute(name);
+        if (value) return value;
+    }
+    if (el.tagName === "INPUT" && ["submit", "button", "reset"].includes(el.type)) return el.value;
+    const text = el.innerText;
+    if (text && text.trim()) return text;
+    return el.getAttribute("name") || "";
+}
+
+function valueOf(el) {
+    if (el.tagName === "SELECT") {
+        const option = el.options[el.selectedIndex];
+        return option ? option.text : "";
+    }
+    if (el.tagName === "INPUT" && (el.type === "checkbox" || el.type === "radio")) {
+        return el.checked ? "checked" : "unchecked";
+    }
+    if (el.tagName === "INPUT" && el.type === "password") return el.value ? "********" : "";
+    if ("value" in el && (el.tagName === "INPUT" || el.tagName === "TEXTAREA")) return el.value;
+    if (el.isContentEditable) return el.innerText;
+    return null;
+}
+
+function ownText(el) {
+    let text = "";
+    for (const node of el.childNodes) {
+        if (node.nodeType === 3) text += node.textContent;
+    }
+    return text.trim();
+}
+
+function idOf(el) {
+    let id = el.getAttribute(ATTR);
+    if (!id) {
+        id = "e" + (state.next++);
+        el.setAttribute(ATTR, id);
+    }
+    return id;
+}
+
+function visibleRect(el, win) {
+    const rect = el.getBoundingClientRect();
+    if (rect.width < 1 || rect.height < 1) return null;
+    const style = win.getComputedStyle(el);
+    if (style.visibility === "hidden" || style.display === "none" || parseFloat(style.opacity) === 0) return null;
+    return rect;
+}
+
+function walk(root, offsetX, offsetY, win, doc, insideInteractive) {
+    for (const el of root.children) {
+        if (out.length >= maxElements) return;
+        if (SKIP.has(el.tagName)) continue;
+        if (el.checkVisibility && !el.checkVisibility()) continue;
+
+        const role = roleOf(el);
+        const interactive = !insideInteractive && isInteractive(el, role);
+        const text = !interactive && !insideInteractive ? ownText(el) : "";
+
+        if (interactive || text) {
+            const rect = visibleRect(el, win);
+            if (rect) {
+                const x = Math.round(rect.left + offsetX), y = Math.round(rect.top + offsetY);
+                const entry = {
+                    id: idOf(el),
+                    role: interactive ? (role || "clickable") : (role || "text"),
+                    label: clip(interactive ? labelOf(el, doc) : text),
+                    value: interactive ? valueOf(el) : null,
+                    bbox: [x, y, Math.round(rect.width), Math.round(rect.height)],
+                    in_viewport: rect.bottom + offsetY > 0 && y < window.innerHeight
+                        && rect.right + offsetX > 0 && x < window.innerWidth,
+                };
+                if (entry.value !== null) entry.value = clip(entry.value);
+                if (el.disabled) entry.disabled = true;
+                out.push(entry);
+            }
+        }
+
+        if (el.shadowRoot) {
+            if (onRoot) onRoot(el.shadowRoot);
+            walk(el.shadowRoot, offsetX, offsetY, win, doc, insideInteractive || interactive);
+        }
+        if (el.tagName === "IFRAME" || el.tagName === "FRAME") {
+            const rect = el.getBoundingClientRect();
+            try {
+                const frameDoc = el.contentDocument;
+                if (frameDoc && frameDoc.body) {
+                    if (onRoot) onRoot(frameDoc);
+                    walk(frameDoc.body, offsetX + rect.left, offsetY + rect.top, el.contentWindow, frameDoc, false);
+                    continue;
+                }
+            } catch (e) {}
+            out.push({
+                id: idOf(el), role: "iframe", label: clip(el.title || el.src || "cross-origin frame"), value: null,
+                bbox: [Math.round(rect.left + offsetX), Math.round(rect.top + offsetY),
+                       Math.round(rect.width), Math.round(rect.height)],
+                in_viewport: true,
+            });
+            continue;
+        }
+        walk(el, offsetX, offsetY, win, doc, insideInteractive || interactive);
+    }
+}
+
+if (document.body) walk(document.body, 0, 0, window, document, false);
+return out;
+}
+""" % {"attribute": ELEMENT_ID_ATTRIBUTE}
+
+DISTILL_JS = DISTILL_FUNCTION_JS + "return surferDistill(arguments[0], arguments[1]);"
+
+# Change tracker kept in the page between steps. A MutationObserver (plus input/change listeners, since typing does
+# not mutate attributes) marks the page dirty, and only then is the page re-distilled and diffed against the
+# snapshot of the previous step. Mutations do not cross shadow roots and iframe documents, so each one found while
+# distilling gets its own observer, and an iframe loading a new document marks the page dirty too. A missing
+# tracker or a new URL means the model has not seen this document yet.
+DELTA_JS = (
+    DISTILL_FUNCTION_JS
+    + """
+const maxTextLength = arguments[0], maxElements = arguments[1];
+const ATTR = "%(attribute)s";
+const KEYS = ["role", "label", "value", "disabled"];
+let tracker = window.__surferTracker;
+const navigated = !tracker || tracker.url !== location.href;
+if (!tracker) {
+    tracker = window.__surferTracker = {dirty: true, url: location.href, snapshot: {}, observed: new WeakSet()};
+    const markDirty = () => { tracker.dirty = true; };
+    const observer = new MutationObserver(records => {
+        if (records.some(r => r.type !== "attributes" || r.attributeName !== ATTR)) markDirty();
+    });
+    tracker.observe = root => {
+        if (tracker.observed.has(root)) return;
+        tracker.observed.add(root);
+        observer.observe(root, {subtree: true, childList: true, attributes: true, characterData: true});
+        root.addEventListener("input", markDirty, true);
+        root.addEventListener("change", markDirty, true);
+        // Load events do not bubble but are seen while capturing
+        root.addEventListener("load", e => {
+            if (e.target.tagName === "IFRAME" || e.target.tagName === "FRAME") markDirty();
+        }, true);
+    };
+    tracker.observe(document);
+}
+tracker.url = location.href;
+
+if (!navigated && !tracker.dirty) {
+    return {full: false, url: location.href, added: [], changed: [], removed: []};
+}
+tracker.dirty = false;
+
+const elements = surferDistill(maxTextLength, maxElements, tracker.observe);
+const previous = tracker.snapshot;
+const current = {};
+const added = [], changed = [];
+for (const entry of elements) {
+    const key = JSON.stringify(KEYS.map(k => entry[k]));
+    current[entry.id] = key;
+    if (!(entry.id in previous)) added.push(entry);
+    else if (previous[entry.id] !== key) changed.push(entry);
+}
+const removed = Object.keys(previous).filter(id => !(id in current));
+tracker.snapshot = current;
+
+if (navigated) return {full: true, url: location.href, added: elements, changed: [], removed: []};
+return {full: false, url: location.href, added: added, changed: changed, removed: removed};
+""" % {"attribute": ELEMENT_ID_ATTRIBUTE}
+)
+
+# Shared lookup used by the in-page action routines: finds a distilled element through shadow roots and
+# same-origin iframes.
+FIND_ELEMENT_JS = """
+function surferFind(root, id) {
+    const direct = root.querySelector('[%(attribute)s="' + id + '"]');
+    if (direct) return direct;
+    for (const el of root.querySelectorAll("*")) {
+        let found = null;
+        if (el.shadowRoot) found = surferFind(el.shadowRoot, id);
+        if (!found && (el.tagName === "IFRAME" || el.tagName === "FRAME")) {
+            try {
+                if (el.contentDocument) found = surferFind(el.contentDocument, id);
+            } catch (e) {}
+        }
+        if (found) return found;
+    }
+    return null;
+}
+""" % {"attribute": ELEMENT_ID_ATTRIBUTE}
+
+ACT_ON_ELEMENT_JS = (
+    FIND_ELEMENT_JS
+    + """
+const id = arguments[0], action = arguments[1], content = arguments[2];
+const el = surferFind(document, id);
+if (!el) return {ok: false, error: "No element with id " + id};
+el.scrollIntoView({block: "center", inline: "center"});
+
+if (action === "click") {
+    el.click();
+    return {ok: true, tag: el.tagName.toLowerCase()};
+}
+if (action === "extract") {
+    return {ok: true, text: (el.innerText || el.value || "").trim()};
+}
+if (action === "fill") {
+    el.focus();
+    if (el.tagName === "SELECT") {
+        const wanted = String(content).trim().toLowerCase();
+        const option = Array.from(el.options).find(
+            o => o.value.toLowerCase() === wanted || o.text.trim().toLowerCase() === wanted
+        );
+        if (!option) return {ok: false, error: "No option " + content};
+        el.value = option.value;
+    } else if (el.isContentEditable) {
+        el.textContent = content;
+    } else {
+        // Native setter so that React-like frameworks see the change
+        const proto = el.tagName === "TEXTAREA" ? HTMLTextAreaElement.prototype : HTMLInputElement.prototype;
+        Object.getOwnPropertyDescriptor(proto, "value").set.call(el, content);
+    }
+    el.dispatchEvent(new Event("input", {bubbles: true}));
+    el.dispatchEvent(new Event("change", {bubbles: true}));
+    return {ok: true, value: el.isContentEditable ? el.innerText : el.value};
+}
+return {ok: false, error: "Unknown action " + action};
+"""
+)
+
+# Finds the targets of the links to explore, designated by distilled element id or by visible text. Text matches
+# prefer the exact text, then a text containing the other, then the link sharing the most words, at least half.
+RESOLVE_LINKS_JS = (
+    FIND_ELEMENT_JS
+    + """
+const queries = arguments[0];
+const normalize = s => (s || "").replace(/\\s+/g, " ").trim().toLowerCase();
+const words = s => s.split(/[^\\p{L}\\p{N}]+/u).filter(w => w.length > 1);
+const isWeb = a => /^https?:/.test(a.href);
+const anchors = Array.from(document.querySelectorAll("a[href]")).filter(a => {
+    const rect = a.getBoundingClientRect();
+    return isWeb(a) && rect.width > 0 && rect.height > 0;
+});
+const texts = anchors.map(a => normalize(a.innerText || a.getAttribute("aria-label") || a.title));
+return queries.map(query => {
+    const id = query.replace(/^\\[|\\]$/g, "").trim();
+    const byId = /^[\\w-]+$/.test(id) ? surferFind(document, id) : null;
+    const link = byId && byId.closest("a[href]");
+    if (link && isWeb(link)) return {query: query, url: link.href, text: normalize(link.innerText)};
+
+    const wanted = normalize(query);
+    const wantedWords = words(wanted);
+    let best = -1, bestScore = 0;
+    texts.forEach((text, i) => {
+        let score = 0;
+        if (!text) return;
+        if (text === wanted) score = 3;
+        else if (text.length >= 3 && (text.includes(wanted) || wanted.includes(text))) score = 2;
+        else if (wantedWords.length) {
+            const textWords = new Set(words(text));
+            const shared = wantedWords.filter(w => textWords.has(w)).length / wantedWords.length;
+            if (shared >= 0.5) score = shared;
+        }
+        if (score > bestScore) { best = i; bestScore = score; }
+    });
+    if (best < 0) return {query: query, url: null, text: ""};
+    return {query: query, url: anchors[best].href, text: texts[best]};
+});
+"""
+)
+
+
+class DomElement(BaseModel):
+    """Visible interactive or text element of the page, as reported by the distiller."""
+
+    id: str
+    role: str
+    label: str = ""
+    value: str | None = None
+    bbox: tuple[int, int, int, int]
+    """x, y, width, height in CSS pixels relative to the top-level viewport"""
+    in_viewport: bool = True
+    disabled: bool = False
+
+
+class DomDelta(BaseModel):
+    """Elements added, changed or removed since the previous call, or the full page after a navigation."""
+
+    full: bool
+    url: str
+    added: list[DomElement]
+    changed: list[DomElement]
+    removed: list[str]
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.full or self.added or self.changed or self.removed)
+
+
+def distill_page(browser, max_text_length: int = 80, max_elements: int = 1500) -> list[DomElement]:
+    """Run the distiller in the current page and return its elements in document order."""
+    raw_elements = browser.execute_script(DISTILL_JS, max_text_length, max_elements) or []
+    return [DomElement.model_validate(raw) for raw in raw_elements]
+
+
+def is_form_like_page(elements: list[DomElement], min_form_fields: int = 3) -> bool:
+    """Pages with several editable fields are handled faster and more reliably from the DOM than from pixels."""
+    n_form_fields = sum(1 for element in elements if element.role in FORM_FIELD_ROLES and not element.disabled)
+    return n_form_fields >= min_form_fields
+
+
+def format_element(element: DomElement) -> str:
+    x, y, width, height = element.bbox
+    line = f"[{element.id}] {element.role}"
+    if element.label:
+        line += f' "{element.label}"'
+    if element.value is not None:
+        line += f' value="{element.value}"'
+    if element.disabled:
+        line += " disabled"
+    line += f" @{x},{y},{width}x{height}"
+    if not element.in_viewport:
+        line += " offscreen"
+    return line
+
+
+def format_elements(elements: list[DomElement]) -> str:
+    """One line per element, compact enough to send the whole page to the model."""
+    return "\n".join(format_element(element) for element in elements)
+
+
+def act_on_element(browser, element_id: str, action: str, content: str | None = None) -> dict:
+    """Click, fill or read a distilled element in one round trip. Returns {"ok": bool, ...}."""
+    return browser.execute_script(ACT_ON_ELEMENT_JS, element_id, action, content) or {"ok": False}
+
+
+def page_delta(browser, max_text_length: int = 80, max_elements: int = 1500) -> DomDelta:
+    """Changes of the page since the last call. The first call on a document returns the full element list."""
+    raw_delta = browser.execute_script(DELTA_JS, max_text_length, max_elements)
+    return DomDelta.model_validate(raw_delta)
+
+
+def format_delta(delta: DomDelta) -> str:
+    """Text description of a delta, meant to follow a full element list the model has already seen."""
+    if delta.full:
+        return format_elements(delta.added)
+    if delta.is_empty:
+        return "No change on the page since the previous step."
+    lines = []
+    if delta.added:
+        lines.append("ADDED:")
+        lines.extend(format_element(element) for element in delta.added)
+    if delta.changed:
+        lines.append("CHANGED:")
+        lines.extend(format_element(element) for element in delta.changed)
+    if delta.removed:
+        lines.append("REMOVED: " + ", ".join(f"[{element_id}]" for element_id in delta.removed))
+    return "\n".join(lines)
+
+
+def resolve_links(browser, queries: list[str]) -> list[dict]:
+    """URL of the link each query designates, by element id or text. Returns {"query", "url", "text"} per query,
+    with a null url when no link matches."""
+    return browser.execute_script(RESOLVE_LINKS_JS, queries) or []
@@ -0,0 +1,72 @@
+import queue
+import threading
+import zlib
+from typing import Callable, Literal
+
+DropPolicy = Literal["block", "drop_screenshot"]
+
+
+class EventPool:
+    """Background workers that encode and persist trajectory events off the agent's thread.
+
+    Jobs are sharded by key (the trajectory id) so that the events of a trajectory are always handled in order
+    by the same worker. Each shard has a bounded queue: when it is full, `submit` blocks, unless the job is
+    droppable and the policy is `drop_screenshot`, in which case the job is discarded.
+    """
+
+    def __init__(self, n_workers: int = 2, max_queue_size: int = 32, drop_policy: DropPolicy = "block"):
+        if drop_policy not in ("block", "drop_screenshot"):
+            raise ValueError(f"Invalid drop policy: {drop_policy}")
+        self.drop_policy = drop_policy
+        self.queues: list[queue.Queue] = [queue.Queue(maxsize=max_queue_size) for _ in range(max(1, n_workers))]
+        self.n_submitted = 0
+        self.n_dropped = 0
+        self._lock = threading.Lock()
+
+        for i, shard in enumerate(self.queues):
+            threading.Thread(target=self._worker, args=(shard,), name=f"event-pool-{i}", daemon=True).start()
+
+    def _shard(self, key: str) -> queue.Queue:
+        # crc32 rather than hash() so that the shard of a key does not depend on PYTHONHASHSEED
+        return self.queues[zlib.crc32(key.encode()) % len(self.queues)]
+
+    @staticmethod
+    def _worker(shard: queue.Queue):
+        while True:
+            job = shard.get()
+            try:
+                job()
+            except Exception as e:
+                print(f"⚠️  Event handling failed: {e}")
+            finally:
+                shard.task_done()
+
+    def submit(self, key: str, job: Callable[[], None], droppable: bool = False) -> bool:
+        """Queue a job, returns False if it was dropped because its shard is full."""
+        shard = self._shard(key)
+        if droppable and self.drop_policy == "drop_screenshot":
+            try:
+                shard.put_nowait(job)
+            except queue.Full:
+                with self._lock:
+                    self.n_dropped += 1
+                return False
+        else:
+            shard.put(job)
+        with self._lock:
+            self.n_submitted += 1
+        return True
+
+    def flush(self, key: str | None = None):
+        """Wait until the queued jobs of `key` (or of every key) have been handled. Must not be called by a job."""
+        for shard in [self._shard(key)] if key is not None else self.queues:
+            shard.join()
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self.queues),
+            "drop_policy": self.drop_policy,
+            "queued": [shard.qsize() for shard in self.queues],
+            "submitted": self.n_submitted,
+            "dropped": self.n_dropped,
+        }
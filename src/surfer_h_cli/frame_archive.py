@@ -0,0 +1,328 @@
+"""Compact on-disk storage of the screenshots of a trajectory.
+
+All frames of a trajectory live in a single container file:
+
+    header | record 0 | index | trailer | record 1 | index | trailer | ...
+
+The trailer holds the offset and length of the index just before it, then an end magic. Each append writes a record,
+the whole index and a trailer after the previous trailer, which it never overwrites: the last complete trailer is the
+archive's, and an append interrupted by a crash leaves the archive as it was before. The indexes of earlier appends
+are dropped when the writer is closed.
+
+A record is either a keyframe, the frame itself, or a delta, the pixel-wise modulo-256 difference between the frame
+and its keyframe. Both are stored losslessly (WebP when Pillow supports it, PNG otherwise). Consecutive screenshots
+are mostly identical, so deltas are mostly zeros and compress to a fraction of the frame. Since a delta always
+refers to a keyframe and never to the previous frame, reading any frame decodes at most two records.
+
+    python -m surfer_h_cli.frame_archive trajectories
+
+moves the inline base64 screenshots of existing trajectory files into archives.
+"""
+
+import argparse
+import base64
+import io
+import json
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Literal
+
+from PIL import Image, ImageChops, features
+from pydantic import BaseModel
+
+HEADER = b"SFRA\x01\x00\x00\x00"
+END_MAGIC = b"SFRT"
+TRAILER = struct.Struct("<QQ4s")
+"""Offset and length of the index, then END_MAGIC"""
+
+RecordFormat = Literal["webp", "png"]
+
+
+class FrameRecord(BaseModel):
+    offset: int
+    """Relative to the start of the archive"""
+    length: int
+    kind: Literal["key", "delta"]
+    key: int
+    """Index of the keyframe this frame is stored against, itself for keyframes"""
+    width: int
+    height: int
+
+
+def default_record_format() -> RecordFormat:
+    return "webp" if features.check("webp") else "png"
+
+
+def encode_record(image: Image.Image, record_format: RecordFormat) -> bytes:
+    buffer = io.BytesIO()
+    if record_format == "webp":
+        image.save(buffer, format="WEBP", lossless=True, quality=50, method=4)
+    else:
+        image.save(buffer, format="PNG", optimize=False)
+    return buffer.getvalue()
+
+
+def encode_index(index: list[FrameRecord]) -> bytes:
+    return json.dumps([record.model_dump() for record in index], separators=(",", ":")).encode()
+
+
+def _parse_tail(data: bytes | mmap.mmap, base_offset: int, end: int) -> list[FrameRecord] | None:
+    """The index whose trailer ends at `end`, None when there is no complete one"""
+    if end - base_offset < len(HEADER) + TRAILER.size:
+        return None
+    index_offset, index_length, magic = TRAILER.unpack(data[end - TRAILER.size : end])
+    start = base_offset + index_offset
+    if magic != END_MAGIC or index_offset < len(HEADER) or start + index_length != end - TRAILER.size:
+        return None
+    try:
+        return [FrameRecord.model_validate(entry) for entry in json.loads(data[start : start + index_length])]
+    except ValueError:
+        return None
+
+
+def find_index(data: bytes | mmap.mmap, base_offset: int, end: int) -> tuple[list[FrameRecord], int]:
+    """The index of the archive and where its trailer ends, which is before `end` when the last append was
+    interrupted."""
+    if end - base_offset < len(HEADER) + TRAILER.size or data[base_offset : base_offset + len(HEADER)] != HEADER:
+        raise ValueError("Not a frame archive")
+    tail_end = end
+    while True:
+        index = _parse_tail(data, base_offset, tail_end)
+        if index is not None:
+            return index, tail_end
+        magic_offset = data.rfind(END_MAGIC, base_offset, tail_end - 1)
+        if magic_offset < 0:
+            raise ValueError("Frame archive has no index, it was not closed properly")
+        tail_end = magic_offset + len(END_MAGIC)
+
+
+def read_index(data: bytes | mmap.mmap, base_offset: int, end: int) -> list[FrameRecord]:
+    return find_index(data, base_offset, end)[0]
+
+
+class FrameArchiveWriter:
+    """Appends frames to an archive, with a new index after each frame so the file is always readable."""
+
+    def __init__(self, path: str | Path, record_format: RecordFormat | None = None, max_delta_ratio: float = 0.5):
+        self.path = Path(path)
+        self.record_format = record_format or default_record_format()
+        self.max_delta_ratio = max_delta_ratio
+        """A frame becomes a new keyframe when its delta is larger than this fraction of the keyframe"""
+        self.index: list[FrameRecord] = []
+        self.end = 0
+        """Where the next record goes, right after the last trailer"""
+        self._keyframe: Image.Image | None = None
+
+        if self.path.exists():
+            with open(self.path, "rb") as f:
+                data = f.read()
+            self.index, self.end = find_index(data, 0, len(data))
+            if self.end < len(data):
+                # Left by an interrupted append
+                with open(self.path, "r+b") as f:
+                    f.truncate(self.end)
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            index = encode_index([])
+            with open(self.path, "wb") as f:
+                f.write(HEADER + index + TRAILER.pack(len(HEADER), len(index), END_MAGIC))
+            self.end = len(HEADER) + len(index) + TRAILER.size
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def _current_keyframe(self) -> tuple[int, Image.Image] | None:
+        if not self.index:
+            return None
+        key = self.index[-1].key
+        if self._keyframe is None:
+            # Reopened archive: decode the keyframe once
+            with FrameArchiveReader(self.path) as reader:
+                self._keyframe = reader.frame(key)
+        return key, self._keyframe
+
+    def append(self, image: Image.Image) -> int:
+        """Store a frame and return its index in the archive."""
+        image = image.convert("RGB")
+        kind, key, payload = "key", len(self.index), b""
+
+        current = self._current_keyframe()
+        if current is not None and current[1].size == image.size:
+            key_index, keyframe = current
+            payload = encode_record(ImageChops.subtract_modulo(image, keyframe), self.record_format)
+            if len(payload) <= self.index[key_index].length * self.max_delta_ratio:
+                kind, key = "delta", key_index
+        if kind == "key":
+            payload = encode_record(image, self.record_format)
+        index = self._write(payload, kind, key, image.width, image.height)
+        if kind == "key":
+            self._keyframe = image
+        return index
+
+    def append_encoded(self, payload: bytes) -> int:
+        """Store a frame already encoded, e.g. a PNG, as it is: as a keyframe, without decoding it."""
+        with Image.open(io.BytesIO(payload)) as image:
+            # Only the header is read
+            width, height = image.size
+        index = self._write(payload, "key", len(self.index), width, height)
+        self._keyframe = None
+        return index
+
+    def _write(self, payload: bytes, kind: Literal["key", "delta"], key: int, width: int, height: int) -> int:
+        record = FrameRecord(offset=self.end, length=len(payload), kind=kind, key=key, width=width, height=height)
+        index = encode_index([*self.index, record])
+        index_offset = self.end + len(payload)
+        with open(self.path, "r+b") as f:
+            f.seek(self.end)
+            f.write(payload + index)
+            f.flush()
+            os.fsync(f.fileno())
+            # Last, once the record and the index it points to are on disk
+            f.write(TRAILER.pack(index_offset, len(index), END_MAGIC))
+        self.index.append(record)
+        self.end = index_offset + len(index) + TRAILER.size
+        return len(self.index) - 1
+
+    def close(self):
+        """Rewrite the archive without the indexes of earlier appends."""
+        index = encode_index(self.index)
+        if self.end == len(HEADER) + sum(record.length for record in self.index) + len(index) + TRAILER.size:
+            return
+        tmp_path = self.path.with_suffix(".frames.tmp")
+        with open(self.path, "rb") as src, open(tmp_path, "wb") as dst:
+            dst.write(HEADER)
+            offset = len(HEADER)
+            records = []
+            for record in self.index:
+                src.seek(record.offset)
+                dst.write(src.read(record.length))
+                records.append(record.model_copy(update={"offset": offset}))
+                offset += record.length
+            index = encode_index(records)
+            dst.write(index + TRAILER.pack(offset, len(index), END_MAGIC))
+        os.replace(tmp_path, self.path)
+        self.index = records
+        self.end = offset + len(index) + TRAILER.size
+
+
+class FrameArchiveReader:
+    """Random access to the frames of an archive through mmap, without reading the other records.
+
+    The archive may be embedded in a larger file (e.g. a bundle), at `base_offset` and spanning `size` bytes.
+    """
+
+    def __init__(self, path: str | Path, base_offset: int = 0, size: int | None = None):
+        self._file = open(path, "rb")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty file
+            self._file.close()
+            raise ValueError("Not a frame archive")
+        self.base_offset = base_offset
+        end = base_offset + size if size is not None else len(self._mmap)
+        self.index = read_index(self._mmap, base_offset, end)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+    def _decode(self, record: FrameRecord) -> Image.Image:
+        start = self.base_offset + record.offset
+        image = Image.open(io.BytesIO(self._mmap[start : start + record.length]))
+        image.load()
+        return image.convert("RGB")
+
+    def frame(self, i: int) -> Image.Image:
+        record = self.index[i]
+        image = self._decode(record)
+        if record.kind == "delta":
+            image = ImageChops.add_modulo(image, self._decode(self.index[record.key]))
+        return image
+
+    def frame_png(self, i: int) -> bytes:
+        buffer = io.BytesIO()
+        self.frame(i).save(buffer, format="PNG")
+        return buffer.getvalue()
+
+    def frame_b64(self, i: int) -> str:
+        return base64.b64encode(self.frame_png(i)).decode()
+
+
+def archive_path(trajectory_file: Path) -> Path:
+    return trajectory_file.with_suffix(".frames")
+
+
+def hydrate_events(file_data: dict, reader: FrameArchiveReader) -> dict:
+    """Put back the base64 PNG screenshots of events whose frame is in the archive."""
+    for event in file_data.get("events", []):
+        frame = event.get("frame")
+        if frame is not None and not event.get("screenshot") and frame < len(reader):
+            event["screenshot"] = reader.frame_b64(frame)
+    return file_data
+
+
+def archive_trajectory_file(trajectory_file: Path, record_format: RecordFormat | None = None) -> tuple[int, int]:
+    """Move the inline screenshots of a trajectory file into its archive. Returns the sizes before and after."""
+    before = trajectory_file.stat().st_size + (
+        archive_path(trajectory_file).stat().st_size if archive_path(trajectory_file).exists() else 0
+    )
+    with open(trajectory_file, "r") as f:
+        file_data = json.load(f)
+
+    writer = None
+    for event in file_data.get("events", []):
+        if event.get("screenshot") and event.get("frame") is None:
+            if writer is None:
+                writer = FrameArchiveWriter(archive_path(trajectory_file), record_format=record_format)
+            image = Image.open(io.BytesIO(base64.b64decode(event["screenshot"])))
+            event["frame"] = writer.append(image)
+            event["screenshot"] = None
+
+    if writer is not None:
+        writer.close()
+        tmp_file = trajectory_file.with_suffix(".json.tmp")
+        with open(tmp_file, "w") as f:
+            json.dump(file_data, f, indent=2)
+        os.replace(tmp_file, trajectory_file)
+
+    after = trajectory_file.stat().st_size + (
+        archive_path(trajectory_file).stat().st_size if archive_path(trajectory_file).exists() else 0
+    )
+    return before, after
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move inline trajectory screenshots into frame archives")
+    parser.add_argument("trajectories_dir", type=Path, nargs="?", default=Path("trajectories"))
+    parser.add_argument("--record_format", choices=["webp", "png"], default=None)
+    args = parser.parse_args()
+
+    total_before, total_after = 0, 0
+    for trajectory_file in sorted(args.trajectories_dir.glob("trajectory_*.json")):
+        try:
+            before, after = archive_trajectory_file(trajectory_file, args.record_format)
+        except (json.JSONDecodeError, IOError, ValueError) as e:
+            print(f"Error archiving trajectory file {trajectory_file}: {e}")
+            continue
+        total_before += before
+        total_after += after
+        print(f"{trajectory_file.name}: {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB")
+
+    if total_after:
+        print(f"Total: {total_before / 1e6:.1f} MB -> {total_after / 1e6:.1f} MB ({total_before / total_after:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
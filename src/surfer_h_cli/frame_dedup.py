@@ -0,0 +1,74 @@
+from PIL import Image, ImageChops
+
+from surfer_h_cli.utils import hamming_distance, image_dhash
+
+PIXEL_TOLERANCE = 16
+"""Per-pixel grayscale difference below which two pixels count as equal (antialiasing, compression noise)"""
+
+
+def changed_fraction(image_a: Image.Image, image_b: Image.Image) -> float:
+    """Fraction of the pixels that differ between two frames, 1.0 when their sizes differ."""
+    if image_a.size != image_b.size:
+        return 1.0
+    difference = ImageChops.difference(image_a.convert("RGB"), image_b.convert("RGB")).convert("L")
+    bbox = difference.getbbox()
+    if bbox is None:
+        return 0.0
+    n_changed = difference.crop(bbox).point(lambda value: 255 if value > PIXEL_TOLERANCE else 0).histogram()[255]
+    return n_changed / (image_a.width * image_a.height)
+
+
+def is_duplicate_frame(
+    image_a: Image.Image,
+    image_b: Image.Image,
+    max_hash_distance: int = 4,
+    max_changed_fraction: float = 0.0001,
+) -> bool:
+    """Whether two frames show the same page. The perceptual hash rules out clearly different frames cheaply,
+    the pixel difference then catches small but meaningful changes (a typed character, a ticked box)."""
+    if hamming_distance(image_dhash(image_a), image_dhash(image_b)) > max_hash_distance:
+        return False
+    return changed_fraction(image_a, image_b) <= max_changed_fraction
+
+
+def describe_action(navigation_action: dict | None) -> str:
+    if navigation_action is None:
+        return "the previous step"
+    action = navigation_action.get("action", navigation_action)
+    if not isinstance(action, dict):
+        return str(action)
+    target = action.get("element") or action.get("content") or ""
+    return f'{action.get("action")} "{target}"' if target else str(action.get("action"))
+
+
+def select_navigation_frames(
+    screenshots: list[Image.Image],
+    navigation_actions: list[dict],
+    n_frames: int,
+    max_hash_distance: int = 4,
+    max_changed_fraction: float = 0.0001,
+    backfill: bool = False,
+) -> tuple[list[Image.Image], list[str]]:
+    """Pick the frames to send to the navigation model, oldest first, and notes for the ones left out.
+
+    A frame is left out when the next frame shows the same page: the action taken in between had no visible effect.
+    The latest frame is always kept. With `backfill`, older distinct frames fill the window up to `n_frames`.
+    """
+    candidates = screenshots if backfill else screenshots[-n_frames:]
+    # The last screenshot follows the last action, so history is aligned from the end:
+    # the action taken between candidates i and i + 1 is navigation_actions[action_offset + i]
+    action_offset = len(navigation_actions) - len(candidates) + 1
+
+    kept = [candidates[-1]]
+    notes = []
+    for i in range(len(candidates) - 2, -1, -1):
+        if len(kept) == n_frames:
+            break
+        if is_duplicate_frame(candidates[i], candidates[i + 1], max_hash_distance, max_changed_fraction):
+            action_index = action_offset + i
+            action = navigation_actions[action_index] if 0 <= action_index < len(navigation_actions) else None
+            notes.append(f"Page unchanged after {describe_action(action)}")
+            continue
+        kept.append(candidates[i])
+
+    return kept[::-1], notes[::-1]
@@ -0,0 +1,218 @@
+"""Hedged chat completions, against the latency tail of self-hosted model endpoints.
+
+A call that has not returned after a percentile of the recent latencies of its endpoint is sent again, to the next
+replica when there are several, and the first response wins. The other request is cancelled, which closes its
+connection so that the server can abort the generation.
+
+Hedges are budgeted per endpoint: an endpoint receives at most `max_hedge_ratio` hedges per request sent to it,
+plus a small burst, so that a slow endpoint is not buried under duplicates. Latencies and budgets are shared by
+all clients of the process, per endpoint and model.
+"""
+
+import asyncio
+import threading
+import time
+from collections import Counter, deque
+from itertools import count
+
+from openai import AsyncOpenAI, OpenAI
+from openai.types.chat import ChatCompletion
+from pydantic import BaseModel
+
+
+class HedgingPolicy(BaseModel):
+    percentile: float = 95.0
+    """Percentile of the recent latencies of an endpoint after which a call is duplicated"""
+    min_samples: int = 20
+    """Calls an endpoint must have answered before its calls are hedged"""
+    window: int = 200
+    """Recent latencies kept per endpoint"""
+    max_hedge_ratio: float = 0.1
+    """Hedges an endpoint may receive per request sent to it"""
+    max_hedge_burst: float = 5.0
+    """Hedges an endpoint may receive at once"""
+
+
+class EndpointStats:
+    """Recent latencies and hedge budget of one model on one endpoint."""
+
+    def __init__(self, policy: HedgingPolicy):
+        self.policy = policy
+        self.latencies: deque[float] = deque(maxlen=policy.window)
+        self.budget = policy.max_hedge_burst
+        self.counters: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, latency: float):
+        with self._lock:
+            self.latencies.append(latency)
+
+    def percentile(self, percentile: float) -> float | None:
+        with self._lock:
+            latencies = sorted(self.latencies)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * percentile / 100))]
+
+    def hedge_delay(self) -> float | None:
+        """How long to wait before hedging a call, None until enough calls were answered"""
+        if len(self.latencies) < self.policy.min_samples:
+            return None
+        return self.percentile(self.policy.percentile)
+
+    def add_request(self):
+        with self._lock:
+            self.counters["requests"] += 1
+            self.budget = min(self.policy.max_hedge_burst, self.budget + self.policy.max_hedge_ratio)
+
+    def take_hedge(self) -> bool:
+        with self._lock:
+            if self.budget < 1.0:
+                self.counters["budget_denied"] += 1
+                return False
+            self.budget -= 1.0
+            self.counters["hedges"] += 1
+            return True
+
+    def count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+            n_latencies = len(self.latencies)
+        return {
+            "requests": counters.get("requests", 0),
+            "hedges": counters.get("hedges", 0),
+            "hedge_wins": counters.get("hedge_wins", 0),
+            "budget_denied": counters.get("budget_denied", 0),
+            "latencies": n_latencies,
+            "p50_seconds": self.percentile(50),
+            "p95_seconds": self.percentile(95),
+            "p99_seconds": self.percentile(99),
+        }
+
+
+_endpoints: dict[str, EndpointStats] = {}
+_endpoints_lock = threading.Lock()
+
+
+def endpoint_stats(endpoint: str, policy: HedgingPolicy) -> EndpointStats:
+    with _endpoints_lock:
+        if endpoint not in _endpoints:
+            _endpoints[endpoint] = EndpointStats(policy)
+        return _endpoints[endpoint]
+
+
+def hedging_stats() -> dict[str, dict]:
+    """Hedging counters and latency percentiles per endpoint and model"""
+    with _endpoints_lock:
+        endpoints = dict(_endpoints)
+    return {endpoint: stats.stats() for endpoint, stats in endpoints.items()}
+
+
+_loop: asyncio.AbstractEventLoop | None = None
+_loop_lock = threading.Lock()
+
+
+def hedging_loop() -> asyncio.AbstractEventLoop:
+    """Event loop running the hedged calls of all clients, in a daemon thread"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="hedged-completions", daemon=True).start()
+        return _loop
+
+
+class _HedgedCompletions:
+    def __init__(self, client: "HedgedClient"):
+        self.client = client
+
+    def create(self, **request) -> ChatCompletion:
+        return asyncio.run_coroutine_threadsafe(self.client.create(request), hedging_loop()).result()
+
+
+class _HedgedChat:
+    def __init__(self, completions: _HedgedCompletions):
+        self.completions = completions
+
+
+class HedgedClient:
+    """Stands in for an OpenAI client, hedging its chat completions across `replicas`, clients of the same model.
+
+    Calls go to the replicas in turn, and are hedged on the next one, or on the same one when there is only one.
+    """
+
+    def __init__(self, replicas: list[OpenAI], policy: HedgingPolicy):
+        if not replicas:
+            raise ValueError("Hedging needs at least one replica")
+        self.policy = policy
+        self.base_urls = [str(replica.base_url) for replica in replicas]
+        self.replicas = [
+            AsyncOpenAI(
+                api_key=replica.api_key,
+                base_url=replica.base_url,
+                timeout=replica.timeout,
+                max_retries=replica.max_retries,
+            )
+            for replica in replicas
+        ]
+        self._next_replica = count()
+        self.chat = _HedgedChat(_HedgedCompletions(self))
+
+    def _stats(self, replica: int, request: dict) -> EndpointStats:
+        return endpoint_stats(f"{self.base_urls[replica]} {request.get('model')}", self.policy)
+
+    async def _call(self, replica: int, request: dict) -> ChatCompletion:
+        start = time.monotonic()
+        try:
+            response = await self.replicas[replica].chat.completions.create(**request)
+        except asyncio.CancelledError:
+            # The request lost to the other one: its elapsed time is a lower bound of its latency. Leaving the slow
+            # requests out would drift the percentiles, and so the hedge delay, down.
+            self._stats(replica, request).record(time.monotonic() - start)
+            raise
+        self._stats(replica, request).record(time.monotonic() - start)
+        return response
+
+    async def create(self, request: dict) -> ChatCompletion:
+        primary = next(self._next_replica) % len(self.replicas)
+        # Only first requests earn hedge budget, hedges do not
+        self._stats(primary, request).add_request()
+        first = asyncio.ensure_future(self._call(primary, request))
+        delay = self._stats(primary, request).hedge_delay()
+        if delay is None:
+            return await first
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+
+        secondary = (primary + 1) % len(self.replicas)
+        if not self._stats(secondary, request).take_hedge():
+            return await first
+        hedge = asyncio.ensure_future(self._call(secondary, request))
+        pending = {first, hedge}
+        error: BaseException | None = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self._stats(secondary, request).count("hedge_wins")
+                        return task.result()
+                    error = task.exception()
+            assert error is not None
+            raise error
+        finally:
+            # The slower request is cancelled, closing its connection
+            for task in pending:
+                task.cancel()
+
+
+def hedge_client(client: OpenAI, policy: HedgingPolicy, replica_base_urls: list[str] | None = None) -> HedgedClient:
+    """Hedge the calls of a client, across replicas at other base URLs sharing its API key when given"""
+    replicas = [client] + [OpenAI(api_key=client.api_key, base_url=url) for url in replica_base_urls or []]
+    return HedgedClient(replicas, policy)
@@ -0,0 +1,77 @@
+import base64
+import io
+from typing import Literal
+
+from PIL import Image
+from pydantic import BaseModel
+
+ImageFormat = Literal["png", "jpeg", "webp"]
+ChromaSubsampling = Literal["4:4:4", "4:2:2", "4:2:0"]
+
+
+class ImageCodec(BaseModel):
+    """How screenshots are encoded before being sent to a model."""
+
+    format: ImageFormat = "jpeg"
+    quality: int = 90
+    """JPEG/WebP quality, ignored for PNG and lossless WebP"""
+    subsampling: ChromaSubsampling | None = None
+    """JPEG chroma subsampling, None keeps Pillow's default (4:2:0)"""
+    lossless: bool = False
+    """Lossless WebP"""
+    method: int = 4
+    """WebP encoder effort, 0 (fast) to 6 (small)"""
+
+    @classmethod
+    def from_spec(cls, spec: str) -> "ImageCodec":
+        """Parse a compact spec such as `png`, `jpeg:85`, `jpeg:85:4:4:4`, `webp:80` or `webp:lossless`."""
+        image_format, _, options = spec.strip().lower().partition(":")
+        if image_format == "jpg":
+            image_format = "jpeg"
+        if image_format not in ("png", "jpeg", "webp"):
+            raise ValueError(f"Invalid image format: {image_format}")
+        if not options:
+            return cls(format=image_format)  # type: ignore[arg-type]
+        if options == "lossless":
+            return cls(format=image_format, lossless=True)  # type: ignore[arg-type]
+        quality, _, subsampling = options.partition(":")
+        return cls(format=image_format, quality=int(quality), subsampling=subsampling or None)  # type: ignore
+
+    @property
+    def spec(self) -> str:
+        if self.format == "png":
+            return "png"
+        if self.lossless:
+            return f"{self.format}:lossless"
+        if self.subsampling:
+            return f"{self.format}:{self.quality}:{self.subsampling}"
+        return f"{self.format}:{self.quality}"
+
+    @property
+    def mime_type(self) -> str:
+        return f"image/{self.format}"
+
+    def encode(self, image: Image.Image) -> io.BytesIO:
+        """Encode into an in-memory buffer. Read it through getbuffer() to avoid copying the bytes."""
+        buffer = io.BytesIO()
+        if self.format == "png":
+            image.save(buffer, format="PNG")
+        elif self.format == "jpeg":
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            options: dict = {"quality": self.quality}
+            if self.subsampling is not None:
+                options["subsampling"] = self.subsampling
+            image.save(buffer, format="JPEG", **options)
+        else:
+            image.save(buffer, format="WEBP", quality=self.quality, lossless=self.lossless, method=self.method)
+        return buffer
+
+    def to_b64(self, image: Image.Image) -> str:
+        return base64.b64encode(self.encode(image).getbuffer()).decode("ascii")
+
+    def to_data_url(self, image: Image.Image) -> str:
+        return f"data:{self.mime_type};base64,{self.to_b64(image)}"
+
+
+DEFAULT_IMAGE_CODEC = ImageCodec(format="jpeg", quality=90)
@@ -0,0 +1,198 @@
+"""Compare image codecs on screenshots recorded in trajectory files.
+
+For every codec, reports the payload size and encode time of the frames as they would be sent to the navigation
+model, and optionally how often the localization model still clicks at the same place as with lossless PNG.
+
+    python -m surfer_h_cli.image_codec_benchmark --trajectories_dir trajectories \\
+        --codecs png jpeg:90 jpeg:75 webp:85 webp:70 \\
+        --base_url_localization $HAI_MODEL_URL --model_name_localization $HAI_MODEL_NAME
+"""
+
+import argparse
+import ast
+import base64
+import io
+import json
+import math
+import os
+import statistics
+import time
+from pathlib import Path
+
+from openai import OpenAI
+from PIL import Image
+from pydantic import BaseModel
+
+from surfer_h_cli.frame_archive import FrameArchiveReader, archive_path, hydrate_events
+from surfer_h_cli.image_codec import ImageCodec
+from surfer_h_cli.skills.navigation_step import localize_element_by_model
+from surfer_h_cli.utils import smart_resize
+
+REFERENCE_CODEC = ImageCodec(format="png")
+
+
+class RecordedFrame(BaseModel):
+    model_config = {"arbitrary_types_allowed": True}
+
+    image: Image.Image
+    element: str | None = None
+    """Element the agent localized on this frame, if any"""
+
+
+class CodecReport(BaseModel):
+    codec: str
+    n_frames: int
+    mean_bytes: float
+    mean_payload_bytes: float
+    """Size of the base64 data URL actually sent"""
+    mean_encode_ms: float
+    n_localizations: int = 0
+    agreement: float | None = None
+    """Fraction of localizations within --agreement_pixels of the PNG reference"""
+
+
+def parse_action(message: str) -> dict | None:
+    """Recover the action dict from an "action" event message."""
+    _, _, payload = message.partition(" : ")
+    try:
+        action = ast.literal_eval(payload.strip())
+    except (ValueError, SyntaxError):
+        return None
+    return action if isinstance(action, dict) else None
+
+
+def load_frames(trajectories_dir: Path, max_frames: int) -> list[RecordedFrame]:
+    """Screenshots of the stored trajectories, each paired with the element localized on it."""
+    frames: list[RecordedFrame] = []
+    for json_file in sorted(trajectories_dir.glob("trajectory_*.json")):
+        try:
+            with open(json_file, "r") as f:
+                file_data = json.load(f)
+            if archive_path(json_file).exists():
+                with FrameArchiveReader(archive_path(json_file)) as reader:
+                    hydrate_events(file_data, reader)
+            events = file_data.get("events", [])
+        except (json.JSONDecodeError, IOError, ValueError) as e:
+            print(f"Error reading trajectory file {json_file}: {e}")
+            continue
+
+        current: RecordedFrame | None = None
+        for event in events:
+            if event["type"] == "screenshot" and event.get("screenshot"):
+                image = Image.open(io.BytesIO(base64.b64decode(event["screenshot"])))
+                image.load()
+                current = RecordedFrame(image=image)
+                frames.append(current)
+                if len(frames) >= max_frames:
+                    return frames
+            elif event["type"] == "action" and current is not None and current.element is None:
+                action = parse_action(event["message"])
+                if action and action.get("action") in ("click_element", "write_element"):
+                    current.element = action.get("element")
+    return frames
+
+
+def navigation_sized(image: Image.Image) -> Image.Image:
+    """Same resize as navigation_request, so that sizes match what the model receives."""
+    height, width = smart_resize(image.height, image.width)
+    return image.resize((width, height), resample=Image.Resampling.LANCZOS).convert("RGB")
+
+
+def benchmark_codec(
+    codec: ImageCodec,
+    frames: list[RecordedFrame],
+    references: list[tuple[int, int] | None],
+    openai_client: OpenAI | None,
+    model: str | None,
+    agreement_pixels: int,
+) -> CodecReport:
+    sizes, payload_sizes, encode_times = [], [], []
+    n_localizations, n_agreements = 0, 0
+
+    for frame, reference in zip(frames, references):
+        image = navigation_sized(frame.image)
+        start = time.perf_counter()
+        buffer = codec.encode(image)
+        encode_times.append((time.perf_counter() - start) * 1000)
+        sizes.append(buffer.getbuffer().nbytes)
+        payload_sizes.append(len(codec.to_data_url(image)))
+
+        if openai_client is not None and model is not None and reference is not None and frame.element:
+            x, y = localize_element_by_model(
+                image=frame.image, element_name=frame.element, openai_client=openai_client, model=model, image_codec=codec
+            )
+            n_localizations += 1
+            n_agreements += math.dist((x, y), reference) <= agreement_pixels
+
+    return CodecReport(
+        codec=codec.spec,
+        n_frames=len(frames),
+        mean_bytes=statistics.fmean(sizes),
+        mean_payload_bytes=statistics.fmean(payload_sizes),
+        mean_encode_ms=statistics.fmean(encode_times),
+        n_localizations=n_localizations,
+        agreement=n_agreements / n_localizations if n_localizations else None,
+    )
+
+
+def print_reports(reports: list[CodecReport]):
+    reference_bytes = next((r.mean_bytes for r in reports if r.codec == REFERENCE_CODEC.spec), reports[0].mean_bytes)
+    print(f"{'codec':<20}{'frames':>8}{'bytes':>12}{'vs png':>9}{'payload':>12}{'encode ms':>11}{'agreement':>11}")
+    for report in reports:
+        agreement = f"{report.agreement:.1%}" if report.agreement is not None else "-"
+        print(
+            f"{report.codec:<20}{report.n_frames:>8}{report.mean_bytes:>12.0f}"
+            f"{report.mean_bytes / reference_bytes:>9.2f}{report.mean_payload_bytes:>12.0f}"
+            f"{report.mean_encode_ms:>11.1f}{agreement:>11}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Image codec accuracy-vs-bytes benchmark on recorded frames")
+    parser.add_argument("--trajectories_dir", type=Path, default=Path("trajectories"))
+    parser.add_argument("--codecs", nargs="+", default=["png", "jpeg:90", "jpeg:75", "webp:85", "webp:70"])
+    parser.add_argument("--max_frames", type=int, default=50)
+    parser.add_argument("--base_url_localization", help="Measure localization agreement with this endpoint")
+    parser.add_argument("--model_name_localization")
+    parser.add_argument("--api_key_localization", default=os.getenv("API_KEY_LOCALIZATION", "EMPTY"))
+    parser.add_argument("--agreement_pixels", type=int, default=20)
+    parser.add_argument("--output", type=Path, help="Also write the reports as JSON")
+    args = parser.parse_args()
+
+    frames = load_frames(args.trajectories_dir, args.max_frames)
+    if not frames:
+        raise SystemExit(f"No screenshots found in {args.trajectories_dir}")
+    print(f"Loaded {len(frames)} frames, {sum(frame.element is not None for frame in frames)} with a localization")
+
+    openai_client, model = None, args.model_name_localization
+    references: list[tuple[int, int] | None] = [None] * len(frames)
+    if args.base_url_localization and model:
+        openai_client = OpenAI(base_url=args.base_url_localization, api_key=args.api_key_localization)
+        references = [
+            localize_element_by_model(
+                image=frame.image,
+                element_name=frame.element,
+                openai_client=openai_client,
+                model=model,
+                image_codec=REFERENCE_CODEC,
+            )
+            if frame.element
+            else None
+            for frame in frames
+        ]
+
+    reports = [
+        benchmark_codec(
+            ImageCodec.from_spec(spec), frames, references, openai_client, model, args.agreement_pixels
+        )
+        for spec in args.codecs
+    ]
+    print_reports(reports)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump([report.model_dump() for report in reports], f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
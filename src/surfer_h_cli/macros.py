@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urlparse
+
+from pydantic import BaseModel, Field
+
+# Literal values of a task that change from one run to the next: quoted strings and tokens containing digits
+# (dates, prices, tracking numbers, ...)
+TASK_PARAMETER_PATTERN = re.compile(r"\"[^\"]*\"|'[^']*'|[\w\-./:]*\d[\w\-./:]*")
+
+
+def task_template(task: str) -> tuple[str, list[str]]:
+    """Split a task into a template with `{param_i}` placeholders and the literal values they replace."""
+    params: list[str] = []
+
+    def replace(match: re.Match) -> str:
+        value = match.group(0)
+        if value[:1] in ("'", '"'):
+            value = value[1:-1]
+        params.append(value)
+        return f"{{param_{len(params) - 1}}}"
+
+    template = TASK_PARAMETER_PATTERN.sub(replace, task.strip())
+    return " ".join(template.lower().split()), params
+
+
+def site_key(url: str) -> str:
+    """Macros are shared by all pages of a site, so only the host is kept."""
+    netloc = urlparse(url).netloc.lower()
+    return netloc.removeprefix("www.") or url
+
+
+def parameterize(text: str, params: list[str]) -> str:
+    # Longest values first so that "2025-10-01" is not half-replaced by "10"
+    for i, value in sorted(enumerate(params), key=lambda item: -len(item[1])):
+        if value:
+            text = text.replace(value, f"{{param_{i}}}")
+    return text
+
+
+def instantiate(text: str, params: list[str]) -> str:
+    for i, value in enumerate(params):
+        text = text.replace(f"{{param_{i}}}", value)
+    return text
+
+
+class MacroStep(BaseModel):
+    """One recorded action and the page it was taken on."""
+
+    action: dict
+    url: str
+    frame_hash: str
+    """dhash of the screenshot the action was taken on, as a hex string"""
+
+
+class Macro(BaseModel):
+    """Action sequence of a successful trajectory, keyed by site and task template."""
+
+    site: str
+    template: str
+    steps: list[MacroStep] = Field(default_factory=list)
+    final_frame_hash: str = ""
+    """dhash of the page reached after the last step"""
+    recorded_at: str = ""
+    n_replays: int = 0
+
+    def step_actions(self, params: list[str]) -> list[dict]:
+        """Recorded actions with the task parameters of the current run substituted in."""
+        actions = []
+        for step in self.steps:
+            action = dict(step.action)
+            if "content" in action:
+                action["content"] = instantiate(action["content"], params)
+            actions.append(action)
+        return actions
+
+    def expected_frame_hash(self, step_index: int) -> int:
+        """Hash of the page expected before `step_index`, or after the last step when it equals len(steps)."""
+        if step_index < len(self.steps):
+            return int(self.steps[step_index].frame_hash, 16)
+        return int(self.final_frame_hash, 16)
+
+
+class MacroStore:
+    """Directory of recorded macros, one JSON file per (site, task template) pair."""
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, site: str, template: str) -> Path:
+        digest = hashlib.sha1(f"{site}\n{template}".encode()).hexdigest()[:16]
+        return self.root / f"{site.replace(':', '_')}_{digest}.json"
+
+    def lookup(self, task: str, url: str) -> tuple[Macro, list[str]] | None:
+        """Return the macro recorded for this kind of task on this site, with the current task's parameters."""
+        template, params = task_template(task)
+        path = self._path(site_key(url), template)
+        if not path.exists():
+            return None
+        try:
+            with open(path, "r") as f:
+                macro = Macro.model_validate(json.load(f))
+        except (json.JSONDecodeError, ValueError) as e:
+            print(f"Error reading macro file {path}: {e}")
+            return None
+        return macro, params
+
+    def record(self, task: str, url: str, steps: list[MacroStep], final_frame_hash: int, n_replays: int = 0):
+        """Store the steps of a successful run, replacing any earlier macro for the same task template."""
+        template, params = task_template(task)
+        recorded_steps = []
+        for step in steps:
+            action = dict(step.action)
+            if "content" in action:
+                action["content"] = parameterize(action["content"], params)
+            recorded_steps.append(step.model_copy(update={"action": action}))
+
+        macro = Macro(
+            site=site_key(url),
+            template=template,
+            steps=recorded_steps,
+            final_frame_hash=f"{final_frame_hash:016x}",
+            recorded_at=datetime.now().isoformat(),
+            n_replays=n_replays,
+        )
+        path = self._path(macro.site, template)
+        # A temporary file of its own: runs of the same task may record at the same time
+        with tempfile.NamedTemporaryFile("w", dir=path.parent, suffix=".json.tmp", delete=False) as f:
+            json.dump(macro.model_dump(), f, indent=2)
+        os.replace(f.name, path)
+        return macro
@@ -0,0 +1,108 @@
+"""Blocking of the requests the agent does not need: ads, trackers and heavy media.
+
+Blocking works on URL patterns, with `*` wildcards, as understood by CDP's Network.setBlockedURLs. Resource types are
+blocked by type on the cdp backend, which intercepts requests, and through file extension patterns on the selenium
+backend, which cannot.
+"""
+
+from collections import Counter
+
+from pydantic import BaseModel
+
+BLOCKLISTS: dict[str, list[str]] = {
+    "ads": [
+        "*doubleclick.net*",
+        "*googlesyndication.com*",
+        "*googleadservices.com*",
+        "*adservice.google.*",
+        "*amazon-adsystem.com*",
+        "*adnxs.com*",
+        "*criteo.com*",
+        "*criteo.net*",
+        "*taboola.com*",
+        "*outbrain.com*",
+        "*pubmatic.com*",
+        "*rubiconproject.com*",
+        "*openx.net*",
+        "*casalemedia.com*",
+        "*moatads.com*",
+        "*adsrvr.org*",
+    ],
+    "trackers": [
+        "*google-analytics.com*",
+        "*connect.facebook.net*",
+        "*scorecardresearch.com*",
+        "*hotjar.com*",
+        "*segment.io*",
+        "*mixpanel.com*",
+        "*newrelic.com*",
+        "*nr-data.net*",
+        "*quantserve.com*",
+        "*chartbeat.com*",
+        "*clarity.ms*",
+        "*bat.bing.com*",
+        "*tiktok.com/i18n/pixel*",
+    ],
+    # Sites also load functional scripts through their tag manager
+    "tag_managers": ["*googletagmanager.com*", "*tags.tiqcdn.com*", "*assets.adobedtm.com*"],
+    "media": ["*.mp4", "*.mp4?*", "*.webm", "*.webm?*", "*.m3u8*", "*.mpd", "*.mpd?*", "*.mp3", "*.mp3?*"],
+    "fonts": ["*.woff", "*.woff?*", "*.woff2", "*.woff2?*", "*.ttf", "*.ttf?*", "*.otf", "*.otf?*"],
+}
+
+DEFAULT_BLOCKLISTS = ["ads", "trackers", "media"]
+"""Fonts are left out: icon fonts carry meaning on screenshots. Tag managers too: they may load what the page needs"""
+
+RESOURCE_TYPES = ("Media", "Font", "Image", "Stylesheet", "Script", "XHR", "Fetch", "Ping", "Other")
+
+# File extensions approximating resource types where requests cannot be filtered by type
+RESOURCE_TYPE_PATTERNS: dict[str, list[str]] = {
+    "Media": BLOCKLISTS["media"],
+    "Font": BLOCKLISTS["fonts"],
+    "Image": ["*.png", "*.png?*", "*.jpg", "*.jpg?*", "*.jpeg", "*.jpeg?*", "*.gif", "*.gif?*", "*.webp", "*.webp?*"],
+}
+
+
+class NetworkBlocking(BaseModel):
+    url_patterns: list[str] = []
+    resource_types: list[str] = []
+    """CDP resource types, e.g. Media or Font"""
+
+    @classmethod
+    def from_blocklists(
+        cls, blocklists: list[str], url_patterns: list[str] | None = None, resource_types: list[str] | None = None
+    ) -> "NetworkBlocking":
+        """Blocking of the named blocklists, plus extra patterns and resource types."""
+        unknown = [name for name in blocklists if name not in BLOCKLISTS]
+        if unknown:
+            raise ValueError(f"Unknown blocklists {unknown}, expected some of {', '.join(BLOCKLISTS)}")
+        unknown = [resource_type for resource_type in resource_types or [] if resource_type not in RESOURCE_TYPES]
+        if unknown:
+            raise ValueError(f"Unknown resource types {unknown}, expected some of {', '.join(RESOURCE_TYPES)}")
+        patterns = [pattern for name in blocklists for pattern in BLOCKLISTS[name]] + list(url_patterns or [])
+        return cls(url_patterns=list(dict.fromkeys(patterns)), resource_types=list(resource_types or []))
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.url_patterns or self.resource_types)
+
+    def patterns_with_types(self) -> list[str]:
+        """URL patterns, with the resource types approximated by file extension."""
+        patterns = list(self.url_patterns)
+        for resource_type in self.resource_types:
+            patterns += RESOURCE_TYPE_PATTERNS.get(resource_type, [])
+        return list(dict.fromkeys(patterns))
+
+
+def is_blocked_failure(params: dict) -> bool:
+    """Whether the params of a Network.loadingFailed event are those of a request blocked by this module: by
+    Network.setBlockedURLs, reported as blocked by the inspector, or failed by the Fetch domain. Blocks made by
+    Chrome itself (CSP, mixed content, ...) have other reasons."""
+    blocked_reason = params.get("blockedReason")
+    if blocked_reason is not None:
+        return blocked_reason == "inspector"
+    return params.get("errorText") == "net::ERR_BLOCKED_BY_CLIENT"
+
+
+def describe_blocked(blocked: Counter) -> str:
+    by_type = ", ".join(f"{resource_type.lower()} {count}" for resource_type, count in blocked.most_common())
+    return f"Blocked {sum(blocked.values())} requests so far ({by_type})"
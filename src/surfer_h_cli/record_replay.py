@@ -0,0 +1,255 @@
+"""Recording of a run's network traffic and model responses, to replay it offline and deterministically.
+
+Network traffic is recorded by the caching proxy in record mode: every response the browser gets is written to a
+`NetworkArchive`, whatever its cache headers. In replay mode the proxy answers from the archive only and never
+reaches the internet, so Chrome loads identical pages. Requests are matched on method, URL and body; a request that
+was made several times is answered with its recorded responses in order. Requests that differ only in query string,
+e.g. cache busters, fall back to the recording of the same path sharing the most query parameters.
+
+Model responses are recorded per client, navigation, localization or validation, in call order. They are replayed by
+request, in recording order among identical requests, since concurrent calls (link exploration, navigation sampling)
+need not arrive in the recorded order; a request that was never recorded gets the next unreplayed call instead, the
+run has diverged. Replayed runs spend no time waiting for models or
+servers, which leaves the agent's own overhead to measure.
+"""
+
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+from urllib.parse import parse_qsl, urlsplit
+
+from openai.types.chat import ChatCompletion
+from pydantic import BaseModel
+
+RECORD_REPLAY_MODES = ("record", "replay")
+
+
+class ArchivedResponse(BaseModel):
+    method: str
+    url: str
+    request_sha: str
+    """sha256 of the request body"""
+    sequence: int
+    """How many times the same request was recorded before this one"""
+    status: int
+    reason: str
+    headers: list[tuple[str, str]]
+
+
+def exchange_key(method: str, url: str, request_sha: str) -> str:
+    return hashlib.sha256(f"{method} {url} {request_sha}".encode()).hexdigest()
+
+
+def url_without_query(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}{parts.path}"
+
+
+class NetworkArchive:
+    """HTTP responses recorded under `directory`, one metadata and one body file each."""
+
+    def __init__(self, directory: str | Path):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.responses: dict[str, list[ArchivedResponse]] = defaultdict(list)
+        self.by_path: dict[tuple[str, str], list[ArchivedResponse]] = defaultdict(list)
+        self._replayed: dict[str, int] = defaultdict(int)
+        for meta_path in sorted(self.directory.glob("*.json")):
+            try:
+                self._index(ArchivedResponse.model_validate_json(meta_path.read_text()))
+            except ValueError:
+                print(f"⚠️  Skipping unreadable network recording {meta_path}")
+        for responses in self.responses.values():
+            responses.sort(key=lambda response: response.sequence)
+
+    def __len__(self) -> int:
+        return sum(len(responses) for responses in self.responses.values())
+
+    def _index(self, response: ArchivedResponse):
+        self.responses[exchange_key(response.method, response.url, response.request_sha)].append(response)
+        self.by_path[(response.method, url_without_query(response.url))].append(response)
+
+    def _stem(self, response: ArchivedResponse) -> str:
+        return f"{exchange_key(response.method, response.url, response.request_sha)}-{response.sequence}"
+
+    def put(
+        self,
+        method: str,
+        url: str,
+        request_body: bytes | None,
+        status: int,
+        reason: str,
+        headers: list[tuple[str, str]],
+        body: bytes,
+    ):
+        request_sha = hashlib.sha256(request_body or b"").hexdigest()
+        with self._lock:
+            sequence = len(self.responses[exchange_key(method, url, request_sha)])
+            response = ArchivedResponse(
+                method=method,
+                url=url,
+                request_sha=request_sha,
+                sequence=sequence,
+                status=status,
+                reason=reason,
+                headers=headers,
+            )
+            self._index(response)
+        stem = self._stem(response)
+        (self.directory / f"{stem}.body").write_bytes(body)
+        # Metadata last: a response is only loaded once its body is complete
+        (self.directory / f"{stem}.json").write_text(response.model_dump_json())
+
+    def get(self, method: str, url: str, request_body: bytes | None) -> tuple[ArchivedResponse, bytes] | None:
+        """The recorded response to a request, the next one for repeated requests, or the closest recording of the
+        same path"""
+        key = exchange_key(method, url, hashlib.sha256(request_body or b"").hexdigest())
+        with self._lock:
+            responses = self.responses.get(key)
+            if responses:
+                # Once the recordings are used up, the last one keeps being served
+                response = responses[min(self._replayed[key], len(responses) - 1)]
+                self._replayed[key] += 1
+            else:
+                candidates = self.by_path.get((method, url_without_query(url)))
+                if not candidates:
+                    return None
+                query = set(parse_qsl(urlsplit(url).query, keep_blank_values=True))
+                response = max(
+                    candidates,
+                    key=lambda candidate: len(
+                        query & set(parse_qsl(urlsplit(candidate.url).query, keep_blank_values=True))
+                    ),
+                )
+        try:
+            return response, (self.directory / f"{self._stem(response)}.body").read_bytes()
+        except OSError:
+            return None
+
+
+# The navigation prompts state the date of the run, which a replay on another day must not see as a new request
+CURRENT_DATE_PATTERN = re.compile(r"The current date is [^\n]*")
+
+
+def request_fingerprint(request: dict) -> str:
+    """Hash of a chat completion request without its images, which may differ by a few pixels between runs, nor
+    the current date"""
+
+    def strip_images(value):
+        if isinstance(value, dict):
+            if value.get("type") == "image_url":
+                return {"type": "image_url"}
+            return {k: strip_images(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [strip_images(v) for v in value]
+        if isinstance(value, str):
+            return CURRENT_DATE_PATTERN.sub("The current date is", value)
+        return value
+
+    return hashlib.sha256(json.dumps(strip_images(request), sort_keys=True, default=str).encode()).hexdigest()
+
+
+class RecordedCall(BaseModel):
+    index: int
+    request_fingerprint: str
+    elapsed_seconds: float
+    response: dict
+
+
+class ModelResponseArchive:
+    """Chat completions of one model client, recorded to `path` in call order or replayed from it by request."""
+
+    def __init__(self, path: str | Path, mode: str):
+        if mode not in RECORD_REPLAY_MODES:
+            raise ValueError(f"Unknown mode {mode}, expected one of {', '.join(RECORD_REPLAY_MODES)}")
+        self.path = Path(path)
+        self.mode = mode
+        self._lock = threading.Lock()
+        self.n_calls = 0
+        self.calls: list[RecordedCall] = []
+        self.by_fingerprint: dict[str, deque[RecordedCall]] = defaultdict(deque)
+        self._replayed: set[int] = set()
+        self._next_index = 0
+        """No call before this index is left to replay"""
+        if mode == "replay":
+            self.calls = [RecordedCall.model_validate_json(line) for line in self.path.read_text().splitlines() if line]
+            for call in self.calls:
+                self.by_fingerprint[call.request_fingerprint].append(call)
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.path.write_text("")
+
+    def record(self, request: dict, response: ChatCompletion, elapsed_seconds: float):
+        with self._lock:
+            call = RecordedCall(
+                index=self.n_calls,
+                request_fingerprint=request_fingerprint(request),
+                elapsed_seconds=elapsed_seconds,
+                response=response.model_dump(),
+            )
+            self.n_calls += 1
+            with self.path.open("a") as f:
+                f.write(call.model_dump_json() + "\n")
+
+    def replay(self, request: dict) -> ChatCompletion:
+        fingerprint = request_fingerprint(request)
+        with self._lock:
+            call, diverged = None, False
+            recorded = self.by_fingerprint.get(fingerprint)
+            while recorded and call is None:
+                candidate = recorded.popleft()
+                if candidate.index not in self._replayed:
+                    call = candidate
+            if call is None:
+                while self._next_index < len(self.calls) and self.calls[self._next_index].index in self._replayed:
+                    self._next_index += 1
+                if self._next_index >= len(self.calls):
+                    raise RuntimeError(f"Replay of {self.path} has no call left, {len(self.calls)} recorded")
+                call, diverged = self.calls[self._next_index], True
+            self._replayed.add(call.index)
+            self.n_calls += 1
+            n_calls = self.n_calls
+        if diverged:
+            print(f"⚠️  No recorded call of {self.path.name} matches call {n_calls}, the run has diverged")
+        return ChatCompletion.model_validate(call.response)
+
+
+class _RecordReplayCompletions:
+    def __init__(self, client, archive: ModelResponseArchive):
+        self.client = client
+        self.archive = archive
+
+    def create(self, **request) -> ChatCompletion:
+        if self.archive.mode == "replay":
+            return self.archive.replay(request)
+        start = time.perf_counter()
+        response = self.client.chat.completions.create(**request)
+        self.archive.record(request, response, time.perf_counter() - start)
+        return response
+
+
+class _RecordReplayChat:
+    def __init__(self, completions: _RecordReplayCompletions):
+        self.completions = completions
+
+
+class RecordReplayClient:
+    """Stands in for an OpenAI client, recording its chat completions or replaying recorded ones without calling it."""
+
+    def __init__(self, client, archive: ModelResponseArchive):
+        self.client = client
+        self.archive = archive
+        self.chat = _RecordReplayChat(_RecordReplayCompletions(client, archive))
+
+
+def record_replay_client(client, directory: str | Path, name: str, mode: str) -> RecordReplayClient:
+    return RecordReplayClient(client, ModelResponseArchive(Path(directory) / "models" / f"{name}.jsonl", mode))
+
+
+def network_archive_dir(directory: str | Path) -> Path:
+    return Path(directory) / "network"
@@ -1,15 +1,236 @@
-from io import BytesIO
+import json
 import time
+from collections import Counter
+from io import BytesIO
 
 from PIL import Image
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
+from selenium.common.exceptions import (
+    NoAlertPresentException,
+    TimeoutException,
+    UnexpectedAlertPresentException,
+    WebDriverException,
+)
 from selenium.webdriver import Chrome
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.action_chains import ActionChains
-from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait
 
+from surfer_h_cli.caching_proxy import ProxySettings
+from surfer_h_cli.network_blocking import NetworkBlocking, is_blocked_failure
+
+
+# Finds the element that scrolls the main content: the closest scrollable ancestor of the element in the middle of
+# the viewport when it covers a good part of it, else the page, else the largest visible scrollable element (pages
+# whose body does not scroll, like most web apps)
+SCROLL_CONTAINER_JS = """
+function surferScrollable(el, vertical) {
+    if (!el || el.nodeType !== 1) return false;
+    const style = getComputedStyle(el);
+    const overflow = vertical ? style.overflowY : style.overflowX;
+    const range = vertical ? el.scrollHeight - el.clientHeight : el.scrollWidth - el.clientWidth;
+    return range > 1 && ['auto', 'scroll', 'overlay'].includes(overflow);
+}
+function surferVisibleArea(el) {
+    const rect = el.getBoundingClientRect();
+    const width = Math.min(rect.right, window.innerWidth) - Math.max(rect.left, 0);
+    const height = Math.min(rect.bottom, window.innerHeight) - Math.max(rect.top, 0);
+    return Math.max(0, width) * Math.max(0, height);
+}
+function surferScrollContainer(vertical) {
+    const root = document.scrollingElement || document.documentElement;
+    const viewportArea = window.innerWidth * window.innerHeight;
+    const rootRange = vertical ? root.scrollHeight - root.clientHeight : root.scrollWidth - root.clientWidth;
+    let el = document.elementFromPoint(window.innerWidth / 2, window.innerHeight / 2);
+    while (el && el !== root && el !== document.body) {
+        if (surferScrollable(el, vertical) && (rootRange <= 1 || surferVisibleArea(el) > viewportArea / 4)) return el;
+        el = el.parentElement;
+    }
+    if (rootRange > 1) return root;
+    let best = root, bestArea = 0;
+    for (const candidate of document.querySelectorAll('*')) {
+        if (!surferScrollable(candidate, vertical)) continue;
+        const area = surferVisibleArea(candidate);
+        if (area > bestArea) { best = candidate; bestArea = area; }
+    }
+    return best;
+}
+"""
+
+# Async script: scrolls the main container by a fraction of its visible size (or to an absolute position) and
+# reports once the scroll ended, on `scrollend` or when the position stopped changing
+SCROLL_JS = (
+    SCROLL_CONTAINER_JS
+    + """
+const [direction, fraction, absolutePosition, done] = arguments;
+const vertical = direction === 'up' || direction === 'down';
+const sign = direction === 'down' || direction === 'right' ? 1 : -1;
+const el = surferScrollContainer(vertical);
+const isRoot = el === (document.scrollingElement || document.documentElement);
+const position = () => vertical ? el.scrollTop : el.scrollLeft;
+const before = position();
+
+let finished = false;
+const finish = () => {
+    if (finished) return;
+    finished = true;
+    const after = position();
+    const max = vertical ? el.scrollHeight - el.clientHeight : el.scrollWidth - el.clientWidth;
+    done({
+        moved: Math.abs(after - before) >= 1,
+        position: after,
+        max: max,
+        at_end: sign > 0 ? after >= max - 1 : after <= 1,
+        container: isRoot ? 'page' : el.tagName.toLowerCase() + (el.id ? '#' + el.id : ''),
+    });
+};
+(isRoot ? document : el).addEventListener('scrollend', finish, {once: true});
+
+const delta = absolutePosition === null ? sign * fraction * (vertical ? el.clientHeight : el.clientWidth)
+                                        : absolutePosition - before;
+el.scrollBy({top: vertical ? delta : 0, left: vertical ? 0 : delta, behavior: 'instant'});
+
+let last = before, stable = 0;
+const poll = () => {
+    if (finished) return;
+    const now = position();
+    stable = now === last ? stable + 1 : 0;
+    last = now;
+    if (stable >= 3) finish(); else setTimeout(poll, 50);
+};
+setTimeout(poll, 50);
+setTimeout(finish, 2000);
+"""
+)
+
+
+# Resolves the element at a point and inspects it in a single round trip. Submit buttons of a form trigger it here,
+# other elements are left for the caller to click with a trusted input event at the same point: selects, file
+# inputs, popup blockers and isTrusted checks ignore synthetic events. Returns what is clicked, the method, and
+# whether the click may open a tab: a link or form with a target.
+CLICK_JS = """
+const [x, y] = arguments;
+let el = document.elementFromPoint(x, y);
+while (el && el.shadowRoot) {
+    const inner = el.shadowRoot.elementFromPoint(x, y);
+    if (!inner || inner === el) break;
+    el = inner;
+}
+if (!el) return {ok: false, error: `No element at (${x}, ${y})`};
+
+const tag = el.tagName.toLowerCase();
+const type = (el.getAttribute('type') || '').toLowerCase();
+const result = {
+    ok: true,
+    tag: tag,
+    id: el.id || '',
+    class: typeof el.className === 'string' ? el.className : '',
+    placeholder: el.getAttribute('placeholder') || '',
+    disabled: !!el.disabled,
+    method: 'click',
+};
+
+const opensTab = (node) => !!node
+    && !['', '_self', '_parent', '_top'].includes((node.getAttribute('target') || '').toLowerCase());
+const form = el.closest('form');
+
+if (tag === 'button' && (type === 'submit' || !type) && form) {
+    // Submit buttons trigger their form directly
+    result.method = 'submit';
+    if (form.onsubmit) {
+        form.dispatchEvent(new Event('submit', {bubbles: true, cancelable: true}));
+    } else {
+        form.submit();
+    }
+    result.may_open_tab = opensTab(form);
+    return result;
+}
+
+result.may_open_tab = opensTab(el.closest('a[href]')) || (opensTab(form) && ['submit', 'image'].includes(type));
+return result;
+"""
+
+
+# Async script: writes into the focused field by setting its value with the native setter, as frameworks that
+# track values (React, Streamlit) only notice that, then dispatching beforeinput/input/change. Reports whether the
+# value read back one tick later is the expected one, or that the field needs real keystrokes (contenteditable
+# editors, fields that cancel beforeinput). `nBackspaces` null clears the field, a number removes that many
+# characters from its end.
+WRITE_JS = """
+const [text, nBackspaces, done] = arguments;
+let el = document.activeElement;
+while (el && el.shadowRoot && el.shadowRoot.activeElement) el = el.shadowRoot.activeElement;
+if (!el || el === document.body || el === document.documentElement) {
+    return done({ok: false, error: 'No input field is focused'});
+}
+
+const tag = el.tagName.toLowerCase();
+if (el.isContentEditable) {
+    if (nBackspaces === null) {
+        // Typed text replaces the selection
+        const range = document.createRange();
+        range.selectNodeContents(el);
+        const selection = window.getSelection();
+        selection.removeAllRanges();
+        selection.addRange(range);
+    }
+    return done({ok: true, tag: tag, needs_keys: true, reason: 'contenteditable'});
+}
+const nonText = ['checkbox', 'radio', 'button', 'submit', 'reset', 'file', 'image', 'range', 'color', 'hidden'];
+if (!(tag === 'textarea' || (tag === 'input' && !nonText.includes((el.type || '').toLowerCase())))) {
+    return done({ok: false, error: `Focused element is <${tag}>, not an input field`});
+}
+
+const current = el.value;
+const base = nBackspaces === null ? '' : current.slice(0, Math.max(0, current.length - nBackspaces));
+const expected = base + text;
+const setter = Object.getOwnPropertyDescriptor(
+    tag === 'textarea' ? HTMLTextAreaElement.prototype : HTMLInputElement.prototype, 'value'
+).set;
+const setValue = (value, data) => {
+    setter.call(el, value);
+    el.dispatchEvent(new InputEvent('input', {bubbles: true, composed: true, inputType: 'insertText', data: data}));
+};
+
+const beforeInput = new InputEvent('beforeinput', {
+    bubbles: true, cancelable: true, composed: true, inputType: 'insertText', data: text,
+});
+if (!el.dispatchEvent(beforeInput)) {
+    setValue(base, null);
+    return done({ok: true, tag: tag, needs_keys: true, reason: 'beforeinput cancelled'});
+}
+setValue(expected, text);
+el.dispatchEvent(new Event('change', {bubbles: true}));
+
+setTimeout(() => {
+    if (el.value === expected) return done({ok: true, tag: tag, needs_keys: false, value: el.value});
+    // A mask or a maxlength rewrote the value: type it instead, on top of what was kept
+    setValue(base, null);
+    done({ok: true, tag: tag, needs_keys: true, reason: 'value rewritten by the page'});
+}, 0);
+"""
+
+# Text of a page for the model, once it has loaded
+PAGE_TEXT_JS = """
+const maxTextLength = arguments[0];
+const text = document.body ? document.body.innerText : "";
+return {url: location.href, title: document.title, text: text.slice(0, maxTextLength)};
+"""
+PAGE_LOADED_JS = 'return location.href !== "about:blank" && document.readyState === "complete";'
+
+
+def stitch_vertically(tiles: list[Image.Image], separator: int = 4) -> Image.Image:
+    """Stack screenshots top to bottom, separated by a gray line."""
+    stitched = Image.new(
+        "RGB", (tiles[0].width, sum(tile.height for tile in tiles) + separator * (len(tiles) - 1)), "gray"
+    )
+    top = 0
+    for tile in tiles:
+        stitched.paste(tile, (0, top))
+        top += tile.height + separator
+    return stitched
+
 
 def chrome_viewport_size(driver: Chrome) -> tuple[int, int]:
     """Get viewport size of chrome browser"""
@@ -38,12 +259,31 @@ class WebTabs(BaseModel):
     titles: list[str]
 
 
+class PageCapture(BaseModel):
+    """A page loaded in a background tab, read without leaving the current page."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    url: str
+    title: str = ""
+    text: str = ""
+    screenshot: Image.Image | None = None
+    error: str | None = None
+
+
 class WebException(Exception):
     """Custom exception for web-related errors"""
 
     pass
 
 
+NEW_TAB_TIMEOUT = 1.0
+"""Seconds to wait for the tab a click may have opened"""
+
+BROWSER_ERRORS = (WebDriverException, WebException)
+"""Failures of either browser backend, recovered from by restarting the browser"""
+
+
 class SimpleWebBrowserTools:
     """Selenium-based web environment for executing web actions"""
 
@@ -55,10 +295,31 @@ class SimpleWebBrowserTools:
             headless: Whether to run browser in headless mode
             wait_timeout: Default timeout for waiting operations
         """
-
-    def open_browser(self, headless: bool, width: int, height: int, action_timeout: int, **kwargs):
-        """Setup the Selenium WebDriver"""
+        self.network_blocking = NetworkBlocking()
+        # Blocked requests per resource type, kept across browser restarts
+        self.blocked: Counter = Counter()
+
+    def open_browser(
+        self,
+        headless: bool,
+        width: int,
+        height: int,
+        action_timeout: int,
+        network_blocking: NetworkBlocking | None = None,
+        user_data_dir: str | None = None,
+        proxy: ProxySettings | None = None,
+        **kwargs,
+    ):
+        """Setup the Selenium WebDriver, on a persistent profile when `user_data_dir` is set and through a caching
+        proxy when `proxy` is"""
+        self.network_blocking = network_blocking or NetworkBlocking()
+        self.user_data_dir = user_data_dir
+        self.proxy = proxy
         options = Options()
+        if user_data_dir is not None:
+            options.add_argument(f"--user-data-dir={user_data_dir}")
+        for argument in proxy.chrome_arguments() if proxy is not None else []:
+            options.add_argument(argument)
         if headless:
             options.add_argument("--headless")
         options.add_argument("--no-sandbox")
@@ -68,7 +329,10 @@ class SimpleWebBrowserTools:
         options.add_argument("--force-device-scale-factor=1")
         options.add_argument("--disable-extensions")
         options.add_argument("--disable-plugins")
-        options.add_argument("--disable-images")
+        if self.network_blocking.enabled:
+            # Blocked requests are counted from the network events of the performance log
+            options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+            options.add_experimental_option("perfLoggingPrefs", {"enableNetwork": True, "enablePage": False})
 
         try:
             self.driver = Chrome(options=options)
@@ -79,10 +343,28 @@ class SimpleWebBrowserTools:
             self.action_timeout = action_timeout
 
             resize_chrome(self.driver, self.width, self.height)
+            self.known_handles = set(self.driver.window_handles)
+            self.apply_network_blocking()
 
         except Exception as e:
             raise WebException(f"Failed to initialize WebDriver: {e}")
 
+    def apply_network_blocking(self):
+        """Block the configured URLs in the current tab, blocking is set per tab"""
+        if self.network_blocking.enabled:
+            self.driver.execute_cdp_cmd("Network.enable", {})
+            self.driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": self.network_blocking.patterns_with_types()})
+
+    def blocked_requests(self) -> Counter:
+        """Number of requests blocked so far, per resource type"""
+        assert self.driver
+        if self.network_blocking.enabled:
+            for entry in self.driver.get_log("performance"):
+                message = json.loads(entry["message"])["message"]
+                if message["method"] == "Network.loadingFailed" and is_blocked_failure(message["params"]):
+                    self.blocked[message["params"].get("type", "Other")] += 1
+        return self.blocked
+
     def get_screenshot_size(self) -> tuple[int, int]:
         """Get the size of the current screenshot/viewport"""
         assert self.driver
@@ -110,107 +392,173 @@ class SimpleWebBrowserTools:
                 return tab
         raise WebException("No newer tab found")
 
-    def click_at(self, x: int, y: int):
-        """Click at specific coordinates"""
+    def click_at(self, x: int, y: int) -> dict:
+        """Click at specific coordinates, then focus the tab the click opened, if any.
+
+        Returns what was clicked: tag, id, class, placeholder, the method used and whether a tab was opened.
+        """
         assert self.driver
-        
-        # Check for alerts and accept them first
+
         try:
-            alert = self.driver.switch_to.alert
-            alert.accept()
-            time.sleep(0.2)
-        except:
-            pass
-        
-        # Find element at coordinates
-        element = self.driver.execute_script(f"return document.elementFromPoint({x}, {y});")
-        if element:
-            # Debug: print what element we found
-            tag = element.tag_name
-            elem_id = element.get_attribute('id')
-            elem_class = element.get_attribute('class')
-            placeholder = element.get_attribute('placeholder')
-            print(f"🔍 DEBUG: Clicking at ({x}, {y}) -> <{tag}> id='{elem_id}' class='{elem_class}' placeholder='{placeholder}'")
-            
-            # Check if it's a submit button - trigger form submission directly
-            tag_name = element.tag_name.lower()
-            element_type = element.get_attribute('type')
-            
-            if tag_name == 'button' and (element_type == 'submit' or not element_type):
-                # Find the form and trigger submit event
-                self.driver.execute_script("""
-                    var button = arguments[0];
-                    var form = button.closest('form');
-                    if (form) {
-                        // Trigger the form's onsubmit handler if it exists
-                        if (form.onsubmit) {
-                            var event = new Event('submit', {bubbles: true, cancelable: true});
-                            form.dispatchEvent(event);
-                        } else {
-                            form.submit();
-                        }
-                    } else {
-                        button.click();
-                    }
-                """, element)
-                time.sleep(0.5)
-                return
-            
-            # Regular click for non-submit elements
-            self.driver.execute_script("arguments[0].scrollIntoView(true);", element)
-            time.sleep(0.1)
-            try:
-                element.click()
-            except:
-                self.driver.execute_script("arguments[0].click();", element)
-                time.sleep(0.1)
-
-    def write(self, text: str, n_backspaces: int = 0):
-        """Write text, optionally clearing with backspaces first"""
+            result = self.driver.execute_script(CLICK_JS, x, y)
+        except UnexpectedAlertPresentException:
+            # An alert was open before the click
+            self.accept_alert()
+            result = self.driver.execute_script(CLICK_JS, x, y)
+
+        if not result.get("ok"):
+            print(f"⚠️  WARNING: {result.get('error')}")
+            return result
+        print(
+            f"🔍 DEBUG: Clicking at ({x}, {y}) -> <{result.get('tag')}> id='{result.get('id')}' "
+            f"class='{result.get('class')}' placeholder='{result.get('placeholder')}' ({result.get('method')})"
+        )
+
+        result["new_tab"] = False
+        try:
+            if result.get("method") == "click":
+                actions = ActionChains(self.driver)
+                actions.w3c_actions.pointer_action.move_to_location(x, y)
+                actions.w3c_actions.pointer_action.click()
+                actions.perform()
+            # Also catches tabs opened by window.open, which shows nowhere in the click's result
+            result["new_tab"] = self.focus_new_tab(timeout=NEW_TAB_TIMEOUT)
+        except UnexpectedAlertPresentException:
+            # The click opened an alert
+            self.accept_alert()
+            result["alert"] = True
+        return result
+
+    def accept_alert(self):
         assert self.driver
-        
-        # Check for alerts and accept them
         try:
-            alert = self.driver.switch_to.alert
-            alert.accept()
-        except:
+            self.driver.switch_to.alert.accept()
+        except NoAlertPresentException:
             pass
-        
-        active_element = self.driver.switch_to.active_element
-        
-        # If no element is focused or it's the body, we failed to click on an input
-        if active_element is None or active_element.tag_name.lower() == 'body':
-            print(f"⚠️  WARNING: No input field is focused! Cannot write text.")
-            return
-        
-        # Verify we're on an input or textarea
-        if active_element.tag_name.lower() not in ['input', 'textarea']:
-            print(f"⚠️  WARNING: Focused element is <{active_element.tag_name}>, not an input field!")
-            return
-        
-        # Clear the field first using Selenium's clear method
+
+    def focus_new_tab(self, timeout: float = 0.0) -> bool:
+        """Switch to the most recent tab opened since the last check, waiting up to `timeout` seconds for one since
+        tabs open a little after the click that opens them. Returns whether there was one."""
+        assert self.driver
+        deadline = time.monotonic() + timeout
+        while True:
+            handles = self.driver.window_handles
+            new_handles = [handle for handle in handles if handle not in self.known_handles]
+            if new_handles or time.monotonic() >= deadline:
+                break
+            time.sleep(0.1)
+        self.known_handles = set(handles)
+        if not new_handles:
+            return False
+        self.driver.switch_to.window(new_handles[-1])
+        self.apply_network_blocking()
+        return True
+
+    def write(self, text: str, n_backspaces: int | None = None) -> dict:
+        """Write text into the focused field, first removing `n_backspaces` characters from its end, or all of its
+        content when None.
+
+        The value is set directly when the field allows it, and typed otherwise. Returns whether writing was
+        possible, whether keystrokes were needed and whether the field ended up with the expected value.
+        """
+        assert self.driver
+
         try:
-            active_element.clear()
-        except:
-            pass
-        
-        active_element.send_keys(text)
+            result = self.driver.execute_async_script(WRITE_JS, text, n_backspaces)
+        except UnexpectedAlertPresentException:
+            self.accept_alert()
+            result = self.driver.execute_async_script(WRITE_JS, text, n_backspaces)
+
+        if not result.get("ok"):
+            print(f"⚠️  WARNING: {result.get('error')}. Cannot write text.")
+            return result
+
+        if result.get("needs_keys"):
+            active_element = self.driver.switch_to.active_element
+            if result.get("reason") == "contenteditable" and n_backspaces:
+                active_element.send_keys(Keys.BACKSPACE * n_backspaces)
+            active_element.send_keys(text)
+            value = self.driver.execute_script(
+                "const el = document.activeElement; return el.isContentEditable ? el.innerText : el.value;"
+            )
+            result["value"] = value
+            result["verified"] = text in (value or "")
+        else:
+            result["verified"] = True
+        return result
+
+    def scroll(self, direction: str, fraction: float = 0.85, position: float | None = None) -> dict:
+        """Scroll the main scroll container of the page by a fraction of its visible size in the specified
+        direction, or to an absolute `position` along that direction's axis, and wait for the scroll to end.
 
-    def scroll(self, direction: str):
-        """Scroll the page in the specified direction"""
+        Returns whether the container moved, its new position and maximum, and whether it reached the end.
+        """
 
         assert self.driver
-        body = self.driver.find_element(By.TAG_NAME, "body")
-        if direction == "down":
-            body.send_keys(Keys.PAGE_DOWN)
-        elif direction == "up":
-            body.send_keys(Keys.PAGE_UP)
-        elif direction == "left":
-            body.send_keys(Keys.ARROW_LEFT)
-        elif direction == "right":
-            body.send_keys(Keys.ARROW_RIGHT)
-        else:
+        if direction not in ("up", "down", "left", "right"):
             raise WebException(f"Invalid scroll direction: {direction}")
+        return self.driver.execute_async_script(SCROLL_JS, direction, fraction, position)
+
+    def capture_page_below(self, n_screens: int) -> Image.Image | None:
+        """Screenshots of the next `n_screens` screens below the current one, stitched vertically, with the page
+        scrolled back where it was. None when the page cannot scroll further down."""
+        assert self.driver
+        start = self.scroll("down", fraction=0.0)["position"]
+
+        tiles = []
+        for _ in range(n_screens):
+            if not self.scroll("down", fraction=1.0)["moved"]:
+                break
+            tiles.append(self.screenshot().convert("RGB"))
+        if not tiles:
+            return None
+        self.scroll("up", position=start)
+        return stitch_vertically(tiles)
+
+    def capture_pages(self, urls: list[str], max_text_length: int = 4000) -> list[PageCapture]:
+        """Load pages in new tabs, all at once, then screenshot and read each one and close its tab.
+
+        WebDriver drives one tab at a time, so only the loads overlap. Pages still loading after the action timeout
+        are captured as they are. The current tab is focused again at the end.
+        """
+        assert self.driver
+        original_handle = self.driver.current_window_handle
+        handles = []
+        captures = []
+        try:
+            for url in urls:
+                self.driver.switch_to.new_window("tab")
+                handles.append(self.driver.current_window_handle)
+                self.apply_network_blocking()
+                # Unlike get, does not wait for the page to load
+                self.driver.execute_script("window.location.href = arguments[0];", url)
+
+            deadline = time.monotonic() + self.action_timeout
+            for url, handle in zip(urls, handles):
+                self.driver.switch_to.window(handle)
+                try:
+                    WebDriverWait(self.driver, max(0.0, deadline - time.monotonic())).until(
+                        lambda driver: driver.execute_script(PAGE_LOADED_JS)
+                    )
+                except TimeoutException:
+                    print(f"⚠️  WARNING: {url} did not finish loading within {self.action_timeout}s")
+                try:
+                    page = self.driver.execute_script(PAGE_TEXT_JS, max_text_length)
+                    captures.append(PageCapture(**page, screenshot=self.screenshot()))
+                except WebDriverException as e:
+                    captures.append(PageCapture(url=url, error=e.msg or e.__class__.__name__))
+        finally:
+            for handle in handles:
+                self.driver.switch_to.window(handle)
+                self.driver.close()
+            self.driver.switch_to.window(original_handle)
+            self.known_handles = set(self.driver.window_handles)
+        return captures
+
+    def execute_script(self, script: str, *args):
+        """Run JavaScript in the current page and return its JSON-serializable result"""
+        assert self.driver
+        return self.driver.execute_script(script, *args)
 
     def goback(self):
         """Navigate back to previous page"""
@@ -230,6 +578,7 @@ class SimpleWebBrowserTools:
             for handle in self.driver.window_handles:
                 self.driver.switch_to.window(handle)
                 if self.driver.title == title:
+                    self.apply_network_blocking()
                     return
 
         except Exception as e:
@@ -253,11 +602,22 @@ class SimpleWebBrowserTools:
 
     def restart(self):
         """Restart the browser"""
-        self.quit()
+        try:
+            self.quit()
+        except Exception:
+            # The previous session may already be gone, e.g. after a Chrome crash
+            self.driver = None
+            self.wait = None
         if not hasattr(self, "headless"):
             raise ValueError("Browser not initialized")
         self.open_browser(
-            headless=self.headless, width=self.width, height=self.height, action_timeout=self.action_timeout
+            headless=self.headless,
+            width=self.width,
+            height=self.height,
+            action_timeout=self.action_timeout,
+            network_blocking=self.network_blocking,
+            user_data_dir=self.user_data_dir,
+            proxy=self.proxy,
         )
 
     def screenshot(self) -> Image.Image:
@@ -266,10 +626,27 @@ class SimpleWebBrowserTools:
 
         bytestream = BytesIO(screenshot)
         bytestream.seek(0)
-        return Image.open(bytestream)
+        image = Image.open(bytestream)
+        # Decoded now: screenshots are read from other threads, e.g. the event pool's
+        image.load()
+        return image
 
     def get_webpage(self) -> tuple[str, Image.Image]:
         assert self.driver is not None
         url = self.get_tab_url()
         screenshot = self.screenshot()
         return url, screenshot
+
+
+BROWSER_BACKENDS = ("selenium", "cdp")
+
+
+def create_browser(backend: str = "selenium"):
+    """Browser tools for a backend: "selenium" through chromedriver, or "cdp" straight over the DevTools protocol."""
+    if backend == "selenium":
+        return SimpleWebBrowserTools()
+    if backend == "cdp":
+        from surfer_h_cli.cdp_browser import CDPBrowserTools
+
+        return CDPBrowserTools()
+    raise ValueError(f"Unknown browser backend {backend!r}, expected one of {', '.join(BROWSER_BACKENDS)}")
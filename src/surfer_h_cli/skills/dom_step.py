@@ -0,0 +1,120 @@
+import json
+from datetime import datetime
+
+import openai
+
+from surfer_h_cli.dom_distiller import DomElement, format_elements
+from surfer_h_cli.skills.navigation_models import (
+    DomWebAgentNavigate,
+    DomWebAgentNavigateWithExploration,
+    WebAgentAnswer,
+)
+from surfer_h_cli.skills.navigation_step import EXPLORE_LINKS_GUIDELINE, sample_navigation_response
+
+DOM_NAVIGATION_PROMPT: str = f"""Imagine you are a robot browsing the web, just like humans. Now you need to complete a task.
+In each iteration, you will receive an Observation that includes the list of visible elements of the current web page and the current memory of the agent.
+Each element is listed on one line as: [id] role "label" value="current value" @x,y,widthxheight, with "offscreen" when it is outside of the viewport.
+You have also information about the step that the agent is trying to achieve to solve the task.
+Carefully analyze the elements to identify what to do, then follow the guidelines to choose the following action.
+You should detail your thought (i.e. reasoning steps) before taking the action.
+Also detail in the notes field of the action the extracted information relevant to solve the task.
+Once you have enough information in the notes to answer the task, return an answer action with the detailed answer in the notes field.
+This will be evaluated by an evaluator and should match all the criteria or requirements of the task.
+
+Guidelines:
+- store in the notes all the relevant information to solve the task that fulfill the task criteria. Be precise
+- Use both the task and the step information to decide what to do
+- Designate elements by their id only, without the brackets
+- To write in a field, directly use fill_id on it, it replaces the current value. Don't click before
+- To choose an option of a combobox, use fill_id with the option text
+- Offscreen elements can be used directly, there is no need to scroll to them
+- If a text is cut with "…" and you need all of it, use extract_text
+- If there is a cookies notice, always accept all the cookies first
+- Only refresh if you identify a rate limit problem
+- Never try to login, enter email or password unless the task explicitly gives them.
+
+- if you have enough information in the elements and in the notes to answer the task, return an answer action with the detailed answer in the notes field
+- The current date is {datetime.today().strftime("%A, %B %-d, %Y")}."""
+
+
+def dom_navigation_request(
+    task: str,
+    previous_actions: str,
+    step: str,
+    notes: str,
+    force_answer: bool,
+    elements: list[DomElement],
+    model: str,
+    temperature: float = 0.7,
+    explore_links: int = 0,
+) -> dict:
+    navigate_model = DomWebAgentNavigateWithExploration if explore_links > 0 else DomWebAgentNavigate
+    guidelines = DOM_NAVIGATION_PROMPT
+    if explore_links > 0:
+        guidelines += EXPLORE_LINKS_GUIDELINE.format(max_links=explore_links)
+    if force_answer:
+        response_format = WebAgentAnswer.get_json_schema()
+    else:
+        response_format = navigate_model.get_json_schema()
+
+    messages = [
+        {
+            "role": "system",
+            "content": json.dumps(
+                {
+                    "guidelines": guidelines,
+                    "answer_format": navigate_model.get_only_properties_schema(),
+                }
+            ),
+        },
+        {
+            "role": "user",
+            "content": json.dumps(
+                {
+                    "task": task,
+                    "previous_actions": previous_actions,
+                    "step": step,
+                    "notes": notes,
+                },
+                separators=(",", ":"),
+            )
+            + "\nPage elements:\n"
+            + format_elements(elements),
+        },
+    ]
+
+    return {
+        "messages": messages,
+        "model": model,
+        "temperature": temperature,
+        "response_format": response_format,
+    }
+
+
+def dom_navigation_step(
+    task: str,
+    previous_actions: str,
+    step: str,
+    notes: str,
+    force_answer: bool,
+    elements: list[DomElement],
+    openai_client_navigation: openai.OpenAI,
+    navigator_model_name: str,
+    temperature_navigation: float = 0.7,
+    explore_links: int = 0,
+    n_samples: int = 1,
+) -> dict:
+    """Text-only navigation step: the element ids in the returned action need no localization. The action is
+    sampled `n_samples` times with a majority vote."""
+    openai_request = dom_navigation_request(
+        task=task,
+        previous_actions=previous_actions,
+        step=step,
+        notes=notes,
+        force_answer=force_answer,
+        elements=elements,
+        model=navigator_model_name,
+        temperature=temperature_navigation,
+        explore_links=explore_links,
+    )
+    return sample_navigation_response(openai_client_navigation, openai_request, 1 if force_answer else n_samples)
@@ -0,0 +1,146 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import openai
+from PIL import Image
+from pydantic import BaseModel
+
+from surfer_h_cli.dom_distiller import resolve_links
+from surfer_h_cli.image_codec import DEFAULT_IMAGE_CODEC, ImageCodec
+from surfer_h_cli.simple_browser import PageCapture
+from surfer_h_cli.skills.navigation_models import StructuredOutput
+from surfer_h_cli.skills.navigation_step import image_content, parse_navigation_response
+from surfer_h_cli.utils import smart_resize
+
+LINK_SUMMARY_PROMPT = """You are helping a web agent that is comparing several pages to complete a task.
+You receive one of these pages: its URL, title, the beginning of its text and a screenshot of its top.
+Summarize the information of this page relevant to the task and to what the agent is looking for. Be precise: keep
+names, numbers, prices and dates. Then rate how useful the page is to complete the task, from 0 (useless) to 10
+(has everything needed)."""
+
+
+class LinkSummary(StructuredOutput):
+    """Summary of a linked page for the Web navigation agent."""
+
+    summary: str
+    """Information of the page relevant to the task"""
+    relevance: int
+    """How useful the page is to complete the task, from 0 to 10"""
+
+
+class ExploredLink(BaseModel):
+    link: str
+    """The link as designated by the agent"""
+    url: str
+    title: str = ""
+    summary: str = ""
+    relevance: int = 0
+    error: str | None = None
+
+
+def link_summary_request(
+    task: str,
+    looking_for: str,
+    page: PageCapture,
+    model: str,
+    temperature: float = 0.0,
+    image_codec: ImageCodec = DEFAULT_IMAGE_CODEC,
+) -> dict:
+    page_info = {"task": task, "looking_for": looking_for, "url": page.url, "title": page.title, "text": page.text}
+    user_content = [{"type": "text", "text": json.dumps(page_info, separators=(",", ":"))}]
+    if page.screenshot is not None:
+        height, width = smart_resize(page.screenshot.height, page.screenshot.width)
+        image = page.screenshot.resize((width, height), resample=Image.Resampling.LANCZOS).convert("RGB")
+        user_content.append(image_content(image, codec=image_codec))
+    return {
+        "messages": [
+            {"role": "system", "content": LINK_SUMMARY_PROMPT},
+            {"role": "user", "content": user_content},
+        ],
+        "model": model,
+        "temperature": temperature,
+        "response_format": LinkSummary.get_json_schema(),
+    }
+
+
+def summarize_page(
+    task: str,
+    looking_for: str,
+    link: str,
+    page: PageCapture,
+    openai_client: openai.OpenAI,
+    model: str,
+    temperature: float = 0.0,
+    image_codec: ImageCodec = DEFAULT_IMAGE_CODEC,
+) -> ExploredLink:
+    explored = ExploredLink(link=link, url=page.url, title=page.title, error=page.error)
+    if page.error is not None:
+        return explored
+    try:
+        request = link_summary_request(task, looking_for, page, model, temperature, image_codec)
+        summary = LinkSummary.model_validate(
+            parse_navigation_response(openai_client.chat.completions.create(**request))
+        )
+    except Exception as e:
+        explored.error = f"Could not summarize the page: {e}"
+        return explored
+    explored.summary = summary.summary
+    explored.relevance = summary.relevance
+    return explored
+
+
+def explore_links(
+    task: str,
+    links: list[str],
+    looking_for: str,
+    browser,
+    openai_client: openai.OpenAI,
+    model: str,
+    max_links: int,
+    temperature: float = 0.0,
+    image_codec: ImageCodec = DEFAULT_IMAGE_CODEC,
+) -> list[ExploredLink]:
+    """Open up to `max_links` links of the current page in background tabs and summarize each page, all pages and
+    model calls at the same time. The current page is left as it is.
+
+    Returns the explored links, most relevant first, links that could not be opened or summarized last.
+    """
+    resolved = [link for link in resolve_links(browser, links) if link.get("url")]
+    urls: dict[str, str] = {}
+    for link in resolved:
+        urls.setdefault(link["url"], link["query"])
+    urls = dict(list(urls.items())[:max_links])
+    if not urls:
+        return []
+
+    pages = browser.capture_pages(list(urls))
+    with ThreadPoolExecutor(max_workers=len(pages)) as executor:
+        explored = list(
+            executor.map(
+                lambda link_and_page: summarize_page(
+                    task,
+                    looking_for,
+                    link_and_page[0],
+                    link_and_page[1],
+                    openai_client,
+                    model,
+                    temperature,
+                    image_codec,
+                ),
+                zip(urls.values(), pages),
+            )
+        )
+    return sorted(explored, key=lambda link: (link.error is not None, -link.relevance))
+
+
+def format_explored_links(explored: list[ExploredLink], links: list[str]) -> str:
+    """Notes on the explored pages, for the agent"""
+    if not explored:
+        return f"explore_links found none of {links} on the page"
+    lines = ["Explored links, most relevant first:"]
+    for link in explored:
+        if link.error is not None:
+            lines.append(f"- {link.link} ({link.url}): {link.error}")
+        else:
+            lines.append(f"- {link.link} ({link.url}), relevance {link.relevance}/10: {link.summary}")
+    return "\n".join(lines)
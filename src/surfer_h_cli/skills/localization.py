@@ -1,10 +1,9 @@
-import base64
-import io
 import re
 
 import openai
 from PIL import Image
 
+from surfer_h_cli.image_codec import DEFAULT_IMAGE_CODEC, ImageCodec
 from surfer_h_cli.utils import smart_resize
 
 LOCALIZATION_PROMPT: str = """You are a precise UI element localization assistant. Your task is to find the exact click coordinates for a specific element in the screenshot.
@@ -31,13 +30,19 @@ Do NOT include any other text, explanations, or descriptions. ONLY output: Click
 ELEMENT TO FIND: {component}"""
 
 
-def localization_request(image: Image.Image, element_name: str, model: str, temperature: float = 0.0) -> dict:
+def localization_request(
+    image: Image.Image,
+    element_name: str,
+    model: str,
+    temperature: float = 0.0,
+    image_codec: ImageCodec = DEFAULT_IMAGE_CODEC,
+) -> dict:
     """Creates a localization prompt to send to an openai-compatible LLM."""
 
     # create prompt text
     localization_prompt = LOCALIZATION_PROMPT.format(component=element_name)
 
-    # convert image to JPEG saved as base64
+    # convert image to a base64 data URL
     width, height = image.size
     new_height, new_width = smart_resize(
         height,
@@ -47,9 +52,7 @@ def localization_request(image: Image.Image, element_name: str, model: str, temp
         max_pixels=1280 * 28 * 28,  # n_pixel * patch size * patch size
     )
     image = image.resize((new_width, new_height), resample=Image.Resampling.LANCZOS).convert("RGB")
-    image_bytes = io.BytesIO()
-    image.save(image_bytes, format="JPEG", quality=90)
-    image_base64 = base64.b64encode(image_bytes.getvalue()).decode("utf-8")
+    image_url = image_codec.to_data_url(image)
     # create openai request
     openai_request = {
         "messages": [
@@ -57,7 +60,7 @@ def localization_request(image: Image.Image, element_name: str, model: str, temp
                 "content": [
                     {
                         "type": "image_url",
-                        "image_url": {"detail": "auto", "url": f"data:image/jpeg;base64,{image_base64}"},
+                        "image_url": {"detail": "auto", "url": image_url},
                     },
                     {"type": "text", "text": localization_prompt},
                 ],
@@ -123,8 +126,15 @@ def parse_localization_response(completion, image: Image.Image):
 
 
 def localize_element(
-    image: Image.Image, element_name: str, openai_client: openai.OpenAI, model: str, temperature: float = 0.0
+    image: Image.Image,
+    element_name: str,
+    openai_client: openai.OpenAI,
+    model: str,
+    temperature: float = 0.0,
+    image_codec: ImageCodec = DEFAULT_IMAGE_CODEC,
 ) -> tuple[float, float]:
-    prompt = localization_request(image=image, element_name=element_name, model=model, temperature=temperature)
+    prompt = localization_request(
+        image=image, element_name=element_name, model=model, temperature=temperature, image_codec=image_codec
+    )
     response = openai_client.chat.completions.create(**prompt)
     return parse_localization_response(response, image)
\ No newline at end of file
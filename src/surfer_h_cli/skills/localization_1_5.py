@@ -1,11 +1,11 @@
-import base64
-import io
 from typing import Literal
 
 import openai
 from PIL import Image
 from pydantic import BaseModel, Field
 
+from surfer_h_cli.image_codec import DEFAULT_IMAGE_CODEC, ImageCodec
+
 
 class ClickAbsoluteAction(BaseModel):
     """Click at absolute coordinates."""
@@ -66,7 +66,13 @@ def resize_image_for_localization(image: Image.Image, target_size: tuple[int, in
     return result
 
 
-def localization_request(image: Image.Image, element_name: str, model: str, temperature: float = 0.0) -> dict:
+def localization_request(
+    image: Image.Image,
+    element_name: str,
+    model: str,
+    temperature: float = 0.0,
+    image_codec: ImageCodec = DEFAULT_IMAGE_CODEC,
+) -> dict:
     """Creates a localization request with structured JSON output."""
     
     # Resize image using simple resize instead of smart_resize
@@ -75,10 +81,8 @@ def localization_request(image: Image.Image, element_name: str, model: str, temp
     # Create prompt text
     localization_prompt = create_localization_prompt(element_name)
     
-    # Convert image to JPEG saved as base64
-    image_bytes = io.BytesIO()
-    resized_image.save(image_bytes, format="JPEG", quality=90)
-    image_base64 = base64.b64encode(image_bytes.getvalue()).decode("utf-8")
+    # Convert image to a base64 data URL
+    image_url = image_codec.to_data_url(resized_image)
     
     # Create openai request with structured output
     openai_request = {
@@ -87,7 +91,7 @@ def localization_request(image: Image.Image, element_name: str, model: str, temp
                 "content": [
                     {
                         "type": "image_url",
-                        "image_url": {"detail": "auto", "url": f"data:image/jpeg;base64,{image_base64}"},
+                        "image_url": {"detail": "auto", "url": image_url},
                     },
                     {"type": "text", "text": localization_prompt},
                 ],
@@ -152,7 +156,12 @@ def parse_localization_response(completion, original_image: Image.Image, resized
 
 
 def localize_element(
-    image: Image.Image, element_name: str, openai_client: openai.OpenAI, model: str, temperature: float = 0.0
+    image: Image.Image,
+    element_name: str,
+    openai_client: openai.OpenAI,
+    model: str,
+    temperature: float = 0.0,
+    image_codec: ImageCodec = DEFAULT_IMAGE_CODEC,
 ) -> tuple[int, int]:
     """Localizes an element and returns coordinates in the original image dimensions."""
     
@@ -160,7 +169,9 @@ def localize_element(
     resized_image = resize_image_for_localization(image)
     
     # Create the request
-    request_data = localization_request(image=image, element_name=element_name, model=model, temperature=temperature)
+    request_data = localization_request(
+        image=image, element_name=element_name, model=model, temperature=temperature, image_codec=image_codec
+    )
     
     # Get response from OpenAI
     response = openai_client.chat.completions.create(**request_data)
@@ -170,10 +181,15 @@ def localize_element(
 
 
 def localize_element_structured(
-    image: Image.Image, element_name: str, openai_client: openai.OpenAI, model: str, temperature: float = 0.0
+    image: Image.Image,
+    element_name: str,
+    openai_client: openai.OpenAI,
+    model: str,
+    temperature: float = 0.0,
+    image_codec: ImageCodec = DEFAULT_IMAGE_CODEC,
 ) -> ClickAbsoluteAction:
     """Localizes an element and returns the structured ClickAbsoluteAction with original image coordinates."""
     
-    coordinates = localize_element(image, element_name, openai_client, model, temperature)
+    coordinates = localize_element(image, element_name, openai_client, model, temperature, image_codec)
     
     return ClickAbsoluteAction(x=coordinates[0], y=coordinates[1])
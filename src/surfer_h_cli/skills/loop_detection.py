@@ -0,0 +1,88 @@
+import json
+
+from PIL import Image
+from pydantic import BaseModel
+
+from surfer_h_cli.frame_dedup import describe_action
+from surfer_h_cli.utils import hamming_distance, image_dhash
+
+# Coordinates come from the localization model and vary slightly between identical clicks
+IGNORED_ACTION_FIELDS = ("x", "y")
+
+
+class ObservedStep(BaseModel):
+    action_key: str
+    action: dict
+    url: str
+    frame_hash: int
+    """dhash of the screenshot the action was taken on"""
+
+
+class LoopDetection(BaseModel):
+    cycle_length: int
+    repeats: int
+    actions: list[str]
+    """Description of the actions of one cycle"""
+
+    @property
+    def description(self) -> str:
+        return f"{' then '.join(self.actions)} repeated {self.repeats} times without progress"
+
+
+class LoopDetector:
+    """Recognizes when the agent keeps taking the same actions on the same pages.
+
+    A loop is a cycle of 1 to `max_cycle_length` steps repeated `min_repeats` times in a row, where repeated steps
+    take the same action on the same URL with screenshots whose hashes are within `max_hash_distance`: scrolling
+    past the end, clicking an unresponsive element, alternating between two pages. Every detection raises the
+    escalation level, and the history is cleared so that the next one needs a full new cycle.
+    """
+
+    def __init__(self, min_repeats: int = 3, max_cycle_length: int = 3, max_hash_distance: int = 4):
+        self.min_repeats = min_repeats
+        self.max_cycle_length = max_cycle_length
+        self.max_hash_distance = max_hash_distance
+        self.history: list[ObservedStep] = []
+        self.level = 0
+
+    @staticmethod
+    def action_key(action: dict) -> str:
+        return json.dumps({k: v for k, v in action.items() if k not in IGNORED_ACTION_FIELDS}, sort_keys=True)
+
+    def observe(self, action: dict, url: str, frame: Image.Image):
+        """Record an action and the page it is taken on."""
+        self.history.append(
+            ObservedStep(action_key=self.action_key(action), action=action, url=url, frame_hash=image_dhash(frame))
+        )
+
+    def _same(self, step_a: ObservedStep, step_b: ObservedStep) -> bool:
+        return (
+            step_a.action_key == step_b.action_key
+            and step_a.url == step_b.url
+            and hamming_distance(step_a.frame_hash, step_b.frame_hash) <= self.max_hash_distance
+        )
+
+    def detect(self) -> LoopDetection | None:
+        """Return the loop the last steps form, if any, and escalate."""
+        for cycle_length in range(1, self.max_cycle_length + 1):
+            n_steps = cycle_length * self.min_repeats
+            if len(self.history) < n_steps:
+                break
+            window = self.history[-n_steps:]
+            if all(self._same(window[i], window[i - cycle_length]) for i in range(cycle_length, n_steps)):
+                detection = LoopDetection(
+                    cycle_length=cycle_length,
+                    repeats=self.min_repeats,
+                    actions=[describe_action(step.action) for step in window[-cycle_length:]],
+                )
+                self.history.clear()
+                self.level += 1
+                return detection
+        return None
+
+
+def loop_hint(detection: LoopDetection) -> str:
+    return (
+        f"Warning: {detection.description}. This is not working: do something different, e.g. use another element, "
+        "go back, search instead of browsing, or answer with the information already in the notes."
+    )
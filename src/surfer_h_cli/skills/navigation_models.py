@@ -115,6 +115,17 @@ class AnswerAction(BaseAction):
     """The answer content"""
 
 
+class ExploreLinksAction(BaseAction):
+    """Open several links of the page at once, e.g. search results to compare, and add a summary of each linked page
+    to the notes. The most relevant page is opened afterwards."""
+
+    action: Literal["explore_links"] = "explore_links"
+    links: list[str]
+    """Text of each link to explore as displayed, or its id in the element list, most promising first"""
+    looking_for: str
+    """What to look for on the linked pages"""
+
+
 WebAgentNavigateAction = (
     AbsClickElementAction
     | AbsWriteElementAction
@@ -127,6 +138,45 @@ WebAgentNavigateAction = (
 )
 
 
+class ClickIdAction(BaseAction):
+    """Click on a page element identified by its id in the element list."""
+
+    action: Literal["click_id"] = "click_id"
+    element_id: str
+    """id of the element, without brackets"""
+
+
+class FillIdAction(BaseAction):
+    """Replace the value of a text field, select or editable element identified by its id. Don't Enter at the end."""
+
+    action: Literal["fill_id"] = "fill_id"
+    element_id: str
+    """id of the element, without brackets"""
+    content: str
+    """Content to write, or the option to choose for a select"""
+
+
+class ExtractTextAction(BaseAction):
+    """Read the full text of an element identified by its id, it is added to the notes."""
+
+    action: Literal["extract_text"] = "extract_text"
+    element_id: str
+    """id of the element, without brackets"""
+
+
+DomWebAgentNavigateAction = (
+    ClickIdAction
+    | FillIdAction
+    | ExtractTextAction
+    | ScrollAction
+    | GoBackAction
+    | RefreshAction
+    | WaitAction
+    | RestartAction
+    | AnswerAction
+)
+
+
 class AbsWebAgentNavigate(StructuredOutput):
     """Output of the Web navigation agent."""
 
@@ -138,6 +188,31 @@ class AbsWebAgentNavigate(StructuredOutput):
     """The action to perform"""
 
 
+class DomWebAgentNavigate(StructuredOutput):
+    """Output of the DOM-based Web navigation agent."""
+
+    thought: str = ""
+    """Brief thoughts, summarizing the reasoning steps that will help answer the task."""
+    notes: str = ""
+    """Information extracted from the page elements relevant to the task"""
+    action: DomWebAgentNavigateAction
+    """The action to perform"""
+
+
+class AbsWebAgentNavigateWithExploration(AbsWebAgentNavigate):
+    """Output of the Web navigation agent, which can explore several links at once."""
+
+    action: WebAgentNavigateAction | ExploreLinksAction
+    """The action to perform"""
+
+
+class DomWebAgentNavigateWithExploration(DomWebAgentNavigate):
+    """Output of the DOM-based Web navigation agent, which can explore several links at once."""
+
+    action: DomWebAgentNavigateAction | ExploreLinksAction
+    """The action to perform"""
+
+
 class NavigationState(BaseModel):
     task: str = Field(description="The task to solve")
     previous_actions: str = Field(description="The previous actions taken by the agent")
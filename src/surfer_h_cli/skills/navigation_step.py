@@ -1,14 +1,21 @@
 import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Literal
+from typing import Callable
 
 import openai
 from PIL import Image
 
+from surfer_h_cli.image_codec import DEFAULT_IMAGE_CODEC, ImageCodec
 from surfer_h_cli.skills.localization import localize_element as localize_element_old
 from surfer_h_cli.skills.localization_1_5 import localize_element_structured
-from surfer_h_cli.skills.navigation_models import AbsWebAgentNavigate, NavigationState, WebAgentAnswer
-from surfer_h_cli.utils import image_to_b64, smart_resize
+from surfer_h_cli.skills.navigation_models import (
+    AbsWebAgentNavigate,
+    AbsWebAgentNavigateWithExploration,
+    NavigationState,
+    WebAgentAnswer,
+)
+from surfer_h_cli.utils import smart_resize
 
 NAVIGATION_PROMPT: str = f"""Imagine you are a robot browsing the web, just like humans. Now you need to complete a task.
 In each iteration, you will receive an Observation that includes the last  screenshots of a web browser and the current memory of the agent.
@@ -25,6 +32,7 @@ Guidelines:
 - if you want to write in a text field and the text field already has text, designate the text field by the text it contains and its type
 - If there is a cookies notice, always accept all the cookies first
 - The observation is the screenshot of the current page and the memory of the agent.
+- Screenshots identical to the next one are left out and listed in screenshot_notes: the action that followed them had no visible effect.
 - If you see relevant information on the screenshot to answer the task, add it to the notes field of the action.
 - If there is no relevant information on the screenshot to answer the task, add an empty string to the notes field of the action.
 - If you see buttons that allow to navigate directly to relevant information, like jump to ... or go to ... , use them to navigate faster.
@@ -43,6 +51,10 @@ Guidelines:
 - The current date is {datetime.today().strftime("%A, %B %-d, %Y")}."""
 
 
+EXPLORE_LINKS_GUIDELINE = """
+- To compare several results or candidate pages, explore up to {max_links} of their links at once with explore_links instead of visiting them one by one."""
+
+
 def response_format_json_schema(json_schema: dict, name: str, description: str = "", strict: bool = True) -> dict:
     return {
         "type": "json_schema",
@@ -55,9 +67,8 @@ def response_format_json_schema(json_schema: dict, name: str, description: str =
     }
 
 
-def image_content(image: Image.Image, format: Literal["jpeg", "png"] = "jpeg") -> dict:
-    image_base64 = image_to_b64(image, format)
-    return {"type": "image_url", "image_url": {"detail": "auto", "url": f"data:image/{format};base64,{image_base64}"}}
+def image_content(image: Image.Image, codec: ImageCodec = DEFAULT_IMAGE_CODEC) -> dict:
+    return {"type": "image_url", "image_url": {"detail": "auto", "url": codec.to_data_url(image)}}
 
 
 def navigation_request(
@@ -69,36 +80,38 @@ def navigation_request(
     screenshots: list[Image.Image],
     model: str,
     use_smart_resize: bool = True,
-    image_format: Literal["jpeg", "png"] = "jpeg",
+    image_codec: ImageCodec = DEFAULT_IMAGE_CODEC,
     temperature: float = 0.7,
+    frame_notes: list[str] | None = None,
+    explore_links: int = 0,
 ) -> dict:
+    """`explore_links` is the maximum number of links the explore_links action can open, 0 leaves the action out."""
+    navigate_model = AbsWebAgentNavigateWithExploration if explore_links > 0 else AbsWebAgentNavigate
+    guidelines = NAVIGATION_PROMPT
+    if explore_links > 0:
+        guidelines += EXPLORE_LINKS_GUIDELINE.format(max_links=explore_links)
     messages = [
         {
             "role": "system",
             "content": json.dumps(
                 {
-                    "guidelines": NAVIGATION_PROMPT,
+                    "guidelines": guidelines,
                     "state_format": NavigationState.model_json_schema(),
-                    "answer_format": AbsWebAgentNavigate.get_only_properties_schema(),
+                    "answer_format": navigate_model.get_only_properties_schema(),
                 }
             ),
         },
     ]
 
-    user_content = [
-        {
-            "type": "text",
-            "text": json.dumps(
-                {
-                    "task": task,
-                    "previous_actions": previous_actions,
-                    "step": step,
-                    "notes": notes,
-                },
-                separators=(",", ":"),
-            ),
-        },
-    ]
+    observation = {
+        "task": task,
+        "previous_actions": previous_actions,
+        "step": step,
+        "notes": notes,
+    }
+    if frame_notes:
+        observation["screenshot_notes"] = frame_notes
+    user_content = [{"type": "text", "text": json.dumps(observation, separators=(",", ":"))}]
 
     if use_smart_resize:
         images = []
@@ -108,13 +121,13 @@ def navigation_request(
     else:
         images = screenshots
 
-    user_content.extend([image_content(image, format=image_format) for image in images])
+    user_content.extend([image_content(image, codec=image_codec) for image in images])
     messages.append({"role": "user", "content": user_content})  # type: ignore
 
     if force_answer:
         response_format = WebAgentAnswer.get_json_schema()
     else:
-        response_format = AbsWebAgentNavigate.get_json_schema()
+        response_format = navigate_model.get_json_schema()
     openai_request = {
         "messages": messages,
         "model": model,
@@ -130,12 +143,88 @@ def parse_navigation_response(response: openai.types.chat.ChatCompletion) -> dic
     return json.loads(content)
 
 
+# Fields two sampled actions must agree on to count as the same vote, besides their localized coordinates: the
+# action type and its target. Element descriptions and typed text are worded differently from one sample to the
+# next, they only break ties.
+VOTED_ACTION_FIELDS = ("action", "element_id", "direction", "links")
+VOTE_DISTANCE = 24
+"""Largest distance in pixels, on each axis, between the localized coordinates of two agreeing samples"""
+
+
+def normalized(value) -> str:
+    return " ".join(str(value).lower().split())
+
+
+def same_action(a: dict, b: dict) -> bool:
+    if a.get("action") == "answer" or b.get("action") == "answer":
+        # Two answers are never worded the same
+        return a.get("action") == b.get("action")
+    if any(normalized(a.get(name)) != normalized(b.get(name)) for name in VOTED_ACTION_FIELDS):
+        return False
+    if "x" in a and "x" in b:
+        return abs(a["x"] - b["x"]) <= VOTE_DISTANCE and abs(a["y"] - b["y"]) <= VOTE_DISTANCE
+    return True
+
+
+def same_text(a: dict, b: dict) -> bool:
+    return a.get("action") == b.get("action") and all(
+        normalized(a.get(name)) == normalized(b.get(name)) for name in ("element", "content")
+    )
+
+
+def sample_navigation_response(
+    openai_client: openai.OpenAI,
+    openai_request: dict,
+    n_samples: int = 1,
+    localize: Callable[[str], tuple[int, int]] | None = None,
+) -> dict:
+    """Send the navigation request `n_samples` times concurrently and return the response whose action most samples
+    agree on, then most samples describe alike, then the earliest. With `localize`, the element of each sampled
+    click_element or write_element action is localized first, and votes compare where the actions land. Failed
+    samples are left out, unless all of them fail."""
+
+    def sample() -> dict:
+        response = parse_navigation_response(openai_client.chat.completions.create(**openai_request))
+        action = response["action"]
+        if localize is not None and action["action"] in ("click_element", "write_element"):
+            action["x"], action["y"] = localize(action["element"])
+        return response
+
+    if n_samples <= 1:
+        return sample()
+
+    with ThreadPoolExecutor(max_workers=n_samples) as executor:
+        futures = [executor.submit(sample) for _ in range(n_samples)]
+    responses, errors = [], []
+    for future in futures:
+        try:
+            responses.append(future.result())
+        except Exception as e:
+            errors.append(e)
+    if not responses:
+        raise errors[0]
+
+    actions = [response["action"] for response in responses]
+    scores = [
+        (
+            sum(same_action(action, other) for other in actions),
+            sum(same_text(action, other) for other in actions),
+            -i,
+        )
+        for i, action in enumerate(actions)
+    ]
+    best = max(range(len(responses)), key=lambda i: scores[i])
+    print(f"🗳️  {scores[best][0]}/{len(responses)} navigation samples agree on {json.dumps(actions[best])}")
+    return responses[best]
+
+
 def localize_element_by_model(
     image: Image.Image,
     element_name: str,
     openai_client: openai.OpenAI,
     model: str,
     temperature: float = 0.0,
+    image_codec: ImageCodec = DEFAULT_IMAGE_CODEC,
 ) -> tuple[int, int]:
     """Localizes an element using the appropriate method based on the model."""
     if model.startswith("holo1-5"):
@@ -146,6 +235,7 @@ def localize_element_by_model(
             openai_client=openai_client,
             model=model,
             temperature=temperature,
+            image_codec=image_codec,
         )
         return (click_action.x, click_action.y)
     else:
@@ -156,6 +246,7 @@ def localize_element_by_model(
             openai_client=openai_client,
             model=model,
             temperature=temperature,
+            image_codec=image_codec,
         )
         return (int(coords[0]), int(coords[1]))
 
@@ -173,7 +264,14 @@ def navigation_step(
     localization_openai_client: openai.OpenAI,
     temperature_navigation: float = 0.7,
     temperature_localization: float = 0.0,
+    navigation_image_codec: ImageCodec = DEFAULT_IMAGE_CODEC,
+    localization_image_codec: ImageCodec = DEFAULT_IMAGE_CODEC,
+    frame_notes: list[str] | None = None,
+    explore_links: int = 0,
+    n_samples: int = 1,
 ):
+    """One navigation step: the navigation model picks the action, sampled `n_samples` times with a majority vote,
+    and the localization model finds the element each sample acts on."""
     openai_request = navigation_request(
         task=task,
         previous_actions=previous_actions,
@@ -182,34 +280,22 @@ def navigation_step(
         force_answer=force_answer,
         screenshots=screenshots,
         model=navigator_model_name,
+        image_codec=navigation_image_codec,
         temperature=temperature_navigation,
+        frame_notes=frame_notes,
+        explore_links=explore_links,
     )
-    response = openai_client_navigation.chat.completions.create(**openai_request)
-    parsed_response = parse_navigation_response(response)
-
-    action = parsed_response["action"]
-    if action["action"] == "click_element":
-        element = action["element"]
-        x, y = localize_element_by_model(
+    # A forced answer is not worth sampling. Each sampled action is localized, so that votes compare where they land
+    return sample_navigation_response(
+        openai_client_navigation,
+        openai_request,
+        1 if force_answer else n_samples,
+        localize=lambda element: localize_element_by_model(
             image=screenshots[-1],
             element_name=element,
             openai_client=localization_openai_client,
             model=localizer_model_name,
             temperature=temperature_localization,
-        )
-        action["x"] = x
-        action["y"] = y
-
-    elif action["action"] == "write_element":
-        element = action["element"]
-        x, y = localize_element_by_model(
-            image=screenshots[-1],
-            element_name=element,
-            openai_client=localization_openai_client,
-            model=localizer_model_name,
-            temperature=temperature_localization,
-        )
-        action["x"] = x
-        action["y"] = y
-
-    return parsed_response
+            image_codec=localization_image_codec,
+        ),
+    )
@@ -33,10 +33,12 @@ def build_validation_messages(task: str, answer: str, screenshots: list[str]) ->
     ]
 
     for image_b64 in screenshots:
+        # Screenshots are either data URLs or bare base64 PNGs
+        image_url = image_b64 if image_b64.startswith("data:") else f"data:image/png;base64,{image_b64}"
         user_content.append(
             {
                 "type": "image_url",
-                "image_url": {"detail": "auto", "url": f"data:image/png;base64,{image_b64}"},
+                "image_url": {"detail": "auto", "url": image_url},
             }
         )
 
@@ -3,16 +3,37 @@ import copy
 import os
 import threading
 import time
+import uuid
+from pathlib import Path
 from typing import Callable, Literal
 
 from openai import OpenAI
 from PIL import Image
 from pydantic import BaseModel, ConfigDict, Field
 
-from surfer_h_cli.simple_browser import SimpleWebBrowserTools
+from surfer_h_cli.browser_profiles import BrowserProfileStore
+from surfer_h_cli.caching_proxy import CachingProxy
+from surfer_h_cli.checkpoint import AgentCheckpoint, CheckpointStore
+from surfer_h_cli.dom_distiller import act_on_element, distill_page, is_form_like_page
+from surfer_h_cli.frame_dedup import select_navigation_frames
+from surfer_h_cli.hedging import HedgingPolicy, hedge_client, hedging_stats
+from surfer_h_cli.image_codec import DEFAULT_IMAGE_CODEC, ImageCodec
+from surfer_h_cli.macros import Macro, MacroStep, MacroStore
+from surfer_h_cli.network_blocking import (
+    BLOCKLISTS,
+    DEFAULT_BLOCKLISTS,
+    RESOURCE_TYPES,
+    NetworkBlocking,
+    describe_blocked,
+)
+from surfer_h_cli.record_replay import NetworkArchive, network_archive_dir, record_replay_client
+from surfer_h_cli.simple_browser import BROWSER_BACKENDS, BROWSER_ERRORS, SimpleWebBrowserTools, create_browser
+from surfer_h_cli.skills.dom_step import dom_navigation_step
+from surfer_h_cli.skills.link_exploration import explore_links, format_explored_links
+from surfer_h_cli.skills.loop_detection import LoopDetector, loop_hint
 from surfer_h_cli.skills.navigation_step import navigation_step
 from surfer_h_cli.skills.validation import validate_web_voyager_answer
-from surfer_h_cli.utils import image_to_b64
+from surfer_h_cli.utils import hamming_distance, image_dhash
 
 MESSAGE_TEMPLATES = {
     "thought": "🧠  Thought : {message}",
@@ -81,23 +102,49 @@ def write_message(
         _event_callback(type, str(message), get_current_state())
 
 
-def execute_navigation_action(navigation_action: dict, browser: SimpleWebBrowserTools, refresh_url: str):
-    action = navigation_action["action"]
+AgentMode = Literal["screenshot", "dom", "hybrid"]
+
+ACTION_SETTLE_SECONDS = 2.0
+"""Longest wait for the page to settle after an action"""
+
+# Actions on distilled elements, and the in-page routine each one runs
+DOM_ELEMENT_ACTIONS = {"click_id": "click", "fill_id": "fill", "extract_text": "extract"}
+
 
-    if action == "click_element":
-        previous_tabs = browser.get_tabs()
+def execute_navigation_action(
+    navigation_action: dict, browser: SimpleWebBrowserTools, refresh_url: str
+) -> str | None:
+    """Execute an action in the browser.
+
+    Returns feedback for the notes of the agent: the text read by extract_text, why an action on a DOM element or a
+    write failed, or that a scroll had no effect. None for the other actions.
+    """
+    action = navigation_action["action"]
+    feedback = None
+
+    if action in DOM_ELEMENT_ACTIONS:
+        element_id = navigation_action["element_id"]
+        dom_action = DOM_ELEMENT_ACTIONS[action]
+        outcome = act_on_element(browser, element_id, dom_action, navigation_action.get("content"))
+        if not outcome.get("ok"):
+            feedback = f"Action {action} on [{element_id}] failed: {outcome.get('error')}"
+        elif action == "extract_text":
+            feedback = f"Text of [{element_id}]: {outcome.get('text')}"
+    elif action == "click_element":
+        # click_at focuses the tab the click opened, if any
         browser.click_at(navigation_action["x"], navigation_action["y"])
-        new_tabs = browser.get_tabs()
-        if len(new_tabs) > len(previous_tabs):
-            browser.focus_tab(browser.find_newer_tab(previous_tabs, new_tabs).index)
     elif action == "write_element":
-        # Click on the element first to focus it
+        # Click on the element first to focus it, the click focuses synchronously
         browser.click_at(navigation_action["x"], navigation_action["y"])
-        time.sleep(0.5)
-        browser.write(navigation_action["content"], n_backspaces=100)
-        time.sleep(0.5)
+        outcome = browser.write(navigation_action["content"])
+        if not outcome.get("ok"):
+            feedback = f"Could not write in {navigation_action['element']}: {outcome.get('error')}"
+        elif not outcome.get("verified"):
+            feedback = f"{navigation_action['element']} contains {outcome.get('value')!r} after writing in it"
     elif action == "scroll":
-        browser.scroll(navigation_action["direction"])
+        outcome = browser.scroll(navigation_action["direction"])
+        if not outcome.get("moved"):
+            feedback = f"Scrolling {navigation_action['direction']} had no effect, the page is already at its end"
     elif action == "go_back":
         browser.goback()
     elif action == "refresh":
@@ -106,11 +153,19 @@ def execute_navigation_action(navigation_action: dict, browser: SimpleWebBrowser
         pass
     elif action == "restart":
         browser.goto(refresh_url)
+    elif action == "explore_links":
+        # The links were explored beforehand, the most relevant one is opened
+        if navigation_action.get("url"):
+            browser.goto(navigation_action["url"])
     else:
         raise ValueError(f"Unknown action: {action}")
 
-    # wait after any browser action
-    time.sleep(2)
+    # wait after any browser action, until the network is idle when the browser can tell
+    if hasattr(browser, "wait_for_network_idle"):
+        browser.wait_for_network_idle(timeout=ACTION_SETTLE_SECONDS)
+    else:
+        time.sleep(ACTION_SETTLE_SECONDS)
+    return feedback
 
 
 def update_state(current_state: AgentState, navigation_response: dict, browser: SimpleWebBrowserTools) -> AgentState:
@@ -126,6 +181,114 @@ def update_state(current_state: AgentState, navigation_response: dict, browser:
     return new_state
 
 
+def restore_state(checkpoint: AgentCheckpoint, frames: list[Image.Image], browser: SimpleWebBrowserTools) -> AgentState:
+    """Rebuild the agent state from a checkpoint, with the browser already on the checkpoint's page."""
+    # The page was reloaded: the checkpointed frame of the current step shows what it looked like before, with its
+    # typed values and scroll position, the next step acts on the page as it is now
+    frames = [*frames[:-1], browser.screenshot()]
+    state = AgentState(
+        task=checkpoint.task,
+        trajectory_id=checkpoint.trajectory_id,
+        timestep=checkpoint.timestep,
+        url=checkpoint.url,
+        screenshots=frames,
+        notes=f"{checkpoint.notes}\nThe run was resumed and the page reloaded: typed values and scrolling are lost.",
+        navigation_actions=checkpoint.navigation_actions,
+        current_step=checkpoint.current_step,
+    )
+    set_current_state(state)
+    return state
+
+
+def recover_browser(browser: SimpleWebBrowserTools, url: str):
+    """Reopen a crashed or unresponsive browser and go back to where the agent was."""
+    browser.restart()
+    browser.goto(url)
+    time.sleep(2)
+
+
+def macro_step(navigation_action: dict, state: AgentState) -> MacroStep:
+    """Record an action together with the page it is about to be taken on."""
+    return MacroStep(action=navigation_action, url=state.url, frame_hash=f"{image_dhash(state.screenshots[-1]):016x}")
+
+
+def replay_macro(
+    macro: Macro,
+    params: list[str],
+    browser: SimpleWebBrowserTools,
+    refresh_url: str,
+    current_state: AgentState,
+    similarity_threshold: int,
+) -> tuple[AgentState, list[MacroStep]]:
+    """Re-execute a recorded macro for as long as the page matches the recording.
+
+    Replay stops at the first step whose screenshot diverges from the recorded one, or on a browser failure after
+    reopening the browser, the model then takes over from there. Returns the resulting state and the steps that
+    were replayed.
+    """
+    write_message(f"Replaying macro recorded on {macro.recorded_at} ({len(macro.steps)} steps)", "announcement")
+    replayed: list[MacroStep] = []
+    actions = macro.step_actions(params)
+    # Element ids only exist once the page is distilled. The recorded run distilled the page before each of its
+    # steps, doing the same gives the elements the same ids.
+    distill = any(action["action"] in DOM_ELEMENT_ACTIONS for action in actions)
+    for i, action in enumerate(actions):
+        distance = hamming_distance(image_dhash(current_state.screenshots[-1]), macro.expected_frame_hash(i))
+        if distance > similarity_threshold:
+            write_message(
+                f"Page diverged from macro at step {i + 1}/{len(macro.steps)} (distance {distance}), "
+                "handing over to the model",
+                "announcement",
+            )
+            return current_state, replayed
+
+        write_message(action, "action")
+        try:
+            if distill:
+                distill_page(browser)
+            execute_navigation_action(action, browser, refresh_url)
+            replay_response = {
+                "thought": f"Replayed macro step {i + 1}/{len(macro.steps)}",
+                "notes": "",
+                "action": action,
+            }
+            step = macro_step(action, current_state)
+            current_state = update_state(current_state, replay_response, browser)
+        except BROWSER_ERRORS as e:
+            write_message(
+                f"Browser failure ({e.__class__.__name__}) at macro step {i + 1}/{len(macro.steps)}, restarting on "
+                f"{current_state.url} and handing over to the model",
+                "announcement",
+            )
+            recover_browser(browser, current_state.url)
+            current_state.screenshots[-1] = browser.screenshot()
+            return current_state, replayed
+        replayed.append(step)
+        write_message(current_state.screenshots[-1], "screenshot")
+
+    distance = hamming_distance(image_dhash(current_state.screenshots[-1]), macro.expected_frame_hash(len(macro.steps)))
+    if distance <= similarity_threshold:
+        write_message("Macro replayed in full", "announcement")
+    else:
+        write_message(f"Final page differs from the recorded one (distance {distance})", "announcement")
+    return current_state, replayed
+
+
+def record_macro(
+    macro_store: MacroStore | None,
+    task: str,
+    url: str,
+    steps: list[MacroStep],
+    current_state: AgentState,
+    n_replays: int,
+):
+    """Save the action sequence of a successful run so the next run of the same task can replay it."""
+    if macro_store is None or not steps:
+        return
+    macro_store.record(task, url, steps, image_dhash(current_state.screenshots[-1]), n_replays=n_replays)
+    write_message(f"Recorded macro of {len(steps)} steps", "announcement")
+
+
 def parse_args():
     """Parse CLI arguments."""
     # browser: SimpleWebBrowserTools,
@@ -139,8 +302,57 @@ def parse_args():
     parser.add_argument("--url", type=str, default="https://www.allrecipes.com", help="webside to start the task from")
     parser.add_argument("--max_n_steps", type=int, default=30, help="Maximum steps the agent can take")
     parser.add_argument("--max_time_seconds", type=int, default=600, help="Maximum time the task can take")
+    parser.add_argument(
+        "--agent_mode",
+        choices=["screenshot", "dom", "hybrid"],
+        default="screenshot",
+        help="Observe pages through screenshots, through the distilled DOM, or through the DOM on form-like pages only",
+    )
     parser.add_argument("--browser_width", type=int, default=1204, help="Width of the browser window")
     parser.add_argument("--browser_height", type=int, default=1204, help="Height of the browser window")
+    parser.add_argument(
+        "--block_lists",
+        nargs="*",
+        choices=list(BLOCKLISTS),
+        default=DEFAULT_BLOCKLISTS,
+        help="Block the requests of these lists in the browser, none when given without a list",
+    )
+    parser.add_argument("--block_url_patterns", nargs="*", default=[], help="More URL patterns to block, e.g. *.gif")
+    parser.add_argument(
+        "--block_resource_types", nargs="*", choices=RESOURCE_TYPES, default=[], help="Resource types to block"
+    )
+    parser.add_argument("--browser_profile", help="Persistent browser profile to use, e.g. one per site")
+    parser.add_argument("--browser_profiles_dir", default="browser_profiles", help="Directory of the browser profiles")
+    parser.add_argument("--browser_profile_max_mb", type=int, default=1024, help="Size cap of a browser profile")
+    parser.add_argument("--browser_profile_template", help="Profile new and reset profiles are copied from")
+    parser.add_argument(
+        "--reset_browser_profile", action="store_true", help="Reset the browser profile to its template first"
+    )
+    parser.add_argument("--caching_proxy", action="store_true", help="Browse through a local caching proxy")
+    parser.add_argument("--proxy_cache_dir", default="proxy_cache", help="Directory of the caching proxy's cache")
+    parser.add_argument("--proxy_cache_mb", type=int, default=2048, help="Size cap of the caching proxy's cache")
+    parser.add_argument(
+        "--proxy_static_ttl_hours", type=float, help="Cache static assets this long whatever their cache headers say"
+    )
+    parser.add_argument(
+        "--hedge_percentile",
+        type=float,
+        help="Duplicate model calls slower than this percentile of recent latencies, e.g. 95. Disabled by default",
+    )
+    parser.add_argument("--hedge_max_ratio", type=float, default=0.1, help="Hedges per request an endpoint may get")
+    parser.add_argument("--hedge_min_samples", type=int, default=20, help="Calls answered before hedging starts")
+    parser.add_argument(
+        "--record_dir", help="Record the run's network traffic and model responses to replay it offline later"
+    )
+    parser.add_argument(
+        "--replay_dir", help="Replay a run recorded with --record_dir, without network access nor model calls"
+    )
+    parser.add_argument(
+        "--browser_backend",
+        choices=BROWSER_BACKENDS,
+        default="selenium",
+        help="Drive Chrome through chromedriver, or over the DevTools protocol directly (needs websockets)",
+    )
     # Navigation model
     parser.add_argument("--model_name_navigation", help="Override MODEL_NAME_NAVIGATION")
     parser.add_argument("--base_url_navigation", help="Override BASE_URL_NAVIGATION")
@@ -149,11 +361,67 @@ def parse_args():
     parser.add_argument(
         "--n_navigation_screenshots", type=int, default=3, help="Maximum screenshots stored in the state"
     )
+    parser.add_argument(
+        "--keep_duplicate_frames",
+        action="store_true",
+        help="Send every screenshot of the window, even when the page did not change between them",
+    )
+    parser.add_argument(
+        "--duplicate_frame_hash_distance",
+        type=int,
+        default=4,
+        help="Maximum screenshot hash distance (out of 64 bits) for two frames to be compared pixel by pixel",
+    )
+    parser.add_argument(
+        "--duplicate_frame_changed_fraction",
+        type=float,
+        default=0.0001,
+        help="Maximum fraction of changed pixels for two frames to count as the same page",
+    )
+    parser.add_argument(
+        "--backfill_frames", action="store_true", help="Replace left out frames by older distinct ones"
+    )
+    # Loop detection
+    parser.add_argument("--disable_loop_detection", action="store_true", help="Do not detect repeated action cycles")
+    parser.add_argument(
+        "--loop_min_repeats", type=int, default=3, help="Repetitions of an action cycle for it to count as a loop"
+    )
+    parser.add_argument(
+        "--escalation_model_name_navigation",
+        help="Navigation model to switch to on the second loop detected (same endpoint as the navigation model)",
+    )
+    parser.add_argument("--escalation_temperature_navigation", type=float, default=1.0)
+    parser.add_argument(
+        "--navigation_samples",
+        type=int,
+        default=1,
+        help="Sample the navigation model this many times concurrently per step and take the majority action",
+    )
+    parser.add_argument(
+        "--lookahead_screens",
+        type=int,
+        default=0,
+        help="Also show the navigation model this many screens below the current one, stitched in one image",
+    )
+    parser.add_argument(
+        "--max_explored_links",
+        type=int,
+        default=0,
+        help="Let the agent open and summarize up to this many links at once, 0 disables the explore_links action",
+    )
+    parser.add_argument(
+        "--replica_base_urls_navigation", nargs="*", help="Other replicas of the navigation model, to hedge calls on"
+    )
     # Localization model
     parser.add_argument("--api-key-localization", help="api key for navigation, overrides API_KEY_LOCALIZATION")
     parser.add_argument("--base_url_localization", help="Override BASE_URL_LOCALIZATION")
     parser.add_argument("--model_name_localization", help="Override MODEL_NAME_LOCALIZATION")
     parser.add_argument("--temperature_localization", type=float, default=0.0)
+    parser.add_argument(
+        "--replica_base_urls_localization",
+        nargs="*",
+        help="Other replicas of the localization model, to hedge calls on",
+    )
 
     # Validation
     parser.add_argument("--use_validator", action="store_true", help="Use a validator model.")
@@ -162,10 +430,29 @@ def parse_args():
     parser.add_argument("--api-key-validation", help="api key for validation, overrides API_KEY_VALIDATION")
     parser.add_argument("--temperature_validation", type=float, default=0.0)
 
+    # Image encoding, e.g. png, jpeg:85, jpeg:85:4:4:4, webp:80 or webp:lossless
+    parser.add_argument("--image_codec_navigation", type=ImageCodec.from_spec, default=DEFAULT_IMAGE_CODEC)
+    parser.add_argument("--image_codec_localization", type=ImageCodec.from_spec, default=DEFAULT_IMAGE_CODEC)
+    parser.add_argument("--image_codec_validation", type=ImageCodec.from_spec, default=DEFAULT_IMAGE_CODEC)
+
     parser.add_argument("--openai-api-key", help="API key for the OpenAI API")
     parser.add_argument("--headless-browser", action="store_true")
     parser.add_argument("--action-timeout", type=int, default=10)
 
+    # Checkpointing
+    parser.add_argument("--checkpoint_dir", help="Save a checkpoint after every step in this directory")
+    parser.add_argument("--trajectory_id", help="Id of the run, used to name its checkpoint")
+    parser.add_argument("--resume", action="store_true", help="Resume --trajectory_id from its checkpoint")
+
+    # Macros
+    parser.add_argument("--macro_dir", help="Record successful runs as macros here and replay them on similar tasks")
+    parser.add_argument(
+        "--macro_similarity_threshold",
+        type=int,
+        default=10,
+        help="Maximum screenshot hash distance (out of 64 bits) for a page to still match the recorded macro",
+    )
+
     return parser.parse_args()
 
 
@@ -269,9 +556,10 @@ def validate_answer(
     temperature_validation: float,
     model_name_validation: str | None,
     n_validation_retries: int = 2,
+    image_codec: ImageCodec = DEFAULT_IMAGE_CODEC,
 ):
     screenshots_str = [
-        image_to_b64(screenshot, "png") for screenshot in current_state.screenshots[-n_navigation_screenshots:]
+        image_codec.to_data_url(screenshot) for screenshot in current_state.screenshots[-n_navigation_screenshots:]
     ]
     for i_retry in range(n_validation_retries):
         validator_response = validate_web_voyager_answer(
@@ -307,17 +595,76 @@ def agent_loop(
     temperature_validation: float,
     use_validator: bool,
     trajectory_id: str | None = None,
+    checkpoint_store: CheckpointStore | None = None,
+    resume: bool = False,
+    max_browser_restarts: int = 2,
+    macro_store: MacroStore | None = None,
+    macro_similarity_threshold: int = 10,
+    agent_mode: AgentMode = "screenshot",
+    image_codec_navigation: ImageCodec = DEFAULT_IMAGE_CODEC,
+    image_codec_localization: ImageCodec = DEFAULT_IMAGE_CODEC,
+    image_codec_validation: ImageCodec = DEFAULT_IMAGE_CODEC,
+    dedup_frames: bool = True,
+    duplicate_frame_hash_distance: int = 4,
+    duplicate_frame_changed_fraction: float = 0.0001,
+    backfill_frames: bool = False,
+    detect_loops: bool = True,
+    loop_min_repeats: int = 3,
+    escalation_model_name_navigation: str | None = None,
+    escalation_temperature_navigation: float = 1.0,
+    lookahead_screens: int = 0,
+    max_explored_links: int = 0,
+    navigation_samples: int = 1,
 ):
-    browser.goto(url)
-    current_state = AgentState(
-        task=task,
-        trajectory_id=trajectory_id,
-        timestep=0,
-        url=url,
-        screenshots=[browser.screenshot()],
-    )
+    restored = None
+    if resume and checkpoint_store is not None and trajectory_id is not None:
+        restored = checkpoint_store.load(trajectory_id)
+
+    if restored is not None:
+        checkpoint, frames = restored
+        browser.goto(checkpoint.url)
+        current_state = restore_state(checkpoint, frames, browser)
+        start_time = time.time() - checkpoint.elapsed_seconds
+        write_message(f"Resumed from checkpoint at step {checkpoint.timestep}: {checkpoint.url}", "announcement")
+    else:
+        browser.goto(url)
+        current_state = AgentState(
+            task=task,
+            trajectory_id=trajectory_id,
+            timestep=0,
+            url=url,
+            screenshots=[browser.screenshot()],
+        )
+        start_time = time.time()
+
+    n_browser_restarts = 0
+    n_blocked_reported = 0
+
+    def restart_browser(error: Exception):
+        """Reopen the browser on the current page, re-raising the error once out of restarts"""
+        nonlocal n_browser_restarts
+        if n_browser_restarts >= max_browser_restarts:
+            raise error
+        n_browser_restarts += 1
+        write_message(
+            f"Browser failure ({error.__class__.__name__}), restarting on {current_state.url} "
+            f"({n_browser_restarts}/{max_browser_restarts})",
+            "announcement",
+        )
+        recover_browser(browser, current_state.url)
+
+    loop_detector = LoopDetector(min_repeats=loop_min_repeats) if detect_loops else None
 
-    start_time = time.time()
+    macro_steps: list[MacroStep] = []
+    n_macro_replays = 0
+    if macro_store is not None and restored is None:
+        found = macro_store.lookup(task, url)
+        if found is not None:
+            macro, params = found
+            current_state, macro_steps = replay_macro(
+                macro, params, browser, url, current_state, macro_similarity_threshold
+            )
+            n_macro_replays = macro.n_replays + 1
 
     while True:
         write_message(f"Step {current_state.timestep}", "announcement")
@@ -331,20 +678,88 @@ def agent_loop(
                 write_message(f"***** Max time reached: {time.time() - start_time}s *****", "announcement")
             force_answer = True
 
-        navigation_response = navigation_step(
-            task=current_state.task,
-            previous_actions=", ".join([str(action) for action in current_state.navigation_actions]),
-            step=current_state.current_step,
-            notes=current_state.notes,
-            force_answer=force_answer,
-            screenshots=current_state.screenshots[-n_navigation_screenshots:],
-            openai_client_navigation=openai_client_navigation,
-            localization_openai_client=openai_client_localization,
-            localizer_model_name=model_name_localization,
-            navigator_model_name=model_name_navigation,
-            temperature_navigation=temperature_navigation,
-            temperature_localization=temperature_localization,
-        )
+        # Escalate on each loop detected: a hint, then another model or a higher temperature, then an early answer
+        loop = loop_detector.detect() if loop_detector is not None else None
+        if loop is not None:
+            assert loop_detector is not None
+            write_message(f"Loop detected: {loop.description} (escalation {loop_detector.level})", "announcement")
+            if loop_detector.level >= 3:
+                force_answer = True
+            else:
+                current_state.notes = f"{current_state.notes}\n{loop_hint(loop)}"
+                if loop_detector.level == 2:
+                    model_name_navigation = escalation_model_name_navigation or model_name_navigation
+                    temperature_navigation = max(temperature_navigation, escalation_temperature_navigation)
+                    write_message(
+                        f"Switching navigation to {model_name_navigation} at temperature {temperature_navigation}",
+                        "announcement",
+                    )
+
+        try:
+            page_elements = distill_page(browser) if agent_mode != "screenshot" else []
+            use_dom = agent_mode == "dom" or (agent_mode == "hybrid" and is_form_like_page(page_elements))
+            # Shows what scrolling would reveal
+            lookahead = browser.capture_page_below(lookahead_screens) if lookahead_screens > 0 and not use_dom else None
+        except BROWSER_ERRORS as e:
+            restart_browser(e)
+            # The step is taken again, on the reopened page
+            current_state.screenshots[-1] = browser.screenshot()
+            continue
+
+        if use_dom:
+            navigation_response = dom_navigation_step(
+                task=current_state.task,
+                previous_actions=", ".join([str(action) for action in current_state.navigation_actions]),
+                step=current_state.current_step,
+                notes=current_state.notes,
+                force_answer=force_answer,
+                elements=page_elements,
+                openai_client_navigation=openai_client_navigation,
+                navigator_model_name=model_name_navigation,
+                temperature_navigation=temperature_navigation,
+                explore_links=max_explored_links,
+                n_samples=navigation_samples,
+            )
+        else:
+            if dedup_frames:
+                # Frames identical to the next one cost image tokens for nothing, a note says the action had no effect
+                screenshots, frame_notes = select_navigation_frames(
+                    current_state.screenshots,
+                    current_state.navigation_actions,
+                    n_navigation_screenshots,
+                    max_hash_distance=duplicate_frame_hash_distance,
+                    max_changed_fraction=duplicate_frame_changed_fraction,
+                    backfill=backfill_frames,
+                )
+            else:
+                screenshots, frame_notes = current_state.screenshots[-n_navigation_screenshots:], []
+            if lookahead is not None:
+                # Placed before the current screenshot which stays last, since localization works on the last one
+                screenshots = [*screenshots[:-1], lookahead, screenshots[-1]]
+                frame_notes = [
+                    *frame_notes,
+                    "The image before the last one shows the screens below the current one, stitched top to "
+                    "bottom. Scroll down to act on elements only visible there.",
+                ]
+            navigation_response = navigation_step(
+                task=current_state.task,
+                previous_actions=", ".join([str(action) for action in current_state.navigation_actions]),
+                step=current_state.current_step,
+                notes=current_state.notes,
+                force_answer=force_answer,
+                screenshots=screenshots,
+                frame_notes=frame_notes,
+                openai_client_navigation=openai_client_navigation,
+                localization_openai_client=openai_client_localization,
+                localizer_model_name=model_name_localization,
+                navigator_model_name=model_name_navigation,
+                temperature_navigation=temperature_navigation,
+                temperature_localization=temperature_localization,
+                navigation_image_codec=image_codec_navigation,
+                localization_image_codec=image_codec_localization,
+                explore_links=max_explored_links,
+                n_samples=navigation_samples,
+            )
 
         write_message(navigation_response["thought"], "thought")
         write_message(navigation_response["notes"], "notes")
@@ -365,11 +780,13 @@ def agent_loop(
                     openai_client_validation,
                     temperature_validation,
                     model_name_validation,
+                    image_codec=image_codec_validation,
                 )
                 if validator_response.success:
                     write_message("***** Validation passed *****", "announcement")
                     write_message(validator_response.why, "thought")
                     write_message(str(validator_response.answer), "answer")
+                    record_macro(macro_store, task, url, macro_steps, current_state, n_macro_replays)
                     return navigation_action["content"], current_state.screenshots
                 else:
                     write_message(validator_response.why, "thought")
@@ -377,23 +794,104 @@ def agent_loop(
             else:
                 write_message("***** Return answer *****", "announcement")
                 write_message(navigation_action["content"], "answer")
+                record_macro(macro_store, task, url, macro_steps, current_state, n_macro_replays)
                 return navigation_action["content"], current_state.screenshots
-        else:
-            execute_navigation_action(navigation_action, browser, url)
 
-        new_state = update_state(current_state, navigation_response, browser)
+        n_macro_steps = len(macro_steps)
+        try:
+            if navigation_action["action"] == "explore_links":
+                explored = explore_links(
+                    task=current_state.task,
+                    links=navigation_action["links"],
+                    looking_for=navigation_action["looking_for"],
+                    browser=browser,
+                    openai_client=openai_client_navigation,
+                    model=model_name_navigation,
+                    max_links=max_explored_links,
+                    image_codec=image_codec_navigation,
+                )
+                exploration_notes = format_explored_links(explored, navigation_action["links"])
+                write_message(exploration_notes, "notes")
+                navigation_response["notes"] += f"\n{exploration_notes}"
+                best = next((link for link in explored if link.error is None), None)
+                if best is not None:
+                    # Recorded in the action so that macros replay the choice
+                    navigation_action["url"] = best.url
+            if navigation_action["action"] != "answer":
+                macro_steps.append(macro_step(navigation_action, current_state))
+                if loop_detector is not None:
+                    loop_detector.observe(navigation_action, current_state.url, current_state.screenshots[-1])
+                feedback = execute_navigation_action(navigation_action, browser, url)
+                if feedback is not None:
+                    write_message(feedback, "notes")
+                    navigation_response["notes"] += f"\n{feedback}"
+            new_state = update_state(current_state, navigation_response, browser)
+            blocked = browser.blocked_requests()
+            if sum(blocked.values()) > n_blocked_reported:
+                n_blocked_reported = sum(blocked.values())
+                write_message(describe_blocked(blocked), "announcement")
+        except BROWSER_ERRORS as e:
+            restart_browser(e)
+            # The browser was reopened on the page from before the action, which must not be replayed by macros
+            del macro_steps[n_macro_steps:]
+            failure = f"Action {navigation_action['action']} was not applied: the browser failed and was reopened."
+            write_message(failure, "notes")
+            navigation_response["notes"] += f"\n{failure}"
+            new_state = update_state(current_state, navigation_response, browser)
+
+        if checkpoint_store is not None and new_state.trajectory_id is not None:
+            checkpoint_store.save(new_state, start_url=url, elapsed_seconds=time.time() - start_time)
 
         current_state = new_state
 
 
 def main():
     cli_args = parse_args()
-    browser = SimpleWebBrowserTools()
+
+    profile_lease = None
+    if cli_args.browser_profile:
+        browser_profiles = BrowserProfileStore(
+            cli_args.browser_profiles_dir,
+            max_profile_bytes=cli_args.browser_profile_max_mb * 2**20,
+            template=cli_args.browser_profile_template,
+        )
+        if cli_args.reset_browser_profile:
+            browser_profiles.reset(cli_args.browser_profile)
+        profile_lease = browser_profiles.acquire(cli_args.browser_profile)
+        print("Using browser profile", profile_lease.path)
+
+    if cli_args.record_dir and cli_args.replay_dir:
+        raise ValueError("--record_dir and --replay_dir are exclusive")
+    record_replay_dir = cli_args.record_dir or cli_args.replay_dir
+    record_replay_mode = "replay" if cli_args.replay_dir else "record"
+
+    caching_proxy = None
+    if record_replay_dir:
+        # The proxy records or replays all traffic, its CA is kept with the recording
+        caching_proxy = CachingProxy(
+            Path(record_replay_dir) / "proxy",
+            archive=NetworkArchive(network_archive_dir(record_replay_dir)),
+            replay=record_replay_mode == "replay",
+        ).start()
+        print(f"{record_replay_mode.capitalize()}ing the run in", record_replay_dir)
+    elif cli_args.caching_proxy:
+        caching_proxy = CachingProxy(
+            cli_args.proxy_cache_dir,
+            max_bytes=cli_args.proxy_cache_mb * 2**20,
+            static_ttl=cli_args.proxy_static_ttl_hours * 3600 if cli_args.proxy_static_ttl_hours else None,
+        ).start()
+
+    browser = create_browser(cli_args.browser_backend)
     browser.open_browser(
         headless=cli_args.headless_browser,
         width=cli_args.browser_width,
         height=cli_args.browser_height,
         action_timeout=cli_args.action_timeout,
+        network_blocking=NetworkBlocking.from_blocklists(
+            cli_args.block_lists, cli_args.block_url_patterns, cli_args.block_resource_types
+        ),
+        user_data_dir=str(profile_lease.path) if profile_lease is not None else None,
+        proxy=caching_proxy.settings() if caching_proxy is not None else None,
     )
 
     (
@@ -401,25 +899,93 @@ def main():
         (model_name_localization, openai_client_localization),
         (model_name_validation, openai_client_validation),
     ) = get_openai_model_names_and_clients(cli_args)
-
-    agent_loop(
-        task=cli_args.task,
-        url=cli_args.url,
-        browser=browser,
-        max_n_steps=cli_args.max_n_steps,
-        max_time_seconds=cli_args.max_time_seconds,
-        n_navigation_screenshots=cli_args.n_navigation_screenshots,
-        model_name_localization=model_name_localization,
-        model_name_navigation=model_name_navigation,
-        model_name_validation=model_name_validation,
-        openai_client_localization=openai_client_localization,
-        openai_client_navigation=openai_client_navigation,
-        openai_client_validation=openai_client_validation,
-        temperature_navigation=cli_args.temperature_navigation,
-        temperature_localization=cli_args.temperature_localization,
-        temperature_validation=cli_args.temperature_validation,
-        use_validator=cli_args.use_validator,
-    )
+    hedging = None
+    if cli_args.hedge_percentile is not None:
+        hedging = HedgingPolicy(
+            percentile=cli_args.hedge_percentile,
+            max_hedge_ratio=cli_args.hedge_max_ratio,
+            min_samples=cli_args.hedge_min_samples,
+        )
+        openai_client_navigation = hedge_client(
+            openai_client_navigation, hedging, cli_args.replica_base_urls_navigation
+        )
+        openai_client_localization = hedge_client(
+            openai_client_localization, hedging, cli_args.replica_base_urls_localization
+        )
+        if openai_client_validation is not None:
+            openai_client_validation = hedge_client(openai_client_validation, hedging)
+    if record_replay_dir:
+        openai_client_navigation = record_replay_client(
+            openai_client_navigation, record_replay_dir, "navigation", record_replay_mode
+        )
+        openai_client_localization = record_replay_client(
+            openai_client_localization, record_replay_dir, "localization", record_replay_mode
+        )
+        if openai_client_validation is not None:
+            openai_client_validation = record_replay_client(
+                openai_client_validation, record_replay_dir, "validation", record_replay_mode
+            )
+
+    checkpoint_store = None
+    trajectory_id = cli_args.trajectory_id
+    if cli_args.checkpoint_dir:
+        checkpoint_store = CheckpointStore(cli_args.checkpoint_dir, n_frames=cli_args.n_navigation_screenshots)
+        if trajectory_id is None:
+            trajectory_id = str(uuid.uuid4())
+        print("Checkpointing trajectory", trajectory_id, "to", cli_args.checkpoint_dir)
+
+    start_time = time.perf_counter()
+    try:
+        agent_loop(
+            task=cli_args.task,
+            url=cli_args.url,
+            browser=browser,
+            max_n_steps=cli_args.max_n_steps,
+            max_time_seconds=cli_args.max_time_seconds,
+            n_navigation_screenshots=cli_args.n_navigation_screenshots,
+            model_name_localization=model_name_localization,
+            model_name_navigation=model_name_navigation,
+            model_name_validation=model_name_validation,
+            openai_client_localization=openai_client_localization,
+            openai_client_navigation=openai_client_navigation,
+            openai_client_validation=openai_client_validation,
+            temperature_navigation=cli_args.temperature_navigation,
+            temperature_localization=cli_args.temperature_localization,
+            temperature_validation=cli_args.temperature_validation,
+            use_validator=cli_args.use_validator,
+            trajectory_id=trajectory_id,
+            checkpoint_store=checkpoint_store,
+            resume=cli_args.resume,
+            macro_store=MacroStore(cli_args.macro_dir) if cli_args.macro_dir else None,
+            macro_similarity_threshold=cli_args.macro_similarity_threshold,
+            agent_mode=cli_args.agent_mode,
+            image_codec_navigation=cli_args.image_codec_navigation,
+            image_codec_localization=cli_args.image_codec_localization,
+            image_codec_validation=cli_args.image_codec_validation,
+            dedup_frames=not cli_args.keep_duplicate_frames,
+            duplicate_frame_hash_distance=cli_args.duplicate_frame_hash_distance,
+            duplicate_frame_changed_fraction=cli_args.duplicate_frame_changed_fraction,
+            backfill_frames=cli_args.backfill_frames,
+            detect_loops=not cli_args.disable_loop_detection,
+            loop_min_repeats=cli_args.loop_min_repeats,
+            escalation_model_name_navigation=cli_args.escalation_model_name_navigation,
+            escalation_temperature_navigation=cli_args.escalation_temperature_navigation,
+            lookahead_screens=cli_args.lookahead_screens,
+            max_explored_links=cli_args.max_explored_links,
+            navigation_samples=cli_args.navigation_samples,
+        )
+    finally:
+        if profile_lease is not None:
+            # Chrome must be gone before the profile is trimmed and released
+            browser.quit()
+            profile_lease.release()
+        if caching_proxy is not None:
+            print("Caching proxy:", caching_proxy.stats())
+            caching_proxy.stop()
+        if hedging is not None:
+            print("Hedging:", hedging_stats())
+        if record_replay_dir:
+            print(f"{record_replay_mode.capitalize()}ed run took {time.perf_counter() - start_time:.2f}s")
 
 
 if __name__ == "__main__":
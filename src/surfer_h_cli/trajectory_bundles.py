@@ -0,0 +1,183 @@
+"""Retention of finished trajectories as compressed, indexed bundles.
+
+A bundle is a plain tar file whose members are one `<id>.json.gz` per trajectory and its `<id>.frames` archive,
+kept uncompressed so it can still be read through mmap in place. A sidecar `<bundle>.index.json` records where each
+member starts and a summary of each trajectory, so listing and reading a run never scans the tar.
+"""
+
+import gzip
+import io
+import json
+import os
+import tarfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from pydantic import BaseModel
+
+from surfer_h_cli.frame_archive import FrameArchiveReader, archive_path, hydrate_events
+
+TERMINAL_STATUSES = ("completed", "error", "failed")
+
+
+class BundleEntry(BaseModel):
+    json_offset: int
+    json_size: int
+    """Size of the gzipped JSON member"""
+    frames_offset: int | None = None
+    frames_size: int | None = None
+    summary: dict
+    """Trajectory fields without the events, as returned by list_trajectories"""
+
+
+class BundleIndex(BaseModel):
+    created_at: str
+    newest_end_time: str
+    entries: dict[str, BundleEntry]
+
+
+def trajectory_summary(file_data: dict) -> dict:
+    return {
+        "trajectory_id": file_data["id"],
+        "task": file_data["task"],
+        "url": file_data["url"],
+        "status": file_data["status"],
+        "start_time": file_data["start_time"],
+        "end_time": file_data.get("end_time"),
+        "step_count": file_data.get("step_count", len(file_data.get("events", []))),
+    }
+
+
+def add_member(tar: tarfile.TarFile, info: tarfile.TarInfo, fileobj) -> int:
+    """Add a member and return the offset of its data in the tar file."""
+    data_offset = tar.offset + len(info.tobuf(tar.format, tar.encoding, tar.errors))
+    tar.addfile(info, fileobj)
+    return data_offset
+
+
+class TrajectoryBundleStore:
+    """Directory of bundles, with an in-memory cache of their indexes."""
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._indexes: dict[Path, tuple[float, BundleIndex]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _index_path(bundle_path: Path) -> Path:
+        return bundle_path.with_suffix(".index.json")
+
+    def indexes(self) -> dict[Path, BundleIndex]:
+        """Index of every bundle, re-read only when a sidecar changed."""
+        with self._lock:
+            current = {}
+            for index_path in self.root.glob("bundle_*.index.json"):
+                bundle_path = index_path.with_name(index_path.name.removesuffix(".index.json") + ".tar")
+                mtime = index_path.stat().st_mtime
+                cached = self._indexes.get(bundle_path)
+                if cached is None or cached[0] != mtime:
+                    try:
+                        with open(index_path, "r") as f:
+                            cached = (mtime, BundleIndex.model_validate(json.load(f)))
+                    except (json.JSONDecodeError, ValueError) as e:
+                        print(f"Error reading bundle index {index_path}: {e}")
+                        continue
+                current[bundle_path] = cached
+            self._indexes = current
+            return {bundle_path: index for bundle_path, (_, index) in current.items()}
+
+    def find(self, trajectory_id: str) -> tuple[Path, BundleEntry] | None:
+        for bundle_path, index in self.indexes().items():
+            if trajectory_id in index.entries:
+                return bundle_path, index.entries[trajectory_id]
+        return None
+
+    def summaries(self) -> list[dict]:
+        return [entry.summary for index in self.indexes().values() for entry in index.entries.values()]
+
+    def read_events(self, trajectory_id: str, hydrate: bool = True, since: int = 0) -> dict | None:
+        """Trajectory data of a bundled run with its events from index `since` on, and their screenshots put back
+        unless `hydrate` is False."""
+        found = self.find(trajectory_id)
+        if found is None:
+            return None
+        bundle_path, entry = found
+        with open(bundle_path, "rb") as f:
+            f.seek(entry.json_offset)
+            file_data = json.loads(gzip.decompress(f.read(entry.json_size)))
+        file_data["events"] = file_data.get("events", [])[since:]
+        if hydrate and entry.frames_offset is not None:
+            with FrameArchiveReader(bundle_path, base_offset=entry.frames_offset, size=entry.frames_size) as reader:
+                hydrate_events(file_data, reader)
+        return file_data
+
+    def read_frame(self, trajectory_id: str, frame: int) -> bytes | None:
+        found = self.find(trajectory_id)
+        if found is None or found[1].frames_offset is None:
+            return None
+        bundle_path, entry = found
+        with FrameArchiveReader(bundle_path, base_offset=entry.frames_offset, size=entry.frames_size) as reader:
+            return reader.frame_png(frame) if 0 <= frame < len(reader) else None
+
+    def compact(self, trajectory_files: list[Path]) -> Path | None:
+        """Pack trajectory files and their frame archives into a new bundle. The caller removes the originals
+        once this returns, the bundle is complete and indexed by then."""
+        if not trajectory_files:
+            return None
+        name = f"bundle_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}"
+        bundle_path = self.root / f"{name}.tar"
+        tmp_path = self.root / f"{name}.tar.tmp"
+
+        entries: dict[str, BundleEntry] = {}
+        newest_end_time = ""
+        with tarfile.open(tmp_path, "w") as tar:
+            for trajectory_file in trajectory_files:
+                with open(trajectory_file, "r") as f:
+                    file_data = json.load(f)
+                trajectory_id = file_data["id"]
+
+                payload = gzip.compress(json.dumps(file_data).encode(), compresslevel=6)
+                info = tarfile.TarInfo(f"{trajectory_id}.json.gz")
+                info.size = len(payload)
+                info.mtime = int(time.time())
+                entry = BundleEntry(
+                    json_offset=add_member(tar, info, io.BytesIO(payload)),
+                    json_size=info.size,
+                    summary=trajectory_summary(file_data),
+                )
+
+                frames_file = archive_path(trajectory_file)
+                if frames_file.exists():
+                    frames_info = tar.gettarinfo(str(frames_file), arcname=f"{trajectory_id}.frames")
+                    with open(frames_file, "rb") as f:
+                        entry.frames_offset = add_member(tar, frames_info, f)
+                    entry.frames_size = frames_info.size
+
+                entries[trajectory_id] = entry
+                # Same fallback as compaction for files without an end time: their last write
+                end_time = file_data.get("end_time")
+                end_time = end_time or datetime.fromtimestamp(trajectory_file.stat().st_mtime).isoformat()
+                newest_end_time = max(newest_end_time, end_time)
+
+        os.replace(tmp_path, bundle_path)
+        index = BundleIndex(created_at=datetime.now().isoformat(), newest_end_time=newest_end_time, entries=entries)
+        index_path = self._index_path(bundle_path)
+        tmp_index_path = index_path.with_suffix(".tmp")
+        with open(tmp_index_path, "w") as f:
+            json.dump(index.model_dump(), f)
+        os.replace(tmp_index_path, index_path)
+        return bundle_path
+
+    def expire(self, max_age_seconds: float) -> int:
+        """Delete the bundles whose runs all ended more than `max_age_seconds` ago. Returns how many runs went."""
+        cutoff = datetime.fromtimestamp(time.time() - max_age_seconds).isoformat()
+        n_deleted = 0
+        for bundle_path, index in self.indexes().items():
+            if index.newest_end_time and index.newest_end_time < cutoff:
+                self._index_path(bundle_path).unlink(missing_ok=True)
+                bundle_path.unlink(missing_ok=True)
+                n_deleted += len(index.entries)
+        return n_deleted
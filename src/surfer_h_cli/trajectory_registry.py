@@ -0,0 +1,99 @@
+import threading
+from collections import OrderedDict
+from typing import Callable
+
+ENTRY_OVERHEAD_BYTES = 4096
+"""Rough size of an entry without frames: task, settings and state summary"""
+
+
+def entry_nbytes(entry: dict) -> int:
+    """Estimated memory held by a trajectory entry, dominated by the frames of its current agent state."""
+    screenshots = getattr(entry.get("current_state"), "screenshots", None) or []
+    return ENTRY_OVERHEAD_BYTES + sum(image.width * image.height * len(image.getbands()) for image in screenshots)
+
+
+class TrajectoryRegistry:
+    """In-memory trajectories of the server, in least recently used order.
+
+    Running trajectories always stay. Finished ones, marked `closed` once their last event is stored, are evicted
+    oldest first once there are more than `max_finished` of them or the registry holds more than `max_bytes`.
+    Evicted trajectories are then served from their files or bundles, and `on_evict` is called to release anything
+    else kept for them.
+    """
+
+    def __init__(
+        self,
+        max_finished: int = 50,
+        max_bytes: int = 512 * 2**20,
+        on_evict: Callable[[str], None] | None = None,
+    ):
+        self.max_finished = max_finished
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict
+        self.n_evicted = 0
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __contains__(self, trajectory_id: str) -> bool:
+        return trajectory_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __getitem__(self, trajectory_id: str) -> dict:
+        with self._lock:
+            entry = self._entries[trajectory_id]
+            self._entries.move_to_end(trajectory_id)
+            return entry
+
+    def __setitem__(self, trajectory_id: str, entry: dict):
+        with self._lock:
+            self._entries[trajectory_id] = entry
+            self._entries.move_to_end(trajectory_id)
+        self.evict()
+
+    def get(self, trajectory_id: str, default: dict | None = None) -> dict | None:
+        with self._lock:
+            return self[trajectory_id] if trajectory_id in self._entries else default
+
+    def pop(self, trajectory_id: str, default: dict | None = None) -> dict | None:
+        with self._lock:
+            return self._entries.pop(trajectory_id, default)
+
+    def items(self) -> list[tuple[str, dict]]:
+        """Snapshot of the entries, safe to iterate while trajectories are added or evicted."""
+        with self._lock:
+            return list(self._entries.items())
+
+    def evict(self) -> list[str]:
+        """Drop least recently used finished trajectories until the limits are met."""
+        with self._lock:
+            sizes = {trajectory_id: entry_nbytes(entry) for trajectory_id, entry in self._entries.items()}
+            total = sum(sizes.values())
+            finished = [tid for tid, entry in self._entries.items() if entry.get("closed")]
+
+            evicted = []
+            for trajectory_id in finished:
+                if len(finished) - len(evicted) <= self.max_finished and total <= self.max_bytes:
+                    break
+                del self._entries[trajectory_id]
+                total -= sizes[trajectory_id]
+                evicted.append(trajectory_id)
+            self.n_evicted += len(evicted)
+
+        if self.on_evict is not None:
+            for trajectory_id in evicted:
+                self.on_evict(trajectory_id)
+        return evicted
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = list(self._entries.values())
+            return {
+                "entries": len(entries),
+                "finished": sum(bool(entry.get("closed")) for entry in entries),
+                "bytes": sum(entry_nbytes(entry) for entry in entries),
+                "max_finished": self.max_finished,
+                "max_bytes": self.max_bytes,
+                "evicted": self.n_evicted,
+            }
@@ -1,21 +1,14 @@
-import base64
-import io
 import math
-from typing import Literal
 
 from PIL import Image
 
+from surfer_h_cli.image_codec import ImageCodec, ImageFormat
 
-def image_to_b64(image: Image.Image, format: Literal["jpeg", "png"] = "jpeg") -> str:
-    image_bytes = io.BytesIO()
-    if format == "png":
-        image.save(image_bytes, format="PNG")
-    elif format == "jpeg":
-        image.save(image_bytes, format="JPEG", quality=90)
-    else:
+
+def image_to_b64(image: Image.Image, format: ImageFormat = "jpeg") -> str:
+    if format not in ("png", "jpeg", "webp"):
         raise ValueError(f"Invalid image format: {format}")
-    image_base64 = base64.b64encode(image_bytes.getvalue()).decode("utf-8")
-    return image_base64
+    return ImageCodec(format=format).to_b64(image)
 
 
 # Copied from https://github.com/huggingface/transformers/blob/e15b06d8dc6fa132550311d63c9758b580f39bcc/src/transformers/models/qwen2_vl/image_processing_qwen2_vl.py#L55
@@ -48,3 +41,21 @@ def smart_resize(
         h_bar = math.ceil(height * beta / factor) * factor
         w_bar = math.ceil(width * beta / factor) * factor
     return h_bar, w_bar
+
+
+def image_dhash(image: Image.Image, hash_size: int = 8) -> int:
+    """Difference hash of an image: a 64-bit (for hash_size=8) fingerprint robust to small rendering changes."""
+    grayscale = image.convert("L").resize((hash_size + 1, hash_size), resample=Image.Resampling.BILINEAR)
+    pixels = list(grayscale.getdata())
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def hamming_distance(hash_a: int, hash_b: int) -> int:
+    """Number of differing bits between two image hashes."""
+    return (hash_a ^ hash_b).bit_count()
@@ -11,6 +11,7 @@ from openai import OpenAI
 from selenium.webdriver.common.by import By
 from selenium.common.exceptions import NoSuchElementException
 from src.surfer_h_cli.simple_browser import SimpleWebBrowserTools
+from src.surfer_h_cli.dom_distiller import act_on_element, distill_page, format_delta, format_elements, page_delta
 
 
 def get_page_html(browser: SimpleWebBrowserTools) -> str:
@@ -19,6 +20,11 @@ def get_page_html(browser: SimpleWebBrowserTools) -> str:
     return browser.driver.page_source
 
 
+def get_page_elements(browser: SimpleWebBrowserTools) -> str:
+    """Compact listing of the visible interactive and text elements of the whole page"""
+    return format_elements(distill_page(browser))
+
+
 def parse_json_response(response_text: str) -> dict:
     """Robustly parse JSON response, fixing common formatting issues"""
     response_text = response_text.strip()
@@ -62,10 +68,13 @@ def parse_json_response(response_text: str) -> dict:
     try:
         action_match = re.search(r'"action"\s*:\s*"([^"]+)"', response_text)
         selector_match = re.search(r'"selector"\s*:\s*"([^"]+)"', response_text)
+        element_id_match = re.search(r'"element_id"\s*:\s*"([^"]+)"', response_text)
         content_match = re.search(r'"content"\s*:\s*"([^"]+)"', response_text)
         
         if action_match:
             result = {"action": action_match.group(1)}
+            if element_id_match:
+                result["element_id"] = element_id_match.group(1)
             if selector_match:
                 result["selector"] = selector_match.group(1)
             if content_match:
@@ -77,7 +86,7 @@ def parse_json_response(response_text: str) -> dict:
     raise ValueError(f"Could not parse JSON: {response_text}")
 
 
-def create_navigation_prompt(task: str, html: str, history: list) -> str:
+def create_navigation_prompt(task: str, elements: str, history: list) -> str:
     """Create prompt for the navigation model"""
     history_str = "\n".join([f"Step {i}: {h}" for i, h in enumerate(history)])
     
@@ -92,25 +101,72 @@ TASK STEPS:
 COMPLETED STEPS ({num_completed}):
 {history_str if history else "None - START WITH STEP 1"}
 
-CURRENT PAGE HTML:
-{html[:8000]}
+CURRENT PAGE ELEMENTS (one per line: [id] role "label" value="..." @x,y,widthxheight):
+{elements}
 
 CRITICAL: You have completed {num_completed} steps. Do the NEXT step only.
+Designate elements by their [id] from the list above, without the brackets.
 
 Return ONLY valid JSON (no extra braces):
-{{"action": "fill_field", "selector": "#id", "content": "text"}}
-{{"action": "click_element", "selector": ".class"}}
-{{"action": "extract_text", "selector": "#id"}}
+{{"action": "fill_field", "element_id": "e12", "content": "text"}}
+{{"action": "click_element", "element_id": "e7"}}
+{{"action": "extract_text", "element_id": "e3"}}
 {{"action": "answer", "content": "done"}}
 
 What is step {num_completed + 1}?"""
 
 
+def create_delta_prompt(changes: str, history: list) -> str:
+    """Follow-up prompt carrying only what changed since the page the model last saw"""
+    num_completed = len(history)
+    last_result = history[-1] if history else "None"
+
+    return f"""RESULT OF STEP {num_completed}: {last_result}
+
+PAGE CHANGES SINCE THE PREVIOUS STEP (same format, ids refer to the elements you already saw):
+{changes}
+
+CRITICAL: You have completed {num_completed} steps. Do the NEXT step only.
+Return ONLY valid JSON, in the same format as before.
+
+What is step {num_completed + 1}?"""
+
+
+def execute_element_action(action: dict, browser: SimpleWebBrowserTools) -> tuple[bool, str]:
+    """Execute an action on an element designated by its distilled id"""
+    element_id = action["element_id"]
+    print(f"🔍 Finding: [{element_id}]")
+    if action["action"] == "fill_field":
+        result = act_on_element(browser, element_id, "fill", action["content"])
+        if result["ok"]:
+            print(f"✅ Filled with: {action['content']}")
+            return True, f"Filled [{element_id}]"
+    elif action["action"] == "click_element":
+        result = act_on_element(browser, element_id, "click")
+        if result["ok"]:
+            time.sleep(3)  # Wait longer for page to load
+            print(f"✅ Clicked")
+            return True, f"Clicked [{element_id}]"
+    else:
+        result = act_on_element(browser, element_id, "extract")
+        if result["ok"]:
+            text = result["text"]
+            print(f"\n{'='*60}")
+            print(f"🎯 EXTRACTED: {text}")
+            print(f"{'='*60}\n")
+            return True, f"Extracted: {text}"
+    print(f"❌ Error: {result.get('error')}")
+    return False, str(result.get("error"))
+
+
 def execute_action(action: dict, browser: SimpleWebBrowserTools) -> tuple[bool, str]:
     """Execute an action"""
     assert browser.driver
     
     try:
+        if "element_id" in action and action["action"] in ("fill_field", "click_element", "extract_text"):
+            return execute_element_action(action, browser)
+
         if action["action"] == "fill_field":
             selector = action["selector"]
             content = action["content"]
@@ -153,8 +209,20 @@ def execute_action(action: dict, browser: SimpleWebBrowserTools) -> tuple[bool,
         return False, str(e)
 
 
-def run_agent(task: str, url: str, api_key: str, model_url: str, model_name: str, max_steps: int = 30):
-    """Main agent loop"""
+def run_agent(
+    task: str,
+    url: str,
+    api_key: str,
+    model_url: str,
+    model_name: str,
+    max_steps: int = 30,
+    max_delta_turns: int = 10,
+):
+    """Main agent loop
+
+    The full element list is sent after each navigation, then the conversation only grows by the page changes
+    of each step. It is restarted from a full list every max_delta_turns steps to keep it bounded.
+    """
     browser = SimpleWebBrowserTools()
     browser.open_browser(headless=False, width=1920, height=1080, action_timeout=10)
     client = OpenAI(api_key=api_key, base_url=model_url)
@@ -164,24 +232,33 @@ def run_agent(task: str, url: str, api_key: str, model_url: str, model_name: str
     time.sleep(2)
     
     history = []
+    messages = []
     
     for step in range(max_steps):
         print(f"\n{'='*60}")
         print(f"🎉 Step {step}")
         print(f"{'='*60}")
         
-        html = get_page_html(browser)
-        prompt = create_navigation_prompt(task, html, history)
+        delta = page_delta(browser)
+        if delta.full or not messages or len(messages) > 2 * max_delta_turns:
+            elements = format_delta(delta) if delta.full else get_page_elements(browser)
+            messages = [{"role": "user", "content": create_navigation_prompt(task, elements, history)}]
+            print(f"📄 Sending full page ({len(elements)} chars)")
+        else:
+            changes = format_delta(delta)
+            messages.append({"role": "user", "content": create_delta_prompt(changes, history)})
+            print(f"🧩 Sending page changes ({len(changes)} chars)")
         
         print(f"🤖 Asking model...")
         response = client.chat.completions.create(
             model=model_name,
-            messages=[{"role": "user", "content": prompt}],
+            messages=messages,
             temperature=0.0
         )
         
         try:
             response_text = response.choices[0].message.content
+            messages.append({"role": "assistant", "content": response_text})
             action = parse_json_response(response_text)
             print(f"🛠️  Action: {action}")
         except Exception as e:
@@ -205,24 +282,32 @@ def run_agent(task: str, url: str, api_key: str, model_url: str, model_name: str
     print(f"Finished after {step + 1} steps")
     print(f"{'='*60}")
     
-    input("\nPress Enter to close...")
-    browser.close()
+    browser.quit()
 
 
 if __name__ == "__main__":
+    import argparse
     import os
+    from pathlib import Path
     from dotenv import load_dotenv
     
     load_dotenv()
     
-    with open("instructions-native.txt", "r") as f:
+    default_url = (Path(__file__).parent / "automation_forms_filling" / "login.html").resolve().as_uri()
+    parser = argparse.ArgumentParser(description="Native DOM agent for step-by-step form filling")
+    parser.add_argument("--task_file", default="instructions-native.txt", help="File containing the task steps")
+    parser.add_argument("--url", default=default_url, help="Page to start the task from")
+    parser.add_argument("--max_steps", type=int, default=30)
+    args = parser.parse_args()
+    
+    with open(args.task_file, "r") as f:
         task = f.read()
     
     run_agent(
         task=task,
-        url="file:///home/justine/Documents/surfer-h-cli/automation_forms_filling/login.html",
+        url=args.url,
         api_key=os.getenv("HAI_API_KEY"),
         model_url=os.getenv("HAI_MODEL_URL_NAVIGATION"),
         model_name=os.getenv("HAI_MODEL_NAME_NAVIGATION"),
-        max_steps=30
+        max_steps=args.max_steps
     )